@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, current_app, request
 from datetime import datetime, date, timedelta
-from sqlalchemy import or_
+from sqlalchemy import func, or_
 from flask_mail import Message
 from flask_login import login_user, logout_user, current_user
 from functools import wraps
@@ -35,17 +35,27 @@ from forms import (
     SiteSectionSeedForm,
     PatientForm,
     PatientNoteForm,
+    ScheduleRuleForm,
+    ScheduleExceptionForm,
+    WEEKDAY_CHOICES,
 )
 from appointments_api import create_pending_appointment
 from google_calendar import (
+    batch_upsert_appointment_events,
+    count_stale_events,
     get_google_credentials_details,
+    reset_service_cache,
     sync_google_calendar,
-    upsert_appointment_event,
-    cancel_appointment_event,
     upsert_calendar_event,
     cancel_calendar_event,
 )
-from availability_service import get_working_hours, get_slot_minutes, is_slot_available
+from appointment_listing import filter_appointments, paginate_appointments
+from availability_cache import invalidate_availability
+from availability_service import assign_overflow_seat, find_next_available, release_seat
+from calendar_outbox import enqueue_appointment_sync
+from schedule_service import invalidate_busy_index
+from http_cache import is_not_modified, make_etag, not_modified, with_etag
+from metrics import send_mail
 from models import (
     db,
     User,
@@ -58,6 +68,8 @@ from models import (
     SiteSectionItem,
     Patient,
     PatientNote,
+    ScheduleRule,
+    ScheduleException,
 )
 
 # Create Blueprint for the admin routes
@@ -129,14 +141,33 @@ def dashboard():
 @admin_bp.route('/appointments')
 @admin_required
 def appointments():
-    settings = _get_settings()
-    sync_google_calendar(settings=settings)
-    status = (request.args.get('status') or '').strip()
-    query = Appointment.query
-    if status:
-        query = query.filter(Appointment.status == status)
-    appointments = query.order_by(Appointment.date.desc()).all()
-    return render_template('admin/appointments.html', appointments=appointments, status=status)
+    filters = {
+        'status': (request.args.get('status') or '').strip(),
+        'q': (request.args.get('q') or '').strip(),
+        'from': (request.args.get('from') or '').strip(),
+        'to': (request.args.get('to') or '').strip(),
+    }
+    query = filter_appointments(
+        Appointment.query,
+        date_from=_parse_iso_date(filters['from']),
+        date_to=_parse_iso_date(filters['to']),
+        status=filters['status'] or None,
+        search=filters['q'] or None,
+    )
+    cursor = request.args.get('cursor')
+    try:
+        appointments, next_cursor = paginate_appointments(query, cursor=cursor, descending=True)
+    except ValueError:
+        flash('Pagina invalida.', 'warning')
+        return redirect(url_for('admin_bp.appointments', **{k: v for k, v in filters.items() if v}))
+    return render_template(
+        'admin/appointments.html',
+        appointments=appointments,
+        status=filters['status'],
+        filters={k: v for k, v in filters.items() if v},
+        next_cursor=next_cursor,
+        paged=bool(cursor),
+    )
 
 
 @admin_bp.route('/calendar')
@@ -156,11 +187,6 @@ def calendar():
 @admin_bp.route('/api/calendar/events', methods=['GET'])
 @admin_required
 def calendar_events():
-    settings = _get_settings()
-    status = _calendar_sync_status(settings)
-    if status.get("ready"):
-        sync_google_calendar(settings=settings, force=False)
-
     start = _parse_iso_datetime(request.args.get("start"))
     end = _parse_iso_datetime(request.args.get("end"))
 
@@ -168,7 +194,7 @@ def calendar_events():
     show_manual = (request.args.get("manual") or "1") == "1"
     show_cancelled = (request.args.get("cancelled") or "0") == "1"
 
-    items = []
+    appt_query = None
     if show_appointments:
         appt_query = Appointment.query
         if start and end:
@@ -178,10 +204,8 @@ def calendar_events():
             )
         if not show_cancelled:
             appt_query = appt_query.filter(~Appointment.status.in_(["cancelled", "canceled"]))
-        duration = int(current_app.config.get("GOOGLE_APPT_DURATION_MINUTES", 50) or 50)
-        for appt in appt_query.all():
-            items.append(_appointment_to_calendar_item(appt, duration))
 
+    evt_query = None
     if show_manual:
         evt_query = CalendarEvent.query
         if start and end:
@@ -191,14 +215,44 @@ def calendar_events():
             )
         if not show_cancelled:
             evt_query = evt_query.filter(CalendarEvent.status != "cancelled")
+
+    duration = int(current_app.config.get("GOOGLE_APPT_DURATION_MINUTES", 50) or 50)
+    etag = make_etag(
+        "calendar",
+        start,
+        end,
+        duration,
+        _calendar_query_version(appt_query, Appointment),
+        _calendar_query_version(evt_query, CalendarEvent),
+    )
+    if is_not_modified(etag):
+        return not_modified(etag, cache_control="private, no-cache")
+
+    items = []
+    if appt_query is not None:
+        for appt in appt_query.all():
+            items.append(_appointment_to_calendar_item(appt, duration))
+    if evt_query is not None:
         for evt in evt_query.all():
             items.append(_event_to_calendar_item(evt))
 
-    return current_app.response_class(
+    response = current_app.response_class(
         response=json.dumps(items),
         status=200,
         mimetype='application/json',
     )
+    return with_etag(response, etag, cache_control="private, no-cache")
+
+
+def _calendar_query_version(query, model):
+    """Row count plus latest change timestamps of a calendar query, or None."""
+    if query is None:
+        return None
+    columns = [func.count(model.id), func.max(model.created_at), func.max(model.updated_at)]
+    if model is Appointment:
+        columns += [func.max(Appointment.cancelled_at), func.max(Appointment.rescheduled_at)]
+    row = query.with_entities(*columns).one()
+    return tuple(str(value) for value in row)
 
 
 @admin_bp.route('/api/calendar/events', methods=['POST'])
@@ -240,9 +294,11 @@ def calendar_event_create():
     )
     db.session.add(evt)
     db.session.commit()
+    invalidate_busy_index()
+    invalidate_availability()
 
     settings = _get_settings()
-    sync_ok = upsert_calendar_event(evt, settings=settings)
+    sync_ok = upsert_calendar_event(evt, settings=settings, interactive=True)
 
     payload = _event_to_calendar_item(evt)
     payload["sync_ok"] = sync_ok
@@ -284,9 +340,11 @@ def calendar_event_update(event_id):
         evt.status = "active"
 
     db.session.commit()
+    invalidate_busy_index()
+    invalidate_availability()
 
     settings = _get_settings()
-    sync_ok = upsert_calendar_event(evt, settings=settings)
+    sync_ok = upsert_calendar_event(evt, settings=settings, interactive=True)
 
     payload = _event_to_calendar_item(evt)
     payload["sync_ok"] = sync_ok
@@ -303,9 +361,11 @@ def calendar_event_delete(event_id):
     evt = CalendarEvent.query.get_or_404(event_id)
     evt.status = "cancelled"
     db.session.commit()
+    invalidate_busy_index()
+    invalidate_availability()
 
     settings = _get_settings()
-    cancel_calendar_event(evt, settings=settings)
+    cancel_calendar_event(evt, settings=settings, interactive=True)
 
     return current_app.response_class(
         response=json.dumps({"ok": True}),
@@ -314,6 +374,91 @@ def calendar_event_delete(event_id):
     )
 
 
+@admin_bp.route('/schedule')
+@admin_required
+def schedule():
+    rules = ScheduleRule.query.order_by(ScheduleRule.weekday.asc(), ScheduleRule.start_time.asc()).all()
+    exceptions = (
+        ScheduleException.query
+        .filter(ScheduleException.date >= date.today())
+        .order_by(ScheduleException.date.asc(), ScheduleException.start_time.asc())
+        .all()
+    )
+    return render_template(
+        'admin/schedule.html',
+        rules=rules,
+        exceptions=exceptions,
+        rule_form=ScheduleRuleForm(),
+        exception_form=ScheduleExceptionForm(),
+        weekday_labels=dict(WEEKDAY_CHOICES),
+    )
+
+
+@admin_bp.route('/schedule/rules/add', methods=['POST'])
+@admin_required
+def add_schedule_rule():
+    form = ScheduleRuleForm()
+    if form.validate_on_submit():
+        db.session.add(ScheduleRule(
+            weekday=form.weekday.data,
+            start_time=form.start_time.data,
+            end_time=form.end_time.data,
+            is_active=True,
+        ))
+        db.session.commit()
+        invalidate_availability()
+        flash('Horario semanal adicionado.', 'success')
+    else:
+        for errors in form.errors.values():
+            for error in errors:
+                flash(error, 'danger')
+    return redirect(url_for('admin_bp.schedule'))
+
+
+@admin_bp.route('/schedule/rules/<int:rule_id>/delete', methods=['POST'])
+@admin_required
+def delete_schedule_rule(rule_id):
+    rule = ScheduleRule.query.get_or_404(rule_id)
+    db.session.delete(rule)
+    db.session.commit()
+    invalidate_availability()
+    flash('Horario semanal removido.', 'success')
+    return redirect(url_for('admin_bp.schedule'))
+
+
+@admin_bp.route('/schedule/exceptions/add', methods=['POST'])
+@admin_required
+def add_schedule_exception():
+    form = ScheduleExceptionForm()
+    if form.validate_on_submit():
+        db.session.add(ScheduleException(
+            date=form.date.data,
+            kind=form.kind.data,
+            start_time=form.start_time.data,
+            end_time=form.end_time.data,
+            note=(form.note.data or '').strip() or None,
+        ))
+        db.session.commit()
+        invalidate_availability([form.date.data])
+        flash('Excecao adicionada.', 'success')
+    else:
+        for errors in form.errors.values():
+            for error in errors:
+                flash(error, 'danger')
+    return redirect(url_for('admin_bp.schedule'))
+
+
+@admin_bp.route('/schedule/exceptions/<int:exception_id>/delete', methods=['POST'])
+@admin_required
+def delete_schedule_exception(exception_id):
+    item = ScheduleException.query.get_or_404(exception_id)
+    db.session.delete(item)
+    db.session.commit()
+    invalidate_availability([item.date])
+    flash('Excecao removida.', 'success')
+    return redirect(url_for('admin_bp.schedule'))
+
+
 @admin_bp.route('/appointments/add', methods=['GET', 'POST'])
 @admin_required
 def add_appointment():
@@ -437,13 +582,13 @@ def update_appointment_status(id, status):
         appointment.status = status
         if status == 'cancelled':
             appointment.cancelled_at = datetime.utcnow()
+            release_seat(appointment)
         else:
             appointment.cancelled_at = None
+            assign_overflow_seat(appointment, appointment.date, appointment.time)
+        enqueue_appointment_sync(appointment, 'cancel' if status == 'cancelled' else 'upsert')
         db.session.commit()
-        if status == 'cancelled':
-            cancel_appointment_event(appointment)
-        else:
-            upsert_appointment_event(appointment)
+        invalidate_availability([appointment.date])
         flash('Status do agendamento atualizado com sucesso!', 'success')
     else:
         flash('Status inválido', 'danger')
@@ -586,24 +731,12 @@ def _calendar_missing_requirements(settings: Settings, status: dict) -> list[str
     return missing
 
 
-def _iter_day_slots(day: date):
-    start, end = get_working_hours()
-    slot_minutes = get_slot_minutes()
-    cur = datetime.combine(day, start)
-    end_dt = datetime.combine(day, end)
-    while cur < end_dt:
-        yield cur.time()
-        cur += timedelta(minutes=slot_minutes)
-
-
 def _find_next_available_slot(days: int = 14):
     start_day = date.today() + timedelta(days=1)
-    for offset in range(days):
-        day = start_day + timedelta(days=offset)
-        for slot_time in _iter_day_slots(day):
-            if is_slot_available(day, slot_time):
-                return day, slot_time
-    return None, None
+    found = find_next_available(datetime.combine(start_day, datetime.min.time()), days, n=1)
+    if not found:
+        return None, None
+    return found[0]
 
 
 def _parse_iso_datetime(value: str | None) -> datetime | None:
@@ -628,6 +761,11 @@ def _parse_iso_datetime(value: str | None) -> datetime | None:
     return dt
 
 
+def _parse_iso_date(value: str | None) -> date | None:
+    parsed = _parse_iso_datetime(value)
+    return parsed.date() if parsed else None
+
+
 def _appointment_color(status: str | None) -> str:
     status = (status or "").lower()
     if status == "confirmed":
@@ -892,6 +1030,7 @@ def settings_google_calendar():
             settings.google_credentials_uploaded_at = None
 
         db.session.commit()
+        reset_service_cache()
         flash('Configuracoes atualizadas com sucesso!', 'success')
         return redirect(url_for('admin_bp.settings_google_calendar'))
 
@@ -906,12 +1045,9 @@ def settings_google_calendar():
         .all()
     )
 
-    sync_candidates = Appointment.query.filter(
-        Appointment.date >= today,
-        Appointment.status.in_(["pending", "confirmed"]),
-    )
-    sync_total = sync_candidates.count()
-    sync_synced = sync_candidates.filter(Appointment.google_event_id.isnot(None)).count()
+    sync_counts = count_stale_events(today)
+    sync_total = sync_counts['total']
+    sync_synced = sync_counts['synced']
     sync_unsynced = max(0, sync_total - sync_synced)
 
     return render_template(
@@ -926,6 +1062,7 @@ def settings_google_calendar():
         sync_total=sync_total,
         sync_synced=sync_synced,
         sync_unsynced=sync_unsynced,
+        sync_stale=sync_counts['stale_appointments'] + sync_counts['stale_events'],
     )
 
 
@@ -984,13 +1121,22 @@ def google_calendar_resync():
         flash('Nenhum agendamento encontrado no periodo informado.', 'info')
         return redirect(url_for('admin_bp.settings_google_calendar'))
 
-    updated = 0
-    for appt in appts:
-        if upsert_appointment_event(appt, settings=settings):
-            updated += 1
-
-    if updated:
-        flash(f'Reenvio concluido: {updated}/{len(appts)} eventos atualizados.', 'success')
+    report = batch_upsert_appointment_events(appts, settings=settings, interactive=True)
+    deferred = set(report['deferred'])
+    if deferred:
+        # Throttled by Google: the outbox worker sends the rest with backoff.
+        for appt in appts:
+            if appt.id in deferred:
+                enqueue_appointment_sync(appt)
+        db.session.commit()
+    synced = report['created'] + report['updated'] + report['skipped']
+    if synced or deferred:
+        flash(
+            f"Reenvio concluido: {synced}/{report['total']} eventos "
+            f"({report['created']} criados, {report['updated']} atualizados, "
+            f"{report['skipped']} sem alteracao, {len(deferred)} na fila, {report['failed']} com falha).",
+            'success' if not report['failed'] else 'warning',
+        )
     else:
         flash('Nao foi possivel reenviar eventos no periodo.', 'warning')
     return redirect(url_for('admin_bp.settings_google_calendar'))
@@ -1178,7 +1324,7 @@ def test_email_settings():
             recipients=[to_email],
             body="Este é um e-mail de teste enviado pelo sistema.",
         )
-        mail.send(msg)
+        send_mail(mail, msg, "test")
         flash(f'E-mail de teste enviado para {to_email}.', 'success')
     except Exception as e:
         current_app.logger.exception("Falha ao enviar e-mail de teste: %s", e)
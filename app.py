@@ -4,19 +4,30 @@ from datetime import datetime
 from flask import Flask
 
 from admin_routes import admin_bp
+from appointment_bulk import register_bulk_commands
 from appointments_api import appointments_bp
 from availability_routes import availability_bp
+from calendar_outbox import register_outbox_commands
+from calendar_sources import register_source_commands
+from calendar_watch import register_watch_commands
+from calendar_watch_routes import calendar_watch_bp
 from chatbot_routes import chatbot_bp
 from config import get_config_for_env
+from db_instrumentation import init_db_instrumentation
 from debug_routes import debug_bp
 from deploy import register_deploy_commands
 from extensions import db, login_manager, mail, migrate
+from google_sync_scheduler import register_sync_commands, start_background_sync
 from health_routes import health_bp
-from models import Settings, User
+from metrics import init_metrics
+from metrics_routes import metrics_bp
+from models import User
 from reminders import register_reminder_commands
 from security import apply_security_headers, register_template_security
 from routes import main_bp
+from schedule_service import init_schedule_cache
 from seed import register_seed_commands
+from settings_cache import get_settings, init_settings_cache
 from student_routes import student_bp
 
 
@@ -61,12 +72,14 @@ def create_app(config_object=None) -> Flask:
     mail.init_app(app)
 
     app.register_blueprint(health_bp)
+    app.register_blueprint(metrics_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(admin_bp, url_prefix="/admin")
     app.register_blueprint(student_bp)
     app.register_blueprint(chatbot_bp)
     app.register_blueprint(availability_bp)
     app.register_blueprint(appointments_bp)
+    app.register_blueprint(calendar_watch_bp)
 
     if app.config.get("ENABLE_DEBUG_ROUTES"):
         app.register_blueprint(debug_bp)
@@ -74,12 +87,22 @@ def create_app(config_object=None) -> Flask:
     register_seed_commands(app)
     register_reminder_commands(app)
     register_deploy_commands(app)
+    register_bulk_commands(app)
+    register_outbox_commands(app)
+    register_sync_commands(app)
+    register_watch_commands(app)
+    register_source_commands(app)
     register_template_security(app)
+    init_settings_cache(app)
+    init_schedule_cache(app)
+    init_db_instrumentation(app)
+    init_metrics(app)
     _ensure_upload_dirs(app)
+    start_background_sync(app)
 
     @app.context_processor
     def inject_settings():
-        settings = Settings.query.first()
+        settings = get_settings()
         return {"settings": settings or {}, "current_year": datetime.now().year}
 
     @app.after_request
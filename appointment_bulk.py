@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import csv
+import json
+import secrets
+from datetime import date as dt_date, datetime
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+
+import click
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from availability_cache import invalidate_availability
+from availability_service import BOOKED_STATUSES, get_schedule, get_slot_grid, grid_for_day
+from extensions import db
+from google_calendar import is_sync_enabled, push_pending_appointment_events
+from metrics import BOOKINGS
+from models import Appointment, CalendarOutbox, SlotReservation
+from schedule_service import known_resources
+
+DEFAULT_CHUNK_SIZE = 500
+MAX_CHUNK_SIZE = 5000
+IMPORT_STATUSES = {"pending", "confirmed", "cancelled"}
+
+
+def _parse_date(value: str) -> dt_date | None:
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_time(value: str):
+    for fmt in ("%H:%M", "%H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt).time().replace(second=0)
+        except ValueError:
+            continue
+    return None
+
+
+def iter_records(stream: TextIO, fmt: str) -> Iterator[tuple[int, dict | None]]:
+    """Yield ``(line, record)`` from a CSV or NDJSON text stream.
+
+    Lines that cannot be decoded come out as ``(line, None)`` so the caller
+    can report them without stopping the import.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_no, record if isinstance(record, dict) else None
+
+
+def _clean(record: dict, key: str) -> str:
+    return str(record.get(key) or "").strip()
+
+
+def _parse_record(record: dict | None, default_status: str) -> tuple[dict | None, str | None]:
+    if record is None:
+        return None, "Linha invalida."
+
+    name = _clean(record, "name")
+    phone = _clean(record, "phone")
+    if not name or not phone:
+        return None, "name e phone sao obrigatorios."
+
+    day = _parse_date(_clean(record, "date"))
+    slot_time = _parse_time(_clean(record, "time"))
+    if not day or not slot_time:
+        return None, "Formato invalido. Use date=YYYY-MM-DD e time=HH:MM."
+
+    status = (_clean(record, "status") or default_status).lower()
+    if status == "canceled":
+        status = "cancelled"
+    if status not in IMPORT_STATUSES:
+        return None, f"Status invalido: {status}."
+
+    return {
+        "name": name[:100],
+        "phone": phone[:20],
+        "email": _clean(record, "email")[:100],
+        "date": day,
+        "time": slot_time,
+        "reason": _clean(record, "reason") or None,
+        "resource": _clean(record, "resource").lower()[:60] or None,
+        "status": status,
+    }, None
+
+
+def _taken_seats(start_day: dt_date, end_day: dt_date) -> dict[tuple, set[int]]:
+    rows = db.session.execute(
+        select(SlotReservation.date, SlotReservation.time, SlotReservation.resource, SlotReservation.seat)
+        .where(SlotReservation.date >= start_day, SlotReservation.date <= end_day)
+    ).all()
+    taken: dict[tuple, set[int]] = {}
+    for day, slot_time, resource, seat in rows:
+        taken.setdefault((day, slot_time, resource or None), set()).add(seat)
+    return taken
+
+
+def _existing_bookings(start_day: dt_date, end_day: dt_date) -> dict[tuple, int]:
+    rows = db.session.execute(
+        select(Appointment.date, Appointment.time, Appointment.phone, Appointment.resource, func.min(Appointment.id))
+        .where(Appointment.date >= start_day, Appointment.date <= end_day)
+        .where(~Appointment.status.in_(["cancelled", "canceled"]))
+        .group_by(Appointment.date, Appointment.time, Appointment.phone, Appointment.resource)
+    ).all()
+    return {(day, slot_time, phone, resource): appt_id for day, slot_time, phone, resource, appt_id in rows}
+
+
+def _import_chunk(chunk: list[tuple[int, dict | None]], default_status: str, queue_sync: bool) -> list[dict]:
+    results: dict[int, dict] = {}
+    parsed = []
+    resources = None
+    for line, raw in chunk:
+        record, error = _parse_record(raw, default_status)
+        if not error and record["resource"] is not None:
+            resources = known_resources() if resources is None else resources
+            if record["resource"] not in resources:
+                error = "Profissional ou sala desconhecido."
+        if error:
+            results[line] = {"line": line, "ok": False, "error": error}
+        else:
+            parsed.append((line, record))
+
+    if parsed:
+        first = min(record["date"] for _, record in parsed)
+        last = max(record["date"] for _, record in parsed)
+        base = get_slot_grid()
+        schedules = {
+            resource: get_schedule(first, last, resource)
+            for resource in {record["resource"] for _, record in parsed}
+        }
+        taken = _taken_seats(first, last)
+        existing = _existing_bookings(first, last)
+        now = datetime.utcnow()
+
+        staged = []
+        repeated = []
+        batch_tokens: dict[tuple, str] = {}
+        for line, record in parsed:
+            day, slot_time, resource = record["date"], record["time"], record["resource"]
+            schedule = schedules[resource]
+            grid = grid_for_day(schedule[day], base)
+            # Calendar blocks and partial closures only matter for rows that hold a seat.
+            busy = schedule[day].busy if record["status"] != "cancelled" else None
+            if not grid.is_free(slot_time, busy):
+                results[line] = {"line": line, "ok": False, "error": "Horario fora da agenda."}
+                continue
+
+            key = (day, slot_time, record["phone"], resource)
+            if record["status"] != "cancelled":
+                if key in existing:
+                    results[line] = {"line": line, "ok": True, "skipped": True, "id": existing[key]}
+                    continue
+                if key in batch_tokens:
+                    repeated.append((line, key))
+                    continue
+
+            seat = None
+            if record["status"] in BOOKED_STATUSES:
+                seats = taken.setdefault((day, slot_time, resource), set())
+                seat = next((s for s in range(base.capacity) if s not in seats), None)
+                if seat is None:
+                    results[line] = {"line": line, "ok": False, "error": "Horario lotado."}
+                    continue
+                seats.add(seat)
+
+            record["manage_token"] = secrets.token_urlsafe(16)
+            if record["status"] != "cancelled":
+                batch_tokens[key] = record["manage_token"]
+            record["cancelled_at"] = now if record["status"] == "cancelled" else None
+            staged.append((line, record, seat))
+
+        if staged:
+            try:
+                db.session.execute(insert(Appointment), [record for _, record, _ in staged])
+                tokens = [record["manage_token"] for _, record, _ in staged]
+                ids = dict(db.session.execute(
+                    select(Appointment.manage_token, Appointment.id)
+                    .where(Appointment.manage_token.in_(tokens))
+                ).all())
+                reservations = [
+                    {
+                        "appointment_id": ids[record["manage_token"]],
+                        "date": record["date"],
+                        "time": record["time"],
+                        "resource": record["resource"] or "",
+                        "seat": seat,
+                        "created_at": now,
+                    }
+                    for _, record, seat in staged
+                    if seat is not None
+                ]
+                if reservations:
+                    db.session.execute(insert(SlotReservation), reservations)
+                today = dt_date.today()
+                outbox = [
+                    {
+                        "appointment_id": ids[record["manage_token"]],
+                        "action": "upsert",
+                        "status": "pending",
+                        "attempts": 0,
+                        "coalesced": 0,
+                        "next_attempt_at": now,
+                    }
+                    for _, record, seat in staged
+                    if queue_sync and seat is not None and record["date"] >= today
+                ]
+                if outbox:
+                    db.session.execute(insert(CalendarOutbox), outbox)
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                for line in [line for line, _, _ in staged] + [line for line, _ in repeated]:
+                    results[line] = {
+                        "line": line,
+                        "ok": False,
+                        "error": "Conflito ao gravar o lote. Envie estas linhas novamente.",
+                    }
+            else:
+                # Core inserts skip the session hooks that count ORM bookings.
+                BOOKINGS.inc(len(staged), action="created")
+                invalidate_availability({record["date"] for _, record, _ in staged})
+                for line, record, _ in staged:
+                    results[line] = {
+                        "line": line,
+                        "ok": True,
+                        "id": ids[record["manage_token"]],
+                        "status": record["status"],
+                    }
+                for line, key in repeated:
+                    results[line] = {"line": line, "ok": True, "skipped": True, "id": ids[batch_tokens[key]]}
+
+    return [results[line] for line, _ in chunk]
+
+
+def import_appointments(
+    records: Iterable[tuple[int, dict | None]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    default_status: str = "pending",
+) -> Iterator[dict]:
+    """Import records chunk by chunk, yielding one result per input line.
+
+    Each chunk is validated against the slot grid with one schedule load and
+    written with executemany. Google Calendar events are not created here:
+    upcoming bookings get a ``calendar_outbox`` entry in the same transaction
+    for ``flask calendar-worker`` to send. The last item is a summary.
+    """
+    chunk_size = max(1, min(chunk_size, MAX_CHUNK_SIZE))
+    summary = {"created": 0, "skipped": 0, "failed": 0}
+    records = iter(records)
+    queue_sync = is_sync_enabled()
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        for result in _import_chunk(chunk, default_status, queue_sync):
+            if not result["ok"]:
+                summary["failed"] += 1
+            elif result.get("skipped"):
+                summary["skipped"] += 1
+            else:
+                summary["created"] += 1
+            yield result
+    yield {"summary": summary}
+
+
+def export_record(appt: Appointment) -> dict:
+    return {
+        "id": appt.id,
+        "name": appt.name,
+        "email": appt.email,
+        "phone": appt.phone,
+        "date": appt.date.strftime("%Y-%m-%d") if appt.date else None,
+        "time": appt.time.strftime("%H:%M") if appt.time else None,
+        "reason": appt.reason,
+        "resource": appt.resource,
+        "status": appt.status,
+        "created_at": appt.created_at.isoformat() if appt.created_at else None,
+    }
+
+
+def iter_export(
+    start_day: dt_date | None = None,
+    end_day: dt_date | None = None,
+    status: str | None = None,
+    batch_size: int = 1000,
+) -> Iterator[dict]:
+    query = select(Appointment).order_by(Appointment.date, Appointment.time, Appointment.id)
+    if start_day:
+        query = query.where(Appointment.date >= start_day)
+    if end_day:
+        query = query.where(Appointment.date <= end_day)
+    if status:
+        query = query.where(Appointment.status == status)
+    for appt in db.session.scalars(query.execution_options(yield_per=batch_size)):
+        yield export_record(appt)
+
+
+def to_ndjson(items: Iterable[dict]) -> Iterator[str]:
+    for item in items:
+        yield json.dumps(item, ensure_ascii=False) + "\n"
+
+
+def register_bulk_commands(app):
+    @app.cli.command("import-appointments")
+    @click.argument("source", type=click.File("r", encoding="utf-8-sig"))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default=None, help="Padrao: pela extensao do arquivo.")
+    @click.option("--chunk-size", default=DEFAULT_CHUNK_SIZE, show_default=True)
+    @click.option("--status", "default_status", type=click.Choice(sorted(IMPORT_STATUSES)), default="pending", show_default=True)
+    def import_appointments_command(source, fmt, chunk_size, default_status):
+        """Importa agendamentos de CSV/NDJSON e escreve o resultado em NDJSON."""
+        fmt = fmt or ("csv" if str(source.name).lower().endswith(".csv") else "ndjson")
+        for line in to_ndjson(import_appointments(iter_records(source, fmt), chunk_size, default_status)):
+            click.echo(line, nl=False)
+
+    @app.cli.command("export-appointments")
+    @click.option("--start", type=click.DateTime(formats=["%Y-%m-%d"]), default=None)
+    @click.option("--end", type=click.DateTime(formats=["%Y-%m-%d"]), default=None)
+    @click.option("--status", default=None)
+    @click.option("--output", type=click.File("w", encoding="utf-8"), default="-")
+    def export_appointments_command(start, end, status, output):
+        """Exporta agendamentos em NDJSON."""
+        for line in to_ndjson(iter_export(start.date() if start else None, end.date() if end else None, status)):
+            output.write(line)
+
+    @app.cli.command("push-appointment-events")
+    @click.option("--limit", default=200, show_default=True)
+    def push_appointment_events_command(limit):
+        """Cria no Google Agenda os eventos que ainda faltam para agendamentos futuros."""
+        click.echo(f"Eventos enviados: {push_pending_appointment_events(limit=limit)}")
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import date as dt_date, time as dt_time
+
+from sqlalchemy import or_, tuple_
+
+from models import Appointment
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(appt: Appointment) -> str:
+    raw = json.dumps([appt.date.isoformat(), appt.time.strftime("%H:%M:%S"), appt.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[dt_date, dt_time, int]:
+    """Inverse of ``encode_cursor``; raises ``ValueError`` for anything else."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        day, slot_time, appt_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return dt_date.fromisoformat(day), dt_time.fromisoformat(slot_time), int(appt_id)
+    except Exception as exc:
+        raise ValueError("cursor invalido") from exc
+
+
+def filter_appointments(
+    query,
+    date_from: dt_date | None = None,
+    date_to: dt_date | None = None,
+    status: str | None = None,
+    search: str | None = None,
+):
+    if date_from:
+        query = query.filter(Appointment.date >= date_from)
+    if date_to:
+        query = query.filter(Appointment.date <= date_to)
+    if status:
+        query = query.filter(Appointment.status == status)
+    if search:
+        like = f"%{search}%"
+        query = query.filter(
+            or_(
+                Appointment.name.ilike(like),
+                Appointment.phone.ilike(like),
+                Appointment.email.ilike(like),
+            )
+        )
+    return query
+
+
+def paginate_appointments(
+    query,
+    cursor: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    descending: bool = False,
+) -> tuple[list[Appointment], str | None]:
+    """One keyset page ordered by ``(date, time, id)`` and the cursor of the next.
+
+    The seek is a row-value comparison on the ``ix_appointment_date_time_id``
+    columns, which the planner can turn into an index range starting right
+    after the previous page, however deep the client pages.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    columns = (Appointment.date, Appointment.time, Appointment.id)
+    if cursor:
+        position = tuple_(*columns)
+        last_seen = decode_cursor(cursor)
+        query = query.filter(position < last_seen if descending else position > last_seen)
+
+    order = [column.desc() for column in columns] if descending else [column.asc() for column in columns]
+    rows = query.order_by(*order).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -1,14 +1,19 @@
+import io
 import os
 from datetime import datetime
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from sqlalchemy import and_
 from sqlalchemy.exc import IntegrityError
 
-from availability_service import is_slot_available, is_valid_slot
+from appointment_bulk import DEFAULT_CHUNK_SIZE, import_appointments, iter_export, iter_records, to_ndjson
+from appointment_listing import DEFAULT_PAGE_SIZE, filter_appointments, paginate_appointments
+from availability_cache import invalidate_availability
+from availability_service import commit_with_reserved_seat, is_valid_slot, release_seat, set_reservation
+from calendar_outbox import enqueue_appointment_sync
 from extensions import db
 from models import Appointment
-from google_calendar import upsert_appointment_event, cancel_appointment_event
+from schedule_service import known_resources
 
 appointments_bp = Blueprint("appointments_bp", __name__)
 
@@ -53,6 +58,7 @@ def _appt_to_dict(a: Appointment):
         "time": a.time.strftime("%H:%M") if a.time else None,
         "reason": getattr(a, "reason", None),
         "status": a.status,
+        "resource": a.resource,
         "created_at": a.created_at.isoformat() if getattr(a, "created_at", None) else None,
     }
 
@@ -64,12 +70,17 @@ def create_pending_appointment(
     date_s: str,
     time_s: str,
     email: str | None = None,
-    reason: str | None = None
+    reason: str | None = None,
+    resource: str | None = None,
 ):
     """
     Reusable helper (endpoint and chatbot).
-    - Idempotent by (date, time, phone) when pending exists.
-    - Avoids overbooking using availability rules.
+    - Idempotent by (date, time, phone, resource) when pending exists.
+    - Avoids overbooking: each booking takes a seat in slot_reservation,
+      whose unique (date, time, resource, seat) constraint rejects concurrent
+      overbooking.
+    - ``resource`` books a professional or room (see ``CalendarSource``);
+      without it the booking goes to the clinic's own agenda.
     - Email saved as "" when missing (avoid NOT NULL).
     """
     day = _parse_date(date_s)
@@ -78,7 +89,11 @@ def create_pending_appointment(
     if not day or not slot_time:
         raise ValueError("Formato invalido. Use date=YYYY-MM-DD e time=HH:MM.")
 
-    if not is_valid_slot(day, slot_time):
+    resource = (resource or "").strip().lower() or None
+    if resource is not None and resource not in known_resources():
+        raise ValueError("Profissional ou sala desconhecido.")
+
+    if not is_valid_slot(day, slot_time, resource):
         raise ValueError("Horario fora da agenda. Escolha outro.")
 
     if datetime.combine(day, slot_time) < datetime.now():
@@ -91,35 +106,38 @@ def create_pending_appointment(
             Appointment.time == slot_time,
             Appointment.phone == phone,
             Appointment.status == "pending",
+            Appointment.resource.is_(None) if resource is None else Appointment.resource == resource,
         )
     ).first()
     if same_pending:
-        if not same_pending.manage_token:
-            same_pending.ensure_manage_token()
-            db.session.commit()
+        same_pending.ensure_manage_token()
         if not same_pending.google_event_id:
-            upsert_appointment_event(same_pending)
+            enqueue_appointment_sync(same_pending)
+        db.session.commit()
         return same_pending
 
-    if not is_slot_available(day, slot_time):
-        raise ValueError("Este horario acabou de ser ocupado. Escolha outro.")
-
     safe_email = (email or "").strip()
+    created = {}
+
+    def _stage(seat: int):
+        appt = Appointment(
+            name=name.strip(),
+            email=safe_email,
+            phone=phone.strip(),
+            date=day,
+            time=slot_time,
+            reason=reason,
+            resource=resource,
+            status="pending",
+        )
+        appt.ensure_manage_token()
+        set_reservation(appt, day, slot_time, seat)
+        db.session.add(appt)
+        enqueue_appointment_sync(appt)
+        created["appt"] = appt
 
-    appt = Appointment(
-        name=name.strip(),
-        email=safe_email,
-        phone=phone.strip(),
-        date=day,
-        time=slot_time,
-        reason=reason,
-        status="pending",
-    )
-    appt.ensure_manage_token()
-
-    db.session.add(appt)
     try:
-        db.session.commit()
+        seat = commit_with_reserved_seat(_stage)
     except IntegrityError as e:
         db.session.rollback()
         msg = str(e.orig) if getattr(e, "orig", None) else str(e)
@@ -127,8 +145,11 @@ def create_pending_appointment(
             raise ValueError("No momento o sistema exige email. Informe um email para continuar.")
         raise ValueError("Erro ao salvar agendamento.")
 
-    upsert_appointment_event(appt)
-    return appt
+    if seat is None:
+        raise ValueError("Este horario acabou de ser ocupado. Escolha outro.")
+
+    invalidate_availability([day])
+    return created["appt"]
 
 
 # ---------------------------
@@ -141,27 +162,81 @@ def list_appointments():
         msg, code = err
         return jsonify({"ok": False, "error": msg}), code
 
-    date_s = (request.args.get("date") or "").strip()
-    if not date_s:
-        return jsonify({"ok": False, "error": "Parametro date e obrigatorio (YYYY-MM-DD)."}), 400
+    filters = {}
+    for param, key in (("date", None), ("from", "date_from"), ("to", "date_to")):
+        raw = (request.args.get(param) or "").strip()
+        if not raw:
+            continue
+        value = _parse_date(raw)
+        if not value:
+            return jsonify({"ok": False, "error": f"Parametro {param} invalido. Use YYYY-MM-DD."}), 400
+        if key:
+            filters[key] = value
+        else:
+            filters["date_from"] = filters["date_to"] = value
 
-    day = _parse_date(date_s)
-    if not day:
-        return jsonify({"ok": False, "error": "Formato invalido. Use YYYY-MM-DD."}), 400
-
-    items = (
-        Appointment.query
-        .filter(Appointment.date == day)
-        .order_by(Appointment.time.asc())
-        .all()
+    try:
+        limit = int(request.args.get("limit") or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"ok": False, "error": "limit invalido."}), 400
+
+    query = filter_appointments(
+        Appointment.query,
+        status=(request.args.get("status") or "").strip() or None,
+        search=(request.args.get("q") or "").strip() or None,
+        **filters,
     )
+    try:
+        items, next_cursor = paginate_appointments(query, cursor=request.args.get("cursor"), limit=limit)
+    except ValueError:
+        return jsonify({"ok": False, "error": "cursor invalido."}), 400
 
-    return jsonify({
+    payload = {
         "ok": True,
-        "date": date_s,
         "count": len(items),
         "appointments": [_appt_to_dict(a) for a in items],
-    }), 200
+        "next_cursor": next_cursor,
+    }
+    if request.args.get("date"):
+        payload["date"] = request.args.get("date").strip()
+    return jsonify(payload), 200
+
+
+@appointments_bp.route("/api/appointments/bulk", methods=["POST"])
+def bulk_import_appointments():
+    ok, err = _require_admin()
+    if not ok:
+        msg, code = err
+        return jsonify({"ok": False, "error": msg}), code
+
+    fmt = (request.args.get("format") or "").strip().lower()
+    if not fmt:
+        fmt = "csv" if request.mimetype == "text/csv" else "ndjson"
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"ok": False, "error": "Formato invalido. Use csv ou ndjson."}), 400
+
+    try:
+        chunk_size = int(request.args.get("chunk_size") or DEFAULT_CHUNK_SIZE)
+    except ValueError:
+        return jsonify({"ok": False, "error": "chunk_size invalido."}), 400
+
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8-sig", newline="")
+    results = import_appointments(iter_records(stream, fmt), chunk_size=chunk_size)
+    return Response(stream_with_context(to_ndjson(results)), mimetype="application/x-ndjson")
+
+
+@appointments_bp.route("/api/appointments/export", methods=["GET"])
+def export_appointments():
+    ok, err = _require_admin()
+    if not ok:
+        msg, code = err
+        return jsonify({"ok": False, "error": msg}), code
+
+    start = _parse_date((request.args.get("start") or "").strip())
+    end = _parse_date((request.args.get("end") or "").strip())
+    status = (request.args.get("status") or "").strip() or None
+    rows = iter_export(start, end, status)
+    return Response(stream_with_context(to_ndjson(rows)), mimetype="application/x-ndjson")
 
 
 @appointments_bp.route("/api/appointments/request", methods=["POST"])
@@ -174,6 +249,7 @@ def request_appointment():
     date_s = (data.get("date") or "").strip()
     time_s = (data.get("time") or "").strip()
     reason = (data.get("reason") or "").strip() or None
+    resource = (data.get("resource") or "").strip() or None
 
     if not name or not phone or not date_s or not time_s:
         return jsonify({"ok": False, "error": "name, phone, date e time sao obrigatorios"}), 400
@@ -186,6 +262,7 @@ def request_appointment():
             date_s=date_s,
             time_s=time_s,
             reason=reason,
+            resource=resource,
         )
     except ValueError as e:
         msg = str(e)
@@ -199,6 +276,7 @@ def request_appointment():
         "status": appt.status,
         "date": appt.date.strftime("%Y-%m-%d"),
         "time": appt.time.strftime("%H:%M"),
+        "resource": appt.resource,
         "message": "Solicitacao registrada. Nossa equipe confirmara em breve.",
     }), 201
 
@@ -218,8 +296,8 @@ def confirm_appointment(appt_id: int):
         return jsonify({"ok": False, "error": "Nao e possivel confirmar um agendamento cancelado."}), 409
 
     appt.status = "confirmed"
+    enqueue_appointment_sync(appt)
     db.session.commit()
-    upsert_appointment_event(appt)
 
     return jsonify({"ok": True, "appointment": _appt_to_dict(appt)}), 200
 
@@ -237,7 +315,9 @@ def cancel_appointment(appt_id: int):
 
     appt.status = "cancelled"
     appt.cancelled_at = datetime.utcnow()
+    release_seat(appt)
+    enqueue_appointment_sync(appt, "cancel")
     db.session.commit()
-    cancel_appointment_event(appt)
+    invalidate_availability([appt.date])
 
     return jsonify({"ok": True, "appointment": _appt_to_dict(appt)}), 200
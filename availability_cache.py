@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date as dt_date
+from typing import Iterable
+
+from flask import current_app, has_app_context
+
+from availability_service import get_availability_range, get_availability_version
+
+try:
+    import redis
+except Exception:  # pragma: no cover - optional dependency in some environments
+    redis = None
+
+
+DEFAULT_CACHE_TTL = 60
+DEFAULT_CACHE_MAX_DAYS = 256
+KEY_PREFIX = "avail:"
+
+
+def _int_env(name: str, default: int, minimum: int = 0) -> int:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return max(minimum, int(value))
+    except ValueError:
+        return default
+
+
+class MemoryBackend:
+    """Per-process LRU with a TTL per entry."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_MAX_DAYS):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: list[str]) -> list[str | None]:
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None or entry[0] <= now:
+                    self._data.pop(key, None)
+                    values.append(None)
+                    continue
+                self._data.move_to_end(key)
+                values.append(entry[1])
+        return values
+
+    def set_many(self, items: dict[str, str], ttl: int) -> None:
+        expires = time.monotonic() + ttl
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = (expires, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, keys: list[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    """Shared cache so every gunicorn worker sees the same invalidations.
+
+    ``client`` only needs ``mget``, ``set``, ``delete`` and ``scan_iter``;
+    the LRU bound is left to the server's ``maxmemory-policy``.
+    """
+
+    def __init__(self, client, prefix: str = KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    def get_many(self, keys: list[str]) -> list[str | None]:
+        values = self.client.mget([self.prefix + key for key in keys])
+        return [value.decode() if isinstance(value, bytes) else value for value in values]
+
+    def set_many(self, items: dict[str, str], ttl: int) -> None:
+        for key, value in items.items():
+            self.client.set(self.prefix + key, value, ex=ttl)
+
+    def delete(self, keys: list[str]) -> None:
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def _build_backend():
+    kind = (os.getenv("AVAIL_CACHE_BACKEND") or "memory").strip().lower()
+    if kind in ("none", "off", "0"):
+        return None
+    if kind == "redis":
+        url = (os.getenv("AVAIL_CACHE_URL") or "").strip()
+        if redis is not None and url:
+            return RedisBackend(redis.Redis.from_url(url))
+        if has_app_context():
+            current_app.logger.warning("AVAIL_CACHE_BACKEND=redis sem AVAIL_CACHE_URL ou pacote redis; usando memoria.")
+    return MemoryBackend(_int_env("AVAIL_CACHE_MAX_DAYS", DEFAULT_CACHE_MAX_DAYS, minimum=1))
+
+
+def get_cache_backend():
+    if not has_app_context():
+        return None
+    extensions = current_app.extensions
+    if "availability_cache" not in extensions:
+        extensions["availability_cache"] = _build_backend()
+    return extensions["availability_cache"]
+
+
+def _range_key(start_day: dt_date, end_day: dt_date, version, resource: str | None = None) -> str:
+    digest = hashlib.sha1(repr(version).encode()).hexdigest()[:16]
+    return f"{start_day.isoformat()}:{end_day.isoformat()}:{resource or ''}:{digest}"
+
+
+def cached_availability_range(
+    start_day: dt_date, end_day: dt_date, version: tuple | None = None, resource: str | None = None
+) -> list[dict]:
+    """``get_availability_range`` served from the cache.
+
+    Entries are keyed by the window and by ``version``, the
+    ``get_availability_version`` stamp the route also turns into the ETag.
+    A body is therefore only ever served under the version it was computed
+    for: once bookings, calendar events or schedule rows change, in any
+    worker, the key changes and the old entry is never read again.
+    """
+    backend = get_cache_backend()
+    if backend is None:
+        return get_availability_range(start_day, end_day, resource)
+
+    key = _range_key(start_day, end_day, version or get_availability_version(start_day, end_day), resource)
+    cached = backend.get_many([key])[0]
+    if cached is not None:
+        return json.loads(cached)
+
+    days = get_availability_range(start_day, end_day, resource)
+    backend.set_many({key: json.dumps(days)}, _int_env("AVAIL_CACHE_TTL", DEFAULT_CACHE_TTL, minimum=1))
+    return days
+
+
+def cached_availability(day: dt_date, version: tuple | None = None, resource: str | None = None) -> dict:
+    return cached_availability_range(day, day, version, resource)[0]
+
+
+def invalidate_availability(days: Iterable[dt_date | None] | None = None) -> None:
+    """Drop cached availability after a write.
+
+    Entries are keyed by version, so a stale one is never served; this only
+    frees the space of the entries the write made unreachable. ``days`` is
+    kept for callers that know which dates changed.
+    """
+    backend = get_cache_backend()
+    if backend is None:
+        return
+    backend.clear()
@@ -1,7 +1,10 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from flask import Blueprint, jsonify, request
 
-from availability_service import get_availability
+from availability_cache import cached_availability, cached_availability_range
+from availability_service import MAX_RANGE_DAYS, get_availability_version
+from http_cache import is_not_modified, make_etag, not_modified, with_etag
+from schedule_service import known_resources
 
 availability_bp = Blueprint("availability_bp", __name__)
 
@@ -22,11 +25,79 @@ def _parse_date(s: str):
     except Exception:
         return None
 
+
+def _parse_days(s: str):
+    try:
+        days = int((s or "").strip())
+    except ValueError:
+        return None
+    return days if 1 <= days <= MAX_RANGE_DAYS else None
+
+
+def _parse_resource():
+    """Lower-cased ``resource`` argument; ``False`` when it names no calendar."""
+    resource = (request.args.get("resource") or "").strip().lower()
+    if not resource:
+        return None
+    return resource if resource in known_resources() else False
+
+
+def _range_requested() -> bool:
+    return any(request.args.get(key) for key in ("start", "end", "days"))
+
+
+def _range_availability(resource):
+    raw_start = request.args.get("start") or request.args.get("date")
+    start = _parse_date(raw_start) if raw_start else date.today()
+    if not start:
+        return jsonify({"ok": False, "error": "Parâmetro 'start' inválido (YYYY-MM-DD ou DD/MM/YYYY)"}), 400
+
+    if request.args.get("end"):
+        end = _parse_date(request.args.get("end"))
+        if not end:
+            return jsonify({"ok": False, "error": "Parâmetro 'end' inválido (YYYY-MM-DD ou DD/MM/YYYY)"}), 400
+    else:
+        days = _parse_days(request.args.get("days"))
+        if not days:
+            return jsonify({"ok": False, "error": f"Parâmetro 'days' deve estar entre 1 e {MAX_RANGE_DAYS}"}), 400
+        end = start + timedelta(days=days - 1)
+
+    if end < start:
+        return jsonify({"ok": False, "error": "'end' não pode ser anterior a 'start'"}), 400
+    if (end - start).days >= MAX_RANGE_DAYS:
+        return jsonify({"ok": False, "error": f"Intervalo máximo de {MAX_RANGE_DAYS} dias"}), 400
+
+    version = get_availability_version(start, end)
+    etag = make_etag("range", start, end, resource, version)
+    if is_not_modified(etag):
+        return not_modified(etag)
+
+    # The body is cached under the same version as the ETag, so they always agree.
+    data = cached_availability_range(start, end, version, resource)
+    return with_etag(jsonify({
+        "ok": True,
+        "start": start.strftime("%Y-%m-%d"),
+        "end": end.strftime("%Y-%m-%d"),
+        "days": data,
+    }), etag), 200
+
+
 @availability_bp.route("/api/availability", methods=["GET"])
 def availability():
+    resource = _parse_resource()
+    if resource is False:
+        return jsonify({"ok": False, "error": "Parâmetro 'resource' desconhecido"}), 400
+    if _range_requested():
+        return _range_availability(resource)
+
     day = _parse_date(request.args.get("date"))
     if not day:
         return jsonify({"ok": False, "error": "Parâmetro 'date' obrigatório (YYYY-MM-DD ou DD/MM/YYYY)"}), 400
 
-    data = get_availability(day)
-    return jsonify({"ok": True, **data}), 200
+    version = get_availability_version(day, day)
+    etag = make_etag("day", day, resource, version)
+    if is_not_modified(etag):
+        return not_modified(etag)
+
+    data = cached_availability(day, version, resource)
+    return with_etag(jsonify({"ok": True, **data}), etag), 200
@@ -1,7 +1,15 @@
 import os
 from datetime import datetime, date as dt_date, time as dt_time, timedelta
 
-from models import Appointment
+from functools import lru_cache
+from typing import Callable
+
+from sqlalchemy import case, func, select
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import Appointment, CalendarEvent, ScheduleException, ScheduleRule, SlotReservation
+from schedule_service import DaySchedule, IntervalSet, load_schedule
 
 BOOKED_STATUSES = {"pending", "confirmed"}  # treat pending as reserved
 
@@ -9,6 +17,7 @@ DEFAULT_WORK_START = dt_time(8, 0)  # 08:00
 DEFAULT_WORK_END = dt_time(17, 0)   # 17:00 (end exclusive)
 DEFAULT_SLOT_MINUTES = 30
 DEFAULT_CAPACITY = 1
+MAX_RANGE_DAYS = 62
 
 
 def _parse_time_env(value: str | None, fallback: dt_time) -> dt_time:
@@ -50,81 +59,353 @@ def get_capacity_per_slot() -> int:
     return max(1, capacity)
 
 
-def is_valid_slot(day: dt_date, slot_time: dt_time) -> bool:
-    start, end = get_working_hours()
-    if slot_time < start or slot_time >= end:
-        return False
-    slot_minutes = get_slot_minutes()
-    start_dt = datetime.combine(day, start)
-    slot_dt = datetime.combine(day, slot_time)
-    delta = (slot_dt - start_dt).total_seconds()
-    return delta % (slot_minutes * 60) == 0
+class SlotGrid:
+    """Slot layout for one working-hours configuration.
+
+    Slot starts are kept as minute offsets from midnight so membership checks
+    are a set lookup and per-day views never touch datetime arithmetic.
+    """
+
+    def __init__(
+        self,
+        work_start: dt_time,
+        work_end: dt_time,
+        slot_minutes: int,
+        capacity: int,
+        intervals: tuple[tuple[int, int], ...] | None = None,
+    ):
+        self.work_start = work_start
+        self.work_end = work_end
+        self.slot_minutes = slot_minutes
+        self.capacity = capacity
+
+        if intervals is None:
+            start_min = work_start.hour * 60 + work_start.minute
+            end_min = work_end.hour * 60 + work_end.minute
+            intervals = ((start_min, end_min),)
+        self.intervals = intervals
+        self.offsets = tuple(m for start, end in intervals for m in range(start, end, slot_minutes))
+        self.times = tuple(dt_time(m // 60, m % 60) for m in self.offsets)
+        self.labels = tuple(t.strftime("%H:%M") for t in self.times)
+        self._offset_set = frozenset(self.offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def is_valid(self, slot_time: dt_time) -> bool:
+        if slot_time.second or slot_time.microsecond:
+            return False
+        return slot_time.hour * 60 + slot_time.minute in self._offset_set
 
+    def available_counts(self, booked_by_time: dict[dt_time, int], busy: IntervalSet | None = None) -> list[int]:
+        """Free seats per slot, aligned with ``times``; slots overlapping ``busy`` get 0."""
+        capacity = self.capacity
+        counts = [max(0, capacity - booked_by_time.get(t, 0)) for t in self.times]
+        if busy:
+            length = self.slot_minutes
+            for idx, offset in enumerate(self.offsets):
+                if busy.overlaps(offset, offset + length):
+                    counts[idx] = 0
+        return counts
+
+    def is_free(self, slot_time: dt_time, busy: IntervalSet | None = None) -> bool:
+        if not self.is_valid(slot_time):
+            return False
+        if not busy:
+            return True
+        offset = slot_time.hour * 60 + slot_time.minute
+        return not busy.overlaps(offset, offset + self.slot_minutes)
+
+    @property
+    def last_slot(self) -> dt_time | None:
+        return self.times[-1] if self.times else None
+
+
+_GRID_CACHE: dict[str, object] = {"key": None, "grid": None}
+
+
+def grid_config_key() -> tuple:
+    return (
+        os.getenv("AVAIL_WORK_START"),
+        os.getenv("AVAIL_WORK_END"),
+        os.getenv("AVAIL_SLOT_MINUTES"),
+        os.getenv("AVAIL_CAPACITY"),
+    )
 
-def get_booked_count(day: dt_date, slot_time: dt_time, exclude_id: int | None = None) -> int:
+
+def get_slot_grid() -> SlotGrid:
+    """Return the grid for the current config, rebuilding only when it changes."""
+    key = grid_config_key()
+    grid = _GRID_CACHE["grid"]
+    if grid is None or _GRID_CACHE["key"] != key:
+        start, end = get_working_hours()
+        grid = SlotGrid(start, end, get_slot_minutes(), get_capacity_per_slot())
+        _GRID_CACHE["key"] = key
+        _GRID_CACHE["grid"] = grid
+    return grid
+
+
+@lru_cache(maxsize=64)
+def _grid_for_intervals(intervals: tuple[tuple[int, int], ...], slot_minutes: int, capacity: int) -> SlotGrid:
+    start = dt_time(intervals[0][0] // 60, intervals[0][0] % 60) if intervals else DEFAULT_WORK_START
+    end_min = intervals[-1][1] if intervals else 0
+    end = dt_time.max if end_min >= 24 * 60 else dt_time(end_min // 60, end_min % 60)
+    return SlotGrid(start, end, slot_minutes, capacity, intervals=intervals)
+
+
+def grid_for_day(schedule: DaySchedule, base: SlotGrid | None = None) -> SlotGrid:
+    """Slot grid for a compiled day, reusing one grid per distinct open-hours pattern."""
+    base = base or get_slot_grid()
+    intervals = schedule.open.as_tuple()
+    if intervals == base.intervals:
+        return base
+    return _grid_for_intervals(intervals, base.slot_minutes, base.capacity)
+
+
+def get_schedule(start_day: dt_date, end_day: dt_date, resource: str | None = None) -> dict[dt_date, DaySchedule]:
+    grid = get_slot_grid()
+    return load_schedule(start_day, end_day, (grid.work_start, grid.work_end), resource)
+
+
+def is_valid_slot(day: dt_date, slot_time: dt_time, resource: str | None = None) -> bool:
+    schedule = get_schedule(day, day, resource)[day]
+    return grid_for_day(schedule).is_free(slot_time, schedule.busy)
+
+
+def _for_resource(resource: str | None):
+    """Appointments of ``resource``; each resource has its own seats."""
+    return Appointment.resource.is_(None) if resource is None else Appointment.resource == resource
+
+
+def get_booked_count(
+    day: dt_date, slot_time: dt_time, exclude_id: int | None = None, resource: str | None = None
+) -> int:
     query = Appointment.query.filter(
         Appointment.date == day,
         Appointment.time == slot_time,
         Appointment.status.in_(list(BOOKED_STATUSES)),
+        _for_resource(resource),
     )
     if exclude_id:
         query = query.filter(Appointment.id != exclude_id)
     return query.count()
 
 
-def is_slot_available(day: dt_date, slot_time: dt_time, exclude_id: int | None = None) -> bool:
-    if not is_valid_slot(day, slot_time):
+def is_slot_available(
+    day: dt_date, slot_time: dt_time, exclude_id: int | None = None, resource: str | None = None
+) -> bool:
+    if not is_valid_slot(day, slot_time, resource):
         return False
-    return get_booked_count(day, slot_time, exclude_id=exclude_id) < get_capacity_per_slot()
+    return get_booked_count(day, slot_time, exclude_id=exclude_id, resource=resource) < get_slot_grid().capacity
 
 
 def _iter_slots(day: dt_date):
-    start, end = get_working_hours()
-    slot_minutes = get_slot_minutes()
-    start_dt = datetime.combine(day, start)
-    end_dt = datetime.combine(day, end)
-    cur = start_dt
-    while cur < end_dt:
-        yield cur.time()
-        cur += timedelta(minutes=slot_minutes)
+    schedule = get_schedule(day, day)[day]
+    return iter(grid_for_day(schedule).times)
 
 
 def get_slot_config() -> dict:
-    start, end = get_working_hours()
-    slot_minutes = get_slot_minutes()
-    last_slot_dt = datetime.combine(dt_date.today(), end) - timedelta(minutes=slot_minutes)
+    grid = get_slot_grid()
+    last_slot = grid.last_slot or grid.work_start
     return {
-        "work_start": start.strftime("%H:%M"),
-        "work_end": end.strftime("%H:%M"),
-        "slot_minutes": slot_minutes,
-        "step": slot_minutes * 60,
-        "last_slot": last_slot_dt.time().strftime("%H:%M"),
-        "capacity": get_capacity_per_slot(),
+        "work_start": grid.work_start.strftime("%H:%M"),
+        "work_end": grid.work_end.strftime("%H:%M"),
+        "slot_minutes": grid.slot_minutes,
+        "step": grid.slot_minutes * 60,
+        "last_slot": last_slot.strftime("%H:%M"),
+        "capacity": grid.capacity,
     }
 
 
-def get_availability(day: dt_date):
-    appts = (
-        Appointment.query
-        .filter(Appointment.date == day)
+def get_booked_counts(
+    start_day: dt_date, end_day: dt_date, resource: str | None = None
+) -> dict[tuple[dt_date, dt_time], int]:
+    """Booked counts of ``resource`` per (date, time) for the inclusive window, in one grouped query."""
+    rows = (
+        db.session.query(Appointment.date, Appointment.time, func.count(Appointment.id))
+        .filter(Appointment.date >= start_day, Appointment.date <= end_day)
         .filter(Appointment.status.in_(list(BOOKED_STATUSES)))
+        .filter(_for_resource(resource))
+        .group_by(Appointment.date, Appointment.time)
         .all()
     )
+    return {(row_date, row_time): count for row_date, row_time, count in rows}
+
 
-    booked_map = {}
-    for appt in appts:
-        booked_map[appt.time] = booked_map.get(appt.time, 0) + 1
+def _group_by_day(booked_counts: dict[tuple[dt_date, dt_time], int]) -> dict[dt_date, dict[dt_time, int]]:
+    by_day: dict[dt_date, dict[dt_time, int]] = {}
+    for (day, slot_time), count in booked_counts.items():
+        by_day.setdefault(day, {})[slot_time] = count
+    return by_day
 
+
+def _build_day(day: dt_date, booked_by_time: dict[dt_time, int], schedule: DaySchedule, base: SlotGrid) -> dict:
+    grid = grid_for_day(schedule, base)
+    capacity = grid.capacity
+    counts = grid.available_counts(booked_by_time, schedule.busy)
     slots = []
-    for slot_time in _iter_slots(day):
-        booked = booked_map.get(slot_time, 0)
-        capacity = get_capacity_per_slot()
-        available = max(0, capacity - booked)
+    for slot_time, label, available in zip(grid.times, grid.labels, counts):
         slots.append({
-            "time": slot_time.strftime("%H:%M"),
+            "time": label,
             "capacity": capacity,
-            "booked": booked,
+            "booked": booked_by_time.get(slot_time, 0),
             "available": available,
         })
 
     return {"date": day.strftime("%Y-%m-%d"), "slots": slots}
+
+
+def get_availability(day: dt_date, resource: str | None = None):
+    booked_by_day = _group_by_day(get_booked_counts(day, day, resource))
+    schedule = get_schedule(day, day, resource)
+    return _build_day(day, booked_by_day.get(day, {}), schedule[day], get_slot_grid())
+
+
+def get_availability_range(start_day: dt_date, end_day: dt_date, resource: str | None = None) -> list[dict]:
+    if end_day < start_day:
+        raise ValueError("end_day must not be before start_day")
+    if (end_day - start_day).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"range must not exceed {MAX_RANGE_DAYS} days")
+
+    grid = get_slot_grid()
+    booked_by_day = _group_by_day(get_booked_counts(start_day, end_day, resource))
+    schedule = get_schedule(start_day, end_day, resource)
+    days = []
+    day = start_day
+    while day <= end_day:
+        days.append(_build_day(day, booked_by_day.get(day, {}), schedule[day], grid))
+        day += timedelta(days=1)
+    return days
+
+
+def get_availability_version(start_day: dt_date, end_day: dt_date) -> tuple:
+    """Cheap version stamp of everything the window's availability depends on.
+
+    Aggregates only: counts plus the latest change timestamps of bookings,
+    calendar events and schedule rows, read in a single statement.
+    """
+    window_start = datetime.combine(start_day, dt_time.min)
+    window_end = datetime.combine(end_day + timedelta(days=1), dt_time.min)
+    in_window = (Appointment.date >= start_day, Appointment.date <= end_day)
+    overlapping = (CalendarEvent.start_at < window_end, CalendarEvent.end_at > window_start)
+    exception_days = (ScheduleException.date >= start_day, ScheduleException.date <= end_day)
+
+    def _scalar(expr, *criteria):
+        return select(expr).where(*criteria).scalar_subquery()
+
+    booked = case((Appointment.status.in_(list(BOOKED_STATUSES)), 1), else_=0)
+    row = db.session.execute(select(
+        _scalar(func.count(Appointment.id), *in_window),
+        _scalar(func.sum(booked), *in_window),
+        _scalar(func.max(Appointment.created_at), *in_window),
+        _scalar(func.max(Appointment.updated_at), *in_window),
+        _scalar(func.max(Appointment.cancelled_at), *in_window),
+        _scalar(func.max(Appointment.rescheduled_at), *in_window),
+        _scalar(func.count(CalendarEvent.id), *overlapping),
+        _scalar(func.max(CalendarEvent.updated_at), *overlapping),
+        _scalar(func.count(ScheduleRule.id)),
+        _scalar(func.max(ScheduleRule.created_at)),
+        _scalar(func.count(ScheduleException.id), *exception_days),
+        _scalar(func.max(ScheduleException.created_at), *exception_days),
+    )).one()
+    return (grid_config_key(), *(str(value) for value in row))
+
+
+def find_next_available(
+    after: datetime, horizon_days: int = 14, n: int = 1, resource: str | None = None
+) -> list[tuple[dt_date, dt_time]]:
+    """First ``n`` free slots of ``resource`` starting at or after ``after`` within ``horizon_days`` days.
+
+    Booked counts for the whole horizon come from one grouped query and the
+    schedule is compiled once; the slot grids are then walked in memory.
+    """
+    if n <= 0 or horizon_days <= 0:
+        return []
+
+    base = get_slot_grid()
+    start_day = after.date()
+    end_day = start_day + timedelta(days=horizon_days - 1)
+    booked_by_day = _group_by_day(get_booked_counts(start_day, end_day, resource))
+    schedule = get_schedule(start_day, end_day, resource)
+    after_time = after.time()
+
+    found = []
+    day = start_day
+    while day <= end_day:
+        day_schedule = schedule[day]
+        grid = grid_for_day(day_schedule, base)
+        counts = grid.available_counts(booked_by_day.get(day, {}), day_schedule.busy)
+        for slot_time, available in zip(grid.times, counts):
+            if available <= 0:
+                continue
+            if day == start_day and slot_time < after_time:
+                continue
+            found.append((day, slot_time))
+            if len(found) >= n:
+                return found
+        day += timedelta(days=1)
+    return found
+
+
+def _is_seat_conflict(exc: IntegrityError) -> bool:
+    msg = str(exc.orig) if getattr(exc, "orig", None) else str(exc)
+    return "slot_reservation" in msg
+
+
+def commit_with_reserved_seat(apply_changes: Callable[[int], None]) -> int | None:
+    """Apply a booking for a seat index and commit, trying each seat in turn.
+
+    ``apply_changes(seat)`` must stage the appointment and its reservation in
+    the session. The unique (date, time, resource, seat) constraint arbitrates
+    between concurrent writers, so booking needs no separate availability count.
+    Returns the seat taken, or None when every seat is already reserved.
+    """
+    for seat in range(get_slot_grid().capacity):
+        apply_changes(seat)
+        try:
+            db.session.commit()
+        except IntegrityError as exc:
+            db.session.rollback()
+            if not _is_seat_conflict(exc):
+                raise
+            continue
+        return seat
+    return None
+
+
+def set_reservation(appointment: Appointment, day: dt_date, slot_time: dt_time, seat: int) -> SlotReservation:
+    """Point the appointment's reservation at (day, slot_time, seat) of its resource without committing."""
+    reservation = appointment.reservation
+    if reservation is None:
+        reservation = SlotReservation()
+        appointment.reservation = reservation
+    reservation.date = day
+    reservation.time = slot_time
+    reservation.resource = appointment.resource or ""
+    reservation.seat = seat
+    return reservation
+
+
+def assign_overflow_seat(appointment: Appointment, day: dt_date, slot_time: dt_time) -> SlotReservation:
+    """Reserve the next seat beyond the current ones, ignoring capacity.
+
+    Used when the change is authoritative (admin override, Google Calendar
+    sync) and must be recorded even if the slot is already full.
+    """
+    reservation = appointment.reservation
+    if reservation is not None and reservation.date == day and reservation.time == slot_time:
+        return reservation
+    max_seat = (
+        db.session.query(func.max(SlotReservation.seat))
+        .filter(SlotReservation.date == day, SlotReservation.time == slot_time)
+        .filter(SlotReservation.resource == (appointment.resource or ""))
+        .scalar()
+    )
+    seat = 0 if max_seat is None else max_seat + 1
+    return set_reservation(appointment, day, slot_time, seat)
+
+
+def release_seat(appointment: Appointment) -> None:
+    """Drop the appointment's reservation; the caller commits."""
+    if appointment.reservation is not None:
+        appointment.reservation = None
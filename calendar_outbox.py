@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import case, or_, update
+
+from extensions import db
+from google_calendar import cancel_appointment_event, is_sync_enabled, upsert_appointment_event
+from models import Appointment, CalendarOutbox
+
+ACTIONS = ("upsert", "cancel")
+DEFAULT_MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+STALE_LOCK_MINUTES = 10
+
+
+def _max_attempts() -> int:
+    try:
+        return max(1, int(os.getenv("CALENDAR_OUTBOX_MAX_ATTEMPTS") or DEFAULT_MAX_ATTEMPTS))
+    except ValueError:
+        return DEFAULT_MAX_ATTEMPTS
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with +/-10% jitter so retries do not line up."""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.9, 1.1)
+
+
+def enqueue_appointment_sync(appointment: Appointment, action: str = "upsert") -> CalendarOutbox | None:
+    """Stage a push of ``appointment`` to Google Calendar in the caller's session.
+
+    Nothing is committed here: the caller commits the entry together with
+    the booking change, so the intent is never lost between two
+    transactions. A still-pending entry for the same appointment is updated
+    in place, so a burst of reschedules becomes a single API call carrying
+    the latest state. The UPDATE only matches ``pending`` rows, so an entry
+    a worker has already claimed is left alone and a new one is queued.
+    Returns the staged entry, or None when a committed one was reused or
+    Google sync is not configured.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f"acao invalida: {action}")
+    # Without autoflush a seat conflict in the caller's staged booking still
+    # surfaces at its commit, where commit_with_reserved_seat expects it.
+    with db.session.no_autoflush:
+        if appointment is None or not is_sync_enabled():
+            return None
+
+        staged = next(
+            (
+                obj for obj in db.session.new
+                if isinstance(obj, CalendarOutbox) and obj.appointment is appointment and obj.status == "pending"
+            ),
+            None,
+        )
+        if staged is not None:
+            staged.action = action
+            staged.coalesced = (staged.coalesced or 0) + 1
+            return staged
+
+        if appointment.id is not None:
+            now = datetime.utcnow()
+            result = db.session.execute(
+                update(CalendarOutbox)
+                .where(CalendarOutbox.appointment_id == appointment.id, CalendarOutbox.status == "pending")
+                .values(
+                    action=action,
+                    coalesced=CalendarOutbox.coalesced + 1,
+                    next_attempt_at=case((CalendarOutbox.next_attempt_at > now, now), else_=CalendarOutbox.next_attempt_at),
+                    updated_at=now,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                return None
+
+        entry = CalendarOutbox(appointment=appointment, action=action, status="pending")
+        db.session.add(entry)
+        return entry
+
+
+def claim_due_entries(limit: int = 50) -> list[int]:
+    """Mark up to ``limit`` due entries as processing and return their ids.
+
+    Each row is claimed with a conditional UPDATE, so two workers never pick
+    the same entry. Entries left processing by a crashed worker are retried
+    once their lock is older than ``STALE_LOCK_MINUTES``.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(minutes=STALE_LOCK_MINUTES)
+    candidates = [
+        row.id
+        for row in (
+            CalendarOutbox.query
+            .filter(
+                or_(
+                    (CalendarOutbox.status == "pending") & (CalendarOutbox.next_attempt_at <= now),
+                    (CalendarOutbox.status == "processing") & (CalendarOutbox.locked_at < stale),
+                )
+            )
+            .order_by(CalendarOutbox.next_attempt_at.asc(), CalendarOutbox.id.asc())
+            .limit(limit)
+            .with_entities(CalendarOutbox.id)
+            .all()
+        )
+    ]
+
+    claimed = []
+    for entry_id in candidates:
+        result = db.session.execute(
+            update(CalendarOutbox)
+            .where(CalendarOutbox.id == entry_id)
+            .where(
+                or_(
+                    CalendarOutbox.status == "pending",
+                    (CalendarOutbox.status == "processing") & (CalendarOutbox.locked_at < stale),
+                )
+            )
+            .values(status="processing", locked_at=now)
+        )
+        if result.rowcount:
+            claimed.append(entry_id)
+    db.session.commit()
+    return claimed
+
+
+def process_entry(entry_id: int) -> bool:
+    entry = db.session.get(CalendarOutbox, entry_id)
+    if entry is None or entry.status != "processing":
+        return False
+
+    appointment = entry.appointment
+    ok = False
+    error = None
+    try:
+        if appointment is None:
+            ok = True
+        elif entry.action == "cancel":
+            ok = not appointment.google_event_id or cancel_appointment_event(appointment)
+        else:
+            ok = upsert_appointment_event(appointment)
+        if not ok:
+            error = f"{entry.action} falhou"
+    except Exception as exc:  # pragma: no cover - the helpers already log and return False
+        db.session.rollback()
+        entry = db.session.get(CalendarOutbox, entry_id)
+        error = str(exc)
+
+    entry.attempts = (entry.attempts or 0) + 1
+    entry.locked_at = None
+    if ok:
+        entry.status = "done"
+        entry.last_error = None
+    elif entry.attempts >= _max_attempts():
+        entry.status = "failed"
+        entry.last_error = error
+    else:
+        entry.status = "pending"
+        entry.last_error = error
+        entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_seconds(entry.attempts))
+    db.session.commit()
+    return ok
+
+
+def drain_outbox(app, workers: int = 4, batch_size: int = 50) -> dict:
+    """Process every entry that is due now on a thread pool."""
+    stats = {"done": 0, "retry": 0}
+
+    def _run(entry_id: int) -> bool:
+        with app.app_context():
+            try:
+                return process_entry(entry_id)
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while True:
+            with app.app_context():
+                batch = claim_due_entries(batch_size)
+            if not batch:
+                break
+            for ok in pool.map(_run, batch):
+                stats["done" if ok else "retry"] += 1
+    return stats
+
+
+def register_outbox_commands(app):
+    @app.cli.command("calendar-worker")
+    @click.option("--workers", default=4, show_default=True, help="Threads enviando ao Google em paralelo.")
+    @click.option("--batch-size", default=50, show_default=True)
+    @click.option("--interval", default=5.0, show_default=True, help="Segundos entre verificacoes da fila.")
+    @click.option("--once", is_flag=True, help="Processa o que estiver pendente e sai.")
+    def calendar_worker(workers: int, batch_size: int, interval: float, once: bool):
+        """Envia ao Google Agenda os agendamentos enfileirados em calendar_outbox."""
+        worker_app = current_app._get_current_object()
+        while True:
+            stats = drain_outbox(worker_app, workers=workers, batch_size=batch_size)
+            if stats["done"] or stats["retry"]:
+                click.echo(f"Eventos enviados: {stats['done']}, para nova tentativa: {stats['retry']}")
+            if once:
+                break
+            time.sleep(interval)
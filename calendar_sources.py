@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import or_, select, update
+
+from availability_cache import invalidate_availability
+from extensions import db
+from google_calendar import sync_calendar_source
+from models import CalendarEvent, CalendarSource
+from schedule_service import invalidate_busy_index
+
+DEFAULT_SYNC_WORKERS = 4
+
+
+def due_source_ids(now: datetime, interval_seconds: float, force: bool = False) -> list[int]:
+    query = select(CalendarSource.id).where(CalendarSource.is_active.is_(True))
+    if not force:
+        query = query.where(or_(
+            CalendarSource.last_sync_at.is_(None),
+            CalendarSource.last_sync_at <= now - timedelta(seconds=interval_seconds),
+        ))
+    return list(db.session.scalars(query.order_by(CalendarSource.id)))
+
+
+def disable_calendar_source(source: CalendarSource) -> int:
+    """Stop syncing ``source`` and release the time its events were blocking.
+
+    The imported events are cancelled rather than hidden, so the change moves
+    the busy-time version every worker checks. The sync token is dropped, so
+    enabling the calendar again re-imports it from scratch. Returns how many
+    events were cancelled.
+    """
+    source.is_active = False
+    source.sync_token = None
+    source.sync_checkpoint = None
+    result = db.session.execute(
+        update(CalendarEvent)
+        .where(CalendarEvent.source_id == source.id, CalendarEvent.status != "cancelled")
+        .values(status="cancelled")
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    invalidate_busy_index()
+    invalidate_availability()
+    return result.rowcount
+
+
+def sync_calendar_sources(app, source_ids: list[int], workers: int = DEFAULT_SYNC_WORKERS) -> dict[int, bool]:
+    """Sync each calendar source on a bounded thread pool.
+
+    Every task runs in its own app context and session and keeps its own
+    sync token, so one slow or failing calendar does not hold up the others.
+    """
+
+    def _run(source_id: int) -> bool:
+        with app.app_context():
+            try:
+                source = db.session.get(CalendarSource, source_id)
+                return bool(source) and sync_calendar_source(source)
+            except Exception:  # pragma: no cover - sync_calendar_source already logs
+                db.session.rollback()
+                app.logger.exception("Falha ao sincronizar a agenda %s", source_id)
+                return False
+            finally:
+                db.session.remove()
+
+    if not source_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(source_ids)))) as pool:
+        return dict(zip(source_ids, pool.map(_run, source_ids)))
+
+
+def register_source_commands(app):
+    @app.cli.group("calendar-source")
+    def calendar_source():
+        """Agendas extras do Google (profissionais ou salas)."""
+
+    @calendar_source.command("add")
+    @click.option("--name", required=True)
+    @click.option("--resource", required=True, help="Profissional ou sala (ex.: dra-ana, sala-2).")
+    @click.option("--calendar-id", required=True)
+    @click.option("--credentials-file", default=None, help="JSON do service account (padrao: o da agenda principal).")
+    def add_source(name, resource, calendar_id, credentials_file):
+        if CalendarSource.query.filter_by(calendar_id=calendar_id).first():
+            raise click.ClickException("Essa agenda ja esta cadastrada.")
+        source = CalendarSource(
+            name=name.strip(),
+            resource=resource.strip().lower(),
+            calendar_id=calendar_id.strip(),
+            credentials_file=credentials_file,
+        )
+        db.session.add(source)
+        db.session.commit()
+        click.echo(f"Agenda {source.id} cadastrada para {source.resource}.")
+
+    @calendar_source.command("list")
+    def list_sources():
+        for source in CalendarSource.query.order_by(CalendarSource.resource, CalendarSource.id):
+            last = source.last_sync_at.strftime("%d/%m/%Y %H:%M") if source.last_sync_at else "nunca"
+            state = "ativa" if source.is_active else "inativa"
+            click.echo(f"{source.id}\t{source.resource}\t{source.calendar_id}\t{state}\tultima sync: {last}")
+
+    @calendar_source.command("disable")
+    @click.argument("source_id", type=int)
+    def disable_source(source_id):
+        source = db.session.get(CalendarSource, source_id)
+        if not source:
+            raise click.ClickException("Agenda nao encontrada.")
+        released = disable_calendar_source(source)
+        click.echo(f"Agenda {source_id} desativada; {released} eventos liberados.")
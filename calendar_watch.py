@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import secrets
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import update
+
+from extensions import db
+from google_calendar import _config_value, _get_calendar_id, request_sync, start_watch_channel, stop_watch_channel
+from models import CalendarWatchChannel, Settings
+
+WEBHOOK_PATH = "/webhooks/google-calendar"
+DEFAULT_WATCH_TTL_HOURS = 168
+DEFAULT_RENEW_BEFORE_HOURS = 24
+DEFAULT_DEBOUNCE_SECONDS = 5
+DEFAULT_FALLBACK_MINUTES = 360
+
+
+def _int_config(key: str, default: int, minimum: int = 0) -> int:
+    try:
+        return max(minimum, int(_config_value(key, str(default)) or default))
+    except ValueError:
+        return default
+
+
+def debounce_seconds() -> int:
+    return _int_config("GOOGLE_WATCH_DEBOUNCE_SECONDS", DEFAULT_DEBOUNCE_SECONDS)
+
+
+def fallback_minutes() -> int:
+    return _int_config("GOOGLE_WATCH_FALLBACK_MIN", DEFAULT_FALLBACK_MINUTES, minimum=1)
+
+
+def webhook_address() -> str | None:
+    base_url = (_config_value("PUBLIC_BASE_URL") or "").rstrip("/")
+    if not base_url.startswith("https://"):
+        return None
+    return base_url + WEBHOOK_PATH
+
+
+def active_channel(now: datetime | None = None) -> CalendarWatchChannel | None:
+    now = now or datetime.utcnow()
+    return (
+        CalendarWatchChannel.query
+        .filter(CalendarWatchChannel.stopped_at.is_(None), CalendarWatchChannel.expires_at > now)
+        .order_by(CalendarWatchChannel.expires_at.desc())
+        .first()
+    )
+
+
+def _parse_expiration(value) -> datetime | None:
+    try:
+        return datetime.utcfromtimestamp(int(value) / 1000)
+    except (TypeError, ValueError):
+        return None
+
+
+def stop_channels(channels: list[CalendarWatchChannel]) -> int:
+    stopped = 0
+    for channel in channels:
+        stop_watch_channel(channel.channel_id, channel.resource_id)
+        channel.stopped_at = datetime.utcnow()
+        stopped += 1
+    db.session.commit()
+    return stopped
+
+
+def ensure_watch_channel(
+    address: str | None = None,
+    renew_before: timedelta = timedelta(hours=DEFAULT_RENEW_BEFORE_HOURS),
+    ttl_hours: int = DEFAULT_WATCH_TTL_HOURS,
+) -> CalendarWatchChannel | None:
+    """Keep one live watch channel, opening a new one before the current expires.
+
+    The new channel is registered first and the older ones are stopped after,
+    so notifications never have a gap during renewal.
+    """
+    now = datetime.utcnow()
+    current = active_channel(now)
+    if current and current.expires_at - now > renew_before:
+        return current
+
+    address = address or webhook_address()
+    settings = Settings.query.first()
+    calendar_id = _get_calendar_id(settings)
+    if not address or not calendar_id:
+        return None
+
+    channel_id = str(uuid.uuid4())
+    token = secrets.token_urlsafe(32)
+    response = start_watch_channel(channel_id, token, address, ttl_hours * 3600, settings=settings)
+    if not response:
+        return None
+
+    channel = CalendarWatchChannel(
+        channel_id=channel_id,
+        token=token,
+        resource_id=response.get("resourceId"),
+        calendar_id=calendar_id,
+        address=address,
+        expires_at=_parse_expiration(response.get("expiration")) or now + timedelta(hours=ttl_hours),
+    )
+    db.session.add(channel)
+    db.session.commit()
+
+    older = (
+        CalendarWatchChannel.query
+        .filter(CalendarWatchChannel.stopped_at.is_(None), CalendarWatchChannel.id != channel.id)
+        .all()
+    )
+    if older:
+        stop_channels(older)
+    return channel
+
+
+def take_sync_request(seen: datetime) -> None:
+    """Clear a request before syncing, so notifications during the sync queue a new one."""
+    db.session.execute(
+        update(Settings)
+        .where(Settings.google_sync_requested_at == seen)
+        .values(google_sync_requested_at=None)
+    )
+    db.session.commit()
+
+
+def restore_sync_request(seen: datetime) -> None:
+    db.session.execute(
+        update(Settings)
+        .where(Settings.google_sync_requested_at.is_(None))
+        .values(google_sync_requested_at=seen)
+    )
+    db.session.commit()
+
+
+def sync_due(settings: Settings, now: datetime, interval_seconds: int) -> bool:
+    """Whether the scheduler should sync now.
+
+    A pending notification is honoured once it is ``debounce_seconds`` old.
+    Otherwise the polling interval applies; while a watch channel is live it
+    stretches to ``GOOGLE_WATCH_FALLBACK_MIN`` as a safety net for lost
+    notifications.
+    """
+    requested = settings.google_sync_requested_at
+    if requested and (now - requested).total_seconds() >= debounce_seconds():
+        return True
+    last = settings.google_sync_last_at
+    if last is None:
+        return True
+    if active_channel(now):
+        interval_seconds = max(interval_seconds, fallback_minutes() * 60)
+    return (now - last).total_seconds() >= interval_seconds
+
+
+def register_watch_commands(app):
+    @app.cli.command("calendar-watch")
+    @click.option("--address", default=None, help="URL HTTPS do webhook (padrao: PUBLIC_BASE_URL + /webhooks/google-calendar).")
+    @click.option("--renew-before-hours", default=DEFAULT_RENEW_BEFORE_HOURS, show_default=True)
+    @click.option("--ttl-hours", default=DEFAULT_WATCH_TTL_HOURS, show_default=True)
+    @click.option("--stop", is_flag=True, help="Encerra todos os canais ativos.")
+    def calendar_watch(address, renew_before_hours, ttl_hours, stop):
+        """Cria ou renova o canal de notificacoes do Google Agenda (rodar pelo cron)."""
+        if stop:
+            channels = CalendarWatchChannel.query.filter(CalendarWatchChannel.stopped_at.is_(None)).all()
+            click.echo(f"Canais encerrados: {stop_channels(channels)}")
+            return
+        channel = ensure_watch_channel(address, timedelta(hours=renew_before_hours), ttl_hours)
+        if not channel:
+            raise click.ClickException("Nao foi possivel registrar o canal. Verifique a sincronizacao e PUBLIC_BASE_URL (https).")
+        click.echo(f"Canal {channel.channel_id} ativo ate {channel.expires_at:%d/%m/%Y %H:%M} UTC")
@@ -0,0 +1,34 @@
+import hmac
+from datetime import datetime
+
+from flask import Blueprint, request
+
+from calendar_watch import WEBHOOK_PATH, request_sync
+from extensions import db
+from models import CalendarWatchChannel
+
+calendar_watch_bp = Blueprint("calendar_watch_bp", __name__)
+
+
+@calendar_watch_bp.route(WEBHOOK_PATH, methods=["POST"])
+def google_calendar_notification():
+    """Receive ``events.watch`` notifications; the body is always empty."""
+    channel_id = (request.headers.get("X-Goog-Channel-ID") or "").strip()
+    token = request.headers.get("X-Goog-Channel-Token") or ""
+    resource_id = request.headers.get("X-Goog-Resource-ID") or ""
+    state = (request.headers.get("X-Goog-Resource-State") or "").strip().lower()
+
+    channel = CalendarWatchChannel.query.filter_by(channel_id=channel_id).first() if channel_id else None
+    now = datetime.utcnow()
+    if not channel or channel.stopped_at or channel.expires_at <= now:
+        return "", 404
+    if not hmac.compare_digest(channel.token.encode(), token.encode()):
+        return "", 403
+    if channel.resource_id and not hmac.compare_digest(channel.resource_id.encode(), resource_id.encode()):
+        return "", 403
+
+    channel.last_message_at = now
+    db.session.commit()
+    if state != "sync":
+        request_sync()
+    return "", 204
@@ -8,7 +8,10 @@ from flask_mail import Message
 
 from extensions import db
 from appointments_api import create_pending_appointment
+from availability_service import find_next_available
 from models import Appointment, Settings, Convenio, Course, Event, ContactMessage
+from metrics import CHATBOT_INTENTS, send_mail
+from settings_cache import get_settings
 
 chatbot_bp = Blueprint("chatbot_bp", __name__)
 
@@ -380,6 +383,15 @@ def _supported_scope_reply() -> str:
     )
 
 
+def _alternative_slots_reply(day: date, slot_time: dtime, limit: int = 3) -> str:
+    after = max(datetime.combine(day, slot_time), datetime.now())
+    slots = find_next_available(after, horizon_days=14, n=limit)
+    if not slots:
+        return ""
+    options = ", ".join(f"{d.strftime('%d/%m')} {t.strftime('%H:%M')}" for d, t in slots)
+    return f"\nHorarios livres mais proximos: {options}."
+
+
 def _history_has_schedule_prompt(history: list[dict]) -> bool:
     prompt_words = ["data", "horario", "whatsapp", "nome", "motivo", "e-mail", "email"]
     for item in history:
@@ -456,7 +468,7 @@ def _apply_mail_settings(settings: Settings | None) -> None:
 
 
 def _resolve_notify_email(settings: Settings | None) -> str | None:
-    settings = settings or Settings.query.first()
+    settings = settings or get_settings()
     if settings and settings.admin_notify_email:
         return settings.admin_notify_email.strip()
     env_email = (os.getenv("ADMIN_NOTIFY_EMAIL") or "").strip()
@@ -479,7 +491,7 @@ def _send_notification_email(subject: str, body: str, settings: Settings | None)
 
     try:
         msg = Message(subject=subject, recipients=[to_email], body=body)
-        mail.send(msg)
+        send_mail(mail, msg, "chatbot")
         return True
     except Exception as e:
         current_app.logger.exception("Falha ao enviar e-mail: %s", e)
@@ -547,6 +559,11 @@ def _faq_reply(message: str, settings: Settings | None) -> str | None:
     return None
 
 
+def _served(intent: str, session_id: str, reply: str, **extra):
+    CHATBOT_INTENTS.inc(intent=intent)
+    return jsonify({"ok": True, "session_id": session_id, "reply": reply, **extra}), 200
+
+
 @chatbot_bp.route("/api/chat", methods=["POST"])
 def chat():
     data = request.get_json(silent=True) or {}
@@ -618,12 +635,12 @@ def chat():
     reset_cmd = _is_reset_command(message)
     if reset_cmd == "reset":
         reply = "Perfeito! Vamos comecar de novo. Como posso te ajudar agora?"
-        return jsonify({"ok": True, "session_id": session_id, "reply": reply, "reset_history": True}), 200
+        return _served("reset", session_id, reply, reset_history=True)
     if reset_cmd == "end":
         reply = "Atendimento encerrado. Se precisar de algo, e so chamar!"
-        return jsonify({"ok": True, "session_id": session_id, "reply": reply, "reset_history": True}), 200
+        return _served("end", session_id, reply, reset_history=True)
 
-    settings = Settings.query.first()
+    settings = get_settings()
     schedule_prompt_active = _history_has_schedule_prompt(sanitized_history)
     schedule_confirmation = _assistant_requested_schedule_start(last_assistant) and _is_affirmative_reply(message)
     schedule_mode = schedule_prompt_active or (
@@ -633,16 +650,16 @@ def chat():
 
     emergency_reply = _emergency_reply(aggregated_user_text)
     if emergency_reply:
-        return jsonify({"ok": True, "session_id": session_id, "reply": emergency_reply}), 200
+        return _served("emergency", session_id, emergency_reply)
 
     if not schedule_mode and _is_minimal_schedule_request(message):
         reply = _schedule_intro_reply()
-        return jsonify({"ok": True, "session_id": session_id, "reply": reply}), 200
+        return _served("schedule_intro", session_id, reply)
 
     if not schedule_mode:
         clinical_reply = _clinical_safety_reply(message)
         if clinical_reply:
-            return jsonify({"ok": True, "session_id": session_id, "reply": clinical_reply}), 200
+            return _served("clinical_safety", session_id, clinical_reply)
 
     if schedule_mode:
         if not parsed_day:
@@ -668,7 +685,8 @@ def chat():
                     reason=reason,
                 )
             except ValueError as e:
-                reply = f"Ops! {str(e)} Pode me informar outra data ou horario?"
+                alternatives = _alternative_slots_reply(parsed_day, parsed_time)
+                reply = f"Ops! {str(e)} Pode me informar outra data ou horario?{alternatives}"
             else:
                 body = "\n".join([
                     "Novo pedido de agendamento (Chatbot)",
@@ -691,15 +709,17 @@ def chat():
                     f"{notice}"
                 )
 
-        return jsonify({"ok": True, "session_id": session_id, "reply": reply}), 200
+        return _served("schedule", session_id, reply)
     faq_reply = _faq_reply(message, settings)
     if faq_reply:
         reply = f"{faq_reply}\n\nSe precisar de mais alguma coisa, e so me chamar."
-        return jsonify({"ok": True, "session_id": session_id, "reply": reply}), 200
+        return _served("faq", session_id, reply)
 
     pending_question = extract_question_from_history(user_messages) or message
 
+    intent = "question"
     if not name:
+        intent = "out_of_scope"
         reply = _supported_scope_reply()
     elif not email:
         reply = "Qual e o seu e-mail para que possamos responder?"
@@ -731,4 +751,4 @@ def chat():
             f"{notice}"
         )
 
-    return jsonify({"ok": True, "session_id": session_id, "reply": reply}), 200
+    return _served(intent, session_id, reply)
@@ -59,6 +59,7 @@ class Config:
     GOOGLE_CALENDAR_TZ = os.getenv("GOOGLE_CALENDAR_TZ", "America/Sao_Paulo")
     GOOGLE_APPT_DURATION_MINUTES = int(os.getenv("GOOGLE_APPT_DURATION_MINUTES", 50))
     GOOGLE_SYNC_MIN_INTERVAL_MIN = int(os.getenv("GOOGLE_SYNC_MIN_INTERVAL_MIN", 2))
+    GOOGLE_SYNC_BACKGROUND = _env_flag("GOOGLE_SYNC_BACKGROUND", False)
 
     CHATBOT_MAX_MESSAGE_LENGTH = int(os.getenv("CHATBOT_MAX_MESSAGE_LENGTH", 500))
     CHATBOT_MAX_HISTORY_ITEMS = int(os.getenv("CHATBOT_MAX_HISTORY_ITEMS", 30))
@@ -70,6 +71,10 @@ class Config:
     HEALTHCHECK_ALLOW_WRITE = _env_flag("HEALTHCHECK_ALLOW_WRITE", False)
     ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "").strip()
 
+    SQL_INSTRUMENTATION = _env_flag("SQL_INSTRUMENTATION", True)
+    SQL_SERVER_TIMING = _env_flag("SQL_SERVER_TIMING", True)
+    SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", 200))
+
     @classmethod
     def init_app(cls, app):
         if not app.config.get("SECRET_KEY"):
@@ -94,10 +99,12 @@ class TestingConfig(Config):
     HEALTHCHECK_ALLOW_DETAILS = True
     HEALTHCHECK_ALLOW_WRITE = False
     MAIL_SUPPRESS_SEND = True
+    GOOGLE_SYNC_BACKGROUND = False
 
 
 class ProductionConfig(Config):
     APP_ENV = "production"
+    SQL_SERVER_TIMING = _env_flag("SQL_SERVER_TIMING", False)
 
     @classmethod
     def init_app(cls, app):
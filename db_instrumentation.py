@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import json
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from metrics import DB_QUERY_SECONDS
+
+SLOWEST_KEPT = 3
+STATEMENT_LOG_CHARS = 300
+EXPLAIN_PREFIXES = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN ",
+    "mysql": "EXPLAIN ",
+    "mariadb": "EXPLAIN ",
+}
+
+
+def _enabled() -> bool:
+    return has_app_context() and bool(current_app.config.get("SQL_INSTRUMENTATION"))
+
+
+def _short(statement: str) -> str:
+    statement = " ".join(statement.split())
+    return statement[:STATEMENT_LOG_CHARS]
+
+
+class QueryStats:
+    """Queries run while serving one request."""
+
+    __slots__ = ("count", "total_ms", "slowest")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest: list[tuple[float, str]] = []
+
+    def add(self, elapsed_ms: float, statement: str) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if len(self.slowest) < SLOWEST_KEPT or elapsed_ms > self.slowest[-1][0]:
+            self.slowest.append((elapsed_ms, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[SLOWEST_KEPT:]
+
+    def as_dict(self) -> dict:
+        return {
+            "queries": self.count,
+            "db_ms": round(self.total_ms, 2),
+            "slowest": [{"ms": round(ms, 2), "sql": _short(sql)} for ms, sql in self.slowest],
+        }
+
+
+def request_stats() -> QueryStats | None:
+    if not has_request_context():
+        return None
+    return g.get("sql_stats")
+
+
+def _explain(conn, cursor, statement: str, parameters) -> list | None:
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if not prefix or not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    # A raw DBAPI cursor keeps the EXPLAIN out of these hooks and the stats.
+    raw = cursor.connection.cursor()
+    try:
+        raw.execute(prefix + statement, parameters or ())
+        return [tuple(row) for row in raw.fetchall()]
+    finally:
+        raw.close()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which dies with the statement, so a
+    # query that raises leaves nothing behind on the pooled connection.
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _pop_query_start(context) -> float | None:
+    if context is None:
+        return None
+    return vars(context).pop("_query_start", None)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    _pop_query_start(exception_context.execution_context)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = _pop_query_start(context)
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if not _enabled():
+        return
+    DB_QUERY_SECONDS.observe(elapsed_ms / 1000)
+
+    stats = request_stats()
+    if stats is not None:
+        stats.add(elapsed_ms, statement)
+
+    threshold = float(current_app.config.get("SQL_SLOW_QUERY_MS") or 0)
+    if threshold <= 0 or elapsed_ms < threshold or executemany:
+        return
+    try:
+        plan = _explain(conn, cursor, statement, parameters)
+    except Exception as exc:  # the plan is a diagnostic; never fail the query over it
+        plan = f"indisponivel: {exc}"
+    current_app.logger.warning(
+        "Consulta lenta (%.1f ms): %s | plano: %s",
+        elapsed_ms,
+        _short(statement),
+        plan,
+    )
+
+
+def init_db_instrumentation(app) -> None:
+    """Per-request query count and DB time in ``Server-Timing`` and the log."""
+
+    @app.before_request
+    def _start_sql_stats():
+        if app.config.get("SQL_INSTRUMENTATION"):
+            g.sql_stats = QueryStats()
+
+    @app.after_request
+    def _report_sql_stats(response):
+        stats = request_stats()
+        if stats is None:
+            return response
+        if app.config.get("SQL_SERVER_TIMING"):
+            response.headers.add(
+                "Server-Timing",
+                f'db;dur={stats.total_ms:.2f};desc="{stats.count} queries"',
+            )
+        if stats.count:
+            app.logger.info("sql %s", json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "endpoint": request.endpoint,
+                "status": response.status_code,
+                **stats.as_dict(),
+            }))
+        return response
@@ -110,6 +110,49 @@ class GoogleCalendarTestForm(FlaskForm):
     submit = SubmitField('Criar agendamento de teste')
 
 
+WEEKDAY_CHOICES = [
+    (0, 'Segunda-feira'),
+    (1, 'Terca-feira'),
+    (2, 'Quarta-feira'),
+    (3, 'Quinta-feira'),
+    (4, 'Sexta-feira'),
+    (5, 'Sabado'),
+    (6, 'Domingo'),
+]
+
+
+class ScheduleRuleForm(FlaskForm):
+    weekday = SelectField('Dia da semana', choices=WEEKDAY_CHOICES, coerce=int)
+    start_time = TimeField('Inicio', validators=[DataRequired()])
+    end_time = TimeField('Fim', validators=[DataRequired()])
+    submit = SubmitField('Adicionar horario')
+
+    def validate_end_time(self, field):
+        if self.start_time.data and field.data and field.data <= self.start_time.data:
+            raise ValidationError('O fim deve ser depois do inicio.')
+
+
+class ScheduleExceptionForm(FlaskForm):
+    date = DateField('Data', validators=[DataRequired()])
+    kind = SelectField(
+        'Tipo',
+        choices=[('closed', 'Fechado / bloqueio'), ('open', 'Horario especial')],
+        validators=[DataRequired()],
+    )
+    start_time = TimeField('Inicio', validators=[Optional()])
+    end_time = TimeField('Fim', validators=[Optional()])
+    note = StringField('Observacao', validators=[Optional(), Length(max=150)])
+    submit = SubmitField('Adicionar excecao')
+
+    def validate_end_time(self, field):
+        if bool(self.start_time.data) != bool(field.data):
+            raise ValidationError('Informe inicio e fim, ou deixe ambos vazios.')
+        if self.start_time.data and field.data and field.data <= self.start_time.data:
+            raise ValidationError('O fim deve ser depois do inicio.')
+        if self.kind.data == 'open' and not field.data:
+            raise ValidationError('Horario especial precisa de inicio e fim.')
+
+
 class SettingsEmailForm(FlaskForm):
     admin_notify_email = StringField('Email de Notificacoes', validators=[Optional(), Email()])
     mail_server = StringField('Servidor SMTP', validators=[Optional()])
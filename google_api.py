@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, has_app_context
+
+from metrics import GOOGLE_CALL_SECONDS, GOOGLE_EVENTS
+
+DEFAULT_RATE_PER_SECOND = 10.0
+DEFAULT_BURST = 50
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET_SECONDS = 60.0
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded"}
+
+
+def _float_env(name: str, default: float, minimum: float = 0.0) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return max(minimum, float(value))
+    except ValueError:
+        return default
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Google while the circuit for a calendar is open."""
+
+
+class RateLimitedError(Exception):
+    """Raised by a non-blocking call when the calendar's token bucket is empty."""
+
+
+class TokenBucket:
+    """Allows ``rate`` calls per second on average, with bursts up to ``burst``."""
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take ``tokens`` and return how long the caller must wait before using them."""
+        tokens = min(tokens, self.burst)
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            if self.tokens >= 0 or self.rate <= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def try_take(self, tokens: float = 1.0) -> bool:
+        """Take ``tokens`` only if they are available now; never goes into debt."""
+        tokens = min(tokens, self.burst)
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < tokens and self.rate > 0:
+                return False
+            self.tokens -= tokens
+            return True
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failed calls and lets one trial through after ``reset_seconds``."""
+
+    def __init__(self, threshold: int, reset_seconds: float, clock=time.monotonic):
+        self.threshold = max(1, threshold)
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or self.clock() - self.opened_at < self.reset_seconds:
+                return False
+            self._trial = True
+            return True
+
+    def release_trial(self) -> None:
+        """Give back a trial that ``allow`` granted but that never reached Google."""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> bool:
+        """Count a failure; returns True when this call opened the circuit."""
+        with self._lock:
+            self.failures += 1
+            was_open = self.opened_at is not None
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self._trial = False
+            return not was_open and self.opened_at is not None
+
+
+_metrics: Counter = Counter()
+_guards: dict[str, tuple[TokenBucket, CircuitBreaker]] = {}
+_state_lock = threading.Lock()
+
+
+def _guard(calendar_id: str | None) -> tuple[TokenBucket, CircuitBreaker]:
+    key = calendar_id or ""
+    with _state_lock:
+        if key not in _guards:
+            _guards[key] = (
+                TokenBucket(
+                    _float_env("GOOGLE_API_RATE", DEFAULT_RATE_PER_SECOND),
+                    _float_env("GOOGLE_API_BURST", DEFAULT_BURST, minimum=1),
+                ),
+                CircuitBreaker(
+                    int(_float_env("GOOGLE_API_BREAKER_THRESHOLD", DEFAULT_BREAKER_THRESHOLD, minimum=1)),
+                    _float_env("GOOGLE_API_BREAKER_RESET_SECONDS", DEFAULT_BREAKER_RESET_SECONDS),
+                ),
+            )
+        return _guards[key]
+
+
+def count_metric(name: str, amount: int = 1) -> None:
+    with _state_lock:
+        _metrics[name] += amount
+    GOOGLE_EVENTS.inc(amount, event=name)
+
+
+def metrics_snapshot() -> dict:
+    """Counters since process start plus the calendars whose circuit is open."""
+    with _state_lock:
+        snapshot = dict(_metrics)
+        snapshot["open_circuits"] = sorted(key for key, (_, breaker) in _guards.items() if breaker.is_open)
+    return snapshot
+
+
+def reset_google_api_state() -> None:
+    with _state_lock:
+        _metrics.clear()
+        _guards.clear()
+
+
+def http_status(exc: Exception | None) -> int | None:
+    return getattr(getattr(exc, "resp", None), "status", None)
+
+
+def error_reasons(exc: Exception | None) -> set[str]:
+    content = getattr(exc, "content", None)
+    if not content:
+        return set()
+    try:
+        data = json.loads(content.decode("utf-8") if isinstance(content, bytes) else content)
+    except Exception:
+        return set()
+    error = data.get("error", {}) if isinstance(data, dict) else {}
+    items = error.get("errors", []) if isinstance(error, dict) else []
+    return {item.get("reason") for item in items if isinstance(item, dict) and item.get("reason")}
+
+
+def is_retryable(exc: Exception | None) -> bool:
+    """429, 5xx, 403 rate limits and dropped connections are worth retrying."""
+    if exc is None:
+        return False
+    status = http_status(exc)
+    if status is None:
+        return isinstance(exc, (ConnectionError, TimeoutError))
+    status = int(status)
+    if status == 429 or status >= 500:
+        return True
+    return status == 403 and bool(error_reasons(exc) & RATE_LIMIT_REASONS)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform in [0, base * 2**attempt], capped."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def before_call(calendar_id: str | None, cost: int = 1, sleep=time.sleep, block: bool = True) -> None:
+    """Wait for rate-limit tokens, or raise ``CircuitOpenError`` while Google is failing.
+
+    With ``block=False`` (request paths, where a user is waiting) an empty
+    bucket raises ``RateLimitedError`` instead of sleeping.
+    """
+    bucket, breaker = _guard(calendar_id)
+    if not breaker.allow():
+        count_metric("short_circuited")
+        raise CircuitOpenError(f"Google Agenda indisponivel para {calendar_id}; tentando mais tarde.")
+    if not block:
+        if not bucket.try_take(cost):
+            # No call is made, so nothing would ever report back on the trial.
+            breaker.release_trial()
+            count_metric("throttled")
+            raise RateLimitedError(f"Limite de chamadas do Google Agenda atingido para {calendar_id}.")
+        return
+    wait = bucket.reserve(cost)
+    if wait > 0:
+        count_metric("throttled")
+        sleep(wait)
+
+
+def record_result(calendar_id: str | None, exc: Exception | None = None) -> None:
+    """Feed the outcome of a call made outside ``execute`` (e.g. a batch) to the breaker."""
+    _, breaker = _guard(calendar_id)
+    if exc is None or not is_retryable(exc):
+        breaker.record_success()
+        return
+    count_metric("failures")
+    if breaker.record_failure():
+        count_metric("circuit_opened")
+        if has_app_context():
+            current_app.logger.warning("Circuito do Google Agenda aberto para %s", calendar_id)
+
+
+def execute(request, calendar_id: str | None, max_retries: int | None = None, sleep=time.sleep, block: bool = True):
+    """Run a googleapiclient request under the shared limiter, retry policy and breaker.
+
+    Request paths pass ``max_retries=0, block=False`` so a user never waits
+    on backoff or the limiter; retries are left to the outbox and scheduler.
+    """
+    if max_retries is None:
+        max_retries = int(_float_env("GOOGLE_API_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+    attempt = 0
+    while True:
+        before_call(calendar_id, sleep=sleep, block=block)
+        count_metric("calls")
+        started = time.perf_counter()
+        try:
+            response = request.execute()
+        except Exception as exc:
+            GOOGLE_CALL_SECONDS.observe(time.perf_counter() - started, outcome="error")
+            if not is_retryable(exc) or attempt >= max_retries:
+                record_result(calendar_id, exc)
+                raise
+            attempt += 1
+            count_metric("retries")
+            sleep(backoff_delay(attempt))
+            continue
+        GOOGLE_CALL_SECONDS.observe(time.perf_counter() - started, outcome="ok")
+        record_result(calendar_id)
+        return response
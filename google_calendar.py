@@ -1,14 +1,23 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Iterable
 
 from flask import current_app, has_app_context
+from sqlalchemy import and_, func, or_, select, update
 
+import google_api
+from availability_cache import invalidate_availability
+from availability_service import assign_overflow_seat, release_seat
 from extensions import db
-from models import Appointment, Settings, CalendarEvent
+from models import Appointment, CalendarEvent, CalendarSource, GoogleSyncState, Settings
+from schedule_service import invalidate_busy_index
+from settings_cache import SettingsSnapshot, get_settings
 
 try:
     from google.oauth2 import service_account
@@ -41,8 +50,8 @@ def _config_value(key: str, default: str | None = None) -> str | None:
     return default
 
 
-def _get_settings(settings: Settings | None) -> Settings | None:
-    return settings or Settings.query.first()
+def _get_settings(settings: Settings | None) -> Settings | SettingsSnapshot | None:
+    return settings or get_settings()
 
 
 def _get_calendar_id(settings: Settings | None) -> str | None:
@@ -132,9 +141,15 @@ def _get_sync_min_interval_minutes() -> int:
     return max(1, min(value, 60))
 
 
-def _load_credentials(settings: Settings | None = None):
+def _load_credentials(settings: Settings | None = None, credentials_file: str | None = None):
     if service_account is None:
         return None
+    if credentials_file:
+        if not os.path.exists(credentials_file):
+            if has_app_context():
+                current_app.logger.warning("Google credentials file not found: %s", credentials_file)
+            return None
+        return service_account.Credentials.from_service_account_file(credentials_file, scopes=SCOPES)
     details = get_google_credentials_details(settings)
     if not details["exists"]:
         return None
@@ -150,13 +165,71 @@ def _load_credentials(settings: Settings | None = None):
     return service_account.Credentials.from_service_account_file(path, scopes=SCOPES)
 
 
-def _get_service(settings: Settings | None = None):
+# Credentials are shared by the whole process so the access token is reused
+# until it expires. Discovery service objects wrap an httplib2 transport that
+# is not thread-safe, so each thread keeps its own, built on those credentials.
+_credentials_lock = threading.Lock()
+_credentials_cache: dict[str, object] = {}
+_service_local = threading.local()
+_cache_generation = 0
+
+
+def _credentials_fingerprint(settings: Settings | None, credentials_file: str | None = None) -> str | None:
+    if not credentials_file and settings and settings.google_credentials_json:
+        digest = hashlib.sha256(settings.google_credentials_json.encode("utf-8")).hexdigest()
+        return f"db:{digest}"
+    path = credentials_file or _get_credentials_path()
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"file:{path}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _get_credentials(settings: Settings | None, fingerprint: str, credentials_file: str | None = None):
+    with _credentials_lock:
+        creds = _credentials_cache.get(fingerprint)
+        if creds is None:
+            creds = _load_credentials(settings, credentials_file)
+            # Drop entries left behind by an edited key file of the same source.
+            prefix = fingerprint.rsplit(":", 2)[0] + ":" if fingerprint.startswith("file:") else "db:"
+            for key in [key for key in _credentials_cache if key.startswith(prefix)]:
+                del _credentials_cache[key]
+            if creds:
+                _credentials_cache[fingerprint] = creds
+        return creds
+
+
+def reset_service_cache() -> None:
+    """Drop cached credentials and services, e.g. after new credentials are saved."""
+    global _cache_generation
+    with _credentials_lock:
+        _credentials_cache.clear()
+        _cache_generation += 1
+
+
+def _get_service(settings: Settings | None = None, credentials_file: str | None = None):
     if build is None:
         return None
-    creds = _load_credentials(settings)
-    if not creds:
+    settings = _get_settings(settings)
+    fingerprint = _credentials_fingerprint(settings, credentials_file)
+    if not fingerprint:
         return None
-    return build("calendar", "v3", credentials=creds, cache_discovery=False)
+
+    key = fingerprint
+    if getattr(_service_local, "generation", None) != _cache_generation:
+        _service_local.generation = _cache_generation
+        _service_local.services = {}
+    service = _service_local.services.get(key)
+    if service is None:
+        creds = _get_credentials(settings, fingerprint, credentials_file)
+        if not creds:
+            return None
+        service = build("calendar", "v3", credentials=creds, cache_discovery=False)
+        _service_local.services[key] = service
+    return service
 
 
 def _parse_attendee_emails(raw: str | None) -> list[str]:
@@ -367,10 +440,133 @@ def _should_sync(settings: Settings | None) -> bool:
     return True
 
 
+def is_sync_enabled(settings: Settings | None = None) -> bool:
+    """Whether Google Calendar sync is switched on and fully configured."""
+    return _should_sync(settings)
+
+
 def _send_updates_param(attendees: Iterable[str]) -> str:
     return "all" if attendees else "none"
 
 
+def _body_hash(body: dict) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def _with_if_match(request, etag: str | None):
+    """Make an update conditional on the event still being at ``etag``."""
+    if etag and hasattr(request, "headers"):
+        request.headers["If-Match"] = etag
+    return request
+
+
+def _is_conflict(exc: Exception | None) -> bool:
+    return google_api.http_status(exc) == 412
+
+
+def _sync_states(kind: str, local_ids: Iterable[int]) -> dict[int, GoogleSyncState]:
+    local_ids = {local_id for local_id in local_ids if local_id is not None}
+    if not local_ids:
+        return {}
+    rows = GoogleSyncState.query.filter(GoogleSyncState.kind == kind, GoogleSyncState.local_id.in_(local_ids)).all()
+    return {row.local_id: row for row in rows}
+
+
+def _unchanged_since_push(state: GoogleSyncState | None, google_event_id: str | None, body_hash: str) -> bool:
+    return bool(
+        state
+        and google_event_id
+        and state.google_event_id == google_event_id
+        and state.body_hash == body_hash
+    )
+
+
+def _known_etag(state: GoogleSyncState | None, google_event_id: str | None) -> str | None:
+    if state and google_event_id and state.google_event_id == google_event_id:
+        return state.etag
+    return None
+
+
+def _remember_sync(
+    kind: str,
+    local_id: int,
+    google_event_id: str | None,
+    etag: str | None,
+    body_hash: str | None,
+    state: GoogleSyncState | None = None,
+) -> GoogleSyncState:
+    """Record that ``local_id`` now matches its Google event; the caller commits."""
+    if state is None:
+        state = GoogleSyncState(kind=kind, local_id=local_id)
+        db.session.add(state)
+    state.google_event_id = google_event_id
+    state.etag = etag
+    if body_hash is not None:
+        state.body_hash = body_hash
+    state.synced_at = datetime.utcnow()
+    return state
+
+
+def request_sync() -> None:
+    """Flag that Google has changes to import; the sync scheduler picks it up.
+
+    Only the first request of a burst sets the timestamp, so the sync runs a
+    debounce interval after it no matter how many more arrive.
+    """
+    db.session.execute(
+        update(Settings)
+        .where(Settings.google_sync_requested_at.is_(None))
+        .values(google_sync_requested_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+def _conflict_detected(kind: str, local_id: int) -> None:
+    if has_app_context():
+        current_app.logger.warning(
+            "Evento do Google Agenda alterado por outra pessoa (%s %s); importando antes de reenviar.", kind, local_id
+        )
+    request_sync()
+
+
+def count_stale_events(today) -> dict:
+    """Upcoming rows with a Google event that changed locally since they were last in sync.
+
+    Counts for appointments and calendar events plus the dashboard totals come
+    back from one query; the joins use the (kind, local_id) unique index.
+    """
+    appt_state = and_(GoogleSyncState.kind == "appointment", GoogleSyncState.local_id == Appointment.id)
+    event_state = and_(GoogleSyncState.kind == "calendar_event", GoogleSyncState.local_id == CalendarEvent.id)
+    upcoming = and_(Appointment.date >= today, Appointment.status.in_(["pending", "confirmed"]))
+    stale_appt = or_(GoogleSyncState.id.is_(None), Appointment.updated_at > GoogleSyncState.synced_at)
+    stale_event = or_(GoogleSyncState.id.is_(None), CalendarEvent.updated_at > GoogleSyncState.synced_at)
+    row = db.session.execute(
+        select(
+            select(func.count(Appointment.id)).where(upcoming).scalar_subquery(),
+            select(func.count(Appointment.id))
+            .where(upcoming, Appointment.google_event_id.isnot(None))
+            .scalar_subquery(),
+            select(func.count(Appointment.id))
+            .select_from(Appointment)
+            .outerjoin(GoogleSyncState, appt_state)
+            .where(upcoming, Appointment.google_event_id.isnot(None), stale_appt)
+            .scalar_subquery(),
+            select(func.count(CalendarEvent.id))
+            .select_from(CalendarEvent)
+            .outerjoin(GoogleSyncState, event_state)
+            .where(
+                CalendarEvent.end_at >= datetime.combine(today, datetime.min.time()),
+                CalendarEvent.status != "cancelled",
+                CalendarEvent.google_event_id.isnot(None),
+                CalendarEvent.source_id.is_(None),
+                stale_event,
+            )
+            .scalar_subquery(),
+        )
+    ).one()
+    return {"total": row[0], "synced": row[1], "stale_appointments": row[2], "stale_events": row[3]}
+
+
 def upsert_appointment_event(appointment: Appointment, settings: Settings | None = None) -> bool:
     settings = _get_settings(settings)
     if not _should_sync(settings):
@@ -384,34 +580,46 @@ def upsert_appointment_event(appointment: Appointment, settings: Settings | None
         return False
 
     body = _build_event_body(appointment, settings)
+    body_hash = _body_hash(body)
+    state = _sync_states("appointment", [appointment.id]).get(appointment.id)
+    if _unchanged_since_push(state, appointment.google_event_id, body_hash):
+        state.synced_at = datetime.utcnow()
+        db.session.commit()
+        return True
+    etag = _known_etag(state, appointment.google_event_id)
     attendees = [a["email"] for a in body.get("attendees", [])]
     send_updates = _send_updates_param(attendees)
 
     def _perform_upsert(payload: dict, updates: str):
         if appointment.google_event_id:
             try:
-                return (
-                    service.events()
-                    .update(calendarId=calendar_id, eventId=appointment.google_event_id, body=payload, sendUpdates=updates)
-                    .execute()
+                return google_api.execute(
+                    _with_if_match(
+                        service.events().update(
+                            calendarId=calendar_id, eventId=appointment.google_event_id, body=payload, sendUpdates=updates
+                        ),
+                        etag,
+                    ),
+                    calendar_id,
                 )
             except HttpError as exc:
                 if getattr(getattr(exc, "resp", None), "status", None) == 404:
-                    return (
-                        service.events()
-                        .insert(calendarId=calendar_id, body=payload, sendUpdates=updates)
-                        .execute()
+                    return google_api.execute(
+                        service.events().insert(calendarId=calendar_id, body=payload, sendUpdates=updates),
+                        calendar_id,
                     )
                 raise
-        return (
-            service.events()
-            .insert(calendarId=calendar_id, body=payload, sendUpdates=updates)
-            .execute()
+        return google_api.execute(
+            service.events().insert(calendarId=calendar_id, body=payload, sendUpdates=updates),
+            calendar_id,
         )
 
     try:
         event = _perform_upsert(body, send_updates)
     except Exception as exc:
+        if _is_conflict(exc):
+            _conflict_detected("appointment", appointment.id)
+            return False
         if _is_forbidden_attendees_error(exc) and body.get("attendees"):
             fallback_body = _strip_attendees(body)
             try:
@@ -432,11 +640,184 @@ def upsert_appointment_event(appointment: Appointment, settings: Settings | None
     event_id = event.get("id") if isinstance(event, dict) else None
     if event_id and appointment.google_event_id != event_id:
         appointment.google_event_id = event_id
-        db.session.commit()
+    # Flush first so the row's updated_at is not newer than synced_at.
+    db.session.flush()
+    etag = event.get("etag") if isinstance(event, dict) else None
+    _remember_sync("appointment", appointment.id, appointment.google_event_id, etag, body_hash, state)
+    db.session.commit()
     return True
 
 
-def upsert_calendar_event(event: CalendarEvent, settings: Settings | None = None) -> bool:
+BATCH_MAX_REQUESTS = 50
+BATCH_MAX_PASSES = 4
+# Options for Google calls made while an admin waits on the response.
+REQUEST_PATH_CALL = {"max_retries": 0, "block": False}
+
+
+def batch_upsert_appointment_events(
+    appointments: Iterable[Appointment],
+    settings: Settings | None = None,
+    batch_size: int = BATCH_MAX_REQUESTS,
+    interactive: bool = False,
+) -> dict:
+    """Push many appointments through the Calendar batch endpoint.
+
+    Up to ``batch_size`` (max 50, the API limit) inserts/updates share one HTTP
+    call. Updates answered with 404 are re-sent as inserts and 403s caused by
+    attendee invitations are re-sent without attendees, both in a follow-up
+    batch. Appointments whose body hash matches the last push are skipped, and
+    updates carry ``If-Match`` with the known etag. New event ids and etags are
+    written back and committed once per batch.
+
+    ``interactive`` never sleeps on the limiter or backs off: once Google
+    throttles, the appointments still pending are listed in
+    ``report["deferred"]`` for the caller to queue instead.
+    """
+    appointments = list(appointments)
+    report = {
+        "total": len(appointments), "created": 0, "updated": 0, "skipped": 0, "failed": 0, "errors": [], "deferred": [],
+    }
+    settings = _get_settings(settings)
+    if not appointments:
+        return report
+    if not _should_sync(settings):
+        report["failed"] = len(appointments)
+        report["errors"].append({"appointment_id": None, "error": "Sincronizacao nao configurada."})
+        return report
+    service = _get_service(settings)
+    calendar_id = _get_calendar_id(settings)
+    if not service or not calendar_id:
+        report["failed"] = len(appointments)
+        report["errors"].append({"appointment_id": None, "error": "Servico do Google indisponivel."})
+        return report
+
+    batch_size = max(1, min(batch_size, BATCH_MAX_REQUESTS))
+    by_id = {str(appt.id): appt for appt in appointments}
+
+    states = _sync_states("appointment", [appt.id for appt in appointments])
+    hashes = {}
+    conflicts = []
+
+    def _request(appt: Appointment, body: dict, updates: str, force_insert: bool):
+        if appt.google_event_id and not force_insert:
+            return "updated", _with_if_match(
+                service.events().update(
+                    calendarId=calendar_id, eventId=appt.google_event_id, body=body, sendUpdates=updates
+                ),
+                _known_etag(states.get(appt.id), appt.google_event_id),
+            )
+        return "created", service.events().insert(calendarId=calendar_id, body=body, sendUpdates=updates)
+
+    def _run(items: list[tuple[Appointment, dict, str, bool]]) -> list[tuple[Appointment, dict, str, bool]]:
+        retries = []
+        kinds = {}
+        outcomes = {}
+
+        def _callback(request_id, response, exception):
+            outcomes[request_id] = (response, exception)
+
+        batch = service.new_batch_http_request(callback=_callback)
+        for appt, body, updates, force_insert in items:
+            kind, request = _request(appt, body, updates, force_insert)
+            kinds[str(appt.id)] = (kind, body, updates, force_insert)
+            batch.add(request, request_id=str(appt.id))
+        try:
+            google_api.before_call(calendar_id, cost=len(items), block=not interactive)
+            try:
+                batch.execute()
+            except Exception as exc:
+                google_api.record_result(calendar_id, exc)
+                raise
+        except Exception as exc:
+            if google_api.is_retryable(exc) or isinstance(exc, google_api.RateLimitedError):
+                throttled.append(exc)
+                return items
+            if has_app_context():
+                current_app.logger.exception("Falha no lote do Google Agenda: %s", exc)
+            for appt, *_ in items:
+                report["failed"] += 1
+                report["errors"].append({"appointment_id": appt.id, "error": str(exc)})
+            return []
+
+        retryable = [exc for _, exc in outcomes.values() if google_api.is_retryable(exc)]
+        google_api.record_result(calendar_id, retryable[0] if retryable and len(retryable) == len(items) else None)
+
+        synced = []
+        for request_id, (kind, body, updates, force_insert) in kinds.items():
+            appt = by_id[request_id]
+            response, exception = outcomes.get(request_id, (None, None))
+            if exception is None and isinstance(response, dict):
+                event_id = response.get("id")
+                if event_id and appt.google_event_id != event_id:
+                    appt.google_event_id = event_id
+                synced.append((appt, response.get("etag")))
+                report[kind] += 1
+            elif _is_conflict(exception):
+                conflicts.append(appt.id)
+                report["failed"] += 1
+                report["errors"].append({"appointment_id": appt.id, "error": "Evento alterado no Google; importe antes."})
+            elif kind == "updated" and google_api.http_status(exception) == 404:
+                retries.append((appt, body, updates, True))
+            elif body.get("attendees") and _is_forbidden_attendees_error(exception):
+                retries.append((appt, _strip_attendees(body), "none", force_insert))
+            elif google_api.is_retryable(exception):
+                throttled.append(exception)
+                retries.append((appt, body, updates, force_insert))
+            else:
+                report["failed"] += 1
+                report["errors"].append({"appointment_id": appt.id, "error": str(exception or "sem resposta")})
+        db.session.flush()
+        for appt, etag in synced:
+            states[appt.id] = _remember_sync(
+                "appointment", appt.id, appt.google_event_id, etag, hashes[appt.id], states.get(appt.id)
+            )
+        db.session.commit()
+        return retries
+
+    pending = []
+    now = datetime.utcnow()
+    for appt in appointments:
+        body = _build_event_body(appt, settings)
+        hashes[appt.id] = _body_hash(body)
+        if _unchanged_since_push(states.get(appt.id), appt.google_event_id, hashes[appt.id]):
+            states[appt.id].synced_at = now
+            report["skipped"] += 1
+            continue
+        attendees = [a["email"] for a in body.get("attendees", [])]
+        pending.append((appt, body, _send_updates_param(attendees), False))
+    if report["skipped"]:
+        db.session.commit()
+
+    throttled = []
+    for attempt in range(BATCH_MAX_PASSES):
+        if not pending:
+            break
+        if throttled:
+            if interactive:
+                break
+            # Rate-limited or 5xx items wait out a jittered backoff before the next pass.
+            google_api.count_metric("retries", len(pending))
+            time.sleep(google_api.backoff_delay(attempt))
+            throttled.clear()
+        retries = []
+        for start in range(0, len(pending), batch_size):
+            retries.extend(_run(pending[start:start + batch_size]))
+        pending = retries
+    for appt, *_ in pending:
+        if interactive:
+            report["deferred"].append(appt.id)
+            continue
+        report["failed"] += 1
+        report["errors"].append({"appointment_id": appt.id, "error": "Tentativas esgotadas."})
+    if conflicts:
+        _conflict_detected("appointment", conflicts[0])
+    return report
+
+
+def upsert_calendar_event(event: CalendarEvent, settings: Settings | None = None, interactive: bool = False) -> bool:
+    """Push a manual calendar block; ``interactive`` calls Google once without waiting on the limiter."""
+    if event.source_id is not None:
+        return False  # imported from another calendar; never pushed to the main one
     settings = _get_settings(settings)
     if not _should_sync(settings):
         return False
@@ -448,35 +829,51 @@ def upsert_calendar_event(event: CalendarEvent, settings: Settings | None = None
     if not calendar_id:
         return False
 
+    call_options = REQUEST_PATH_CALL if interactive else {}
     body = _build_calendar_event_body(event, settings)
+    body_hash = _body_hash(body)
+    state = _sync_states("calendar_event", [event.id]).get(event.id)
+    if _unchanged_since_push(state, event.google_event_id, body_hash):
+        state.synced_at = datetime.utcnow()
+        db.session.commit()
+        return True
+    etag = _known_etag(state, event.google_event_id)
     attendees = [a["email"] for a in body.get("attendees", [])]
     send_updates = _send_updates_param(attendees)
 
     def _perform_upsert(payload: dict, updates: str):
         if event.google_event_id:
             try:
-                return (
-                    service.events()
-                    .update(calendarId=calendar_id, eventId=event.google_event_id, body=payload, sendUpdates=updates)
-                    .execute()
+                return google_api.execute(
+                    _with_if_match(
+                        service.events().update(
+                            calendarId=calendar_id, eventId=event.google_event_id, body=payload, sendUpdates=updates
+                        ),
+                        etag,
+                    ),
+                    calendar_id,
+                    **call_options,
                 )
             except HttpError as exc:
                 if getattr(getattr(exc, "resp", None), "status", None) == 404:
-                    return (
-                        service.events()
-                        .insert(calendarId=calendar_id, body=payload, sendUpdates=updates)
-                        .execute()
+                    return google_api.execute(
+                        service.events().insert(calendarId=calendar_id, body=payload, sendUpdates=updates),
+                        calendar_id,
+                        **call_options,
                     )
                 raise
-        return (
-            service.events()
-            .insert(calendarId=calendar_id, body=payload, sendUpdates=updates)
-            .execute()
+        return google_api.execute(
+            service.events().insert(calendarId=calendar_id, body=payload, sendUpdates=updates),
+            calendar_id,
+            **call_options,
         )
 
     try:
         event_data = _perform_upsert(body, send_updates)
     except Exception as exc:
+        if _is_conflict(exc):
+            _conflict_detected("calendar_event", event.id)
+            return False
         if _is_forbidden_attendees_error(exc) and body.get("attendees"):
             fallback_body = _strip_attendees(body)
             try:
@@ -497,11 +894,17 @@ def upsert_calendar_event(event: CalendarEvent, settings: Settings | None = None
     event_id = event_data.get("id") if isinstance(event_data, dict) else None
     if event_id and event.google_event_id != event_id:
         event.google_event_id = event_id
-        db.session.commit()
+    # Flush first so the row's updated_at is not newer than synced_at.
+    db.session.flush()
+    etag = event_data.get("etag") if isinstance(event_data, dict) else None
+    _remember_sync("calendar_event", event.id, event.google_event_id, etag, body_hash, state)
+    db.session.commit()
     return True
 
 
-def cancel_calendar_event(event: CalendarEvent, settings: Settings | None = None) -> bool:
+def cancel_calendar_event(event: CalendarEvent, settings: Settings | None = None, interactive: bool = False) -> bool:
+    if event.source_id is not None:
+        return False
     settings = _get_settings(settings)
     if not _should_sync(settings):
         return False
@@ -517,7 +920,11 @@ def cancel_calendar_event(event: CalendarEvent, settings: Settings | None = None
         return False
 
     try:
-        service.events().delete(calendarId=calendar_id, eventId=event.google_event_id, sendUpdates="none").execute()
+        google_api.execute(
+            service.events().delete(calendarId=calendar_id, eventId=event.google_event_id, sendUpdates="none"),
+            calendar_id,
+            **(REQUEST_PATH_CALL if interactive else {}),
+        )
     except Exception as exc:
         if has_app_context():
             current_app.logger.exception("Falha ao cancelar evento no Google Agenda: %s", exc)
@@ -525,6 +932,57 @@ def cancel_calendar_event(event: CalendarEvent, settings: Settings | None = None
     return True
 
 
+def start_watch_channel(
+    channel_id: str,
+    token: str,
+    address: str,
+    ttl_seconds: int,
+    settings: Settings | None = None,
+) -> dict | None:
+    """Open an ``events.watch`` channel; returns Google's channel resource."""
+    settings = _get_settings(settings)
+    if not _should_sync(settings):
+        return None
+    service = _get_service(settings)
+    calendar_id = _get_calendar_id(settings)
+    if not service or not calendar_id:
+        return None
+
+    body = {
+        "id": channel_id,
+        "type": "web_hook",
+        "address": address,
+        "token": token,
+        "params": {"ttl": str(int(ttl_seconds))},
+    }
+    try:
+        return google_api.execute(service.events().watch(calendarId=calendar_id, body=body), calendar_id)
+    except Exception as exc:
+        if has_app_context():
+            current_app.logger.exception("Falha ao registrar canal do Google Agenda: %s", exc)
+        return None
+
+
+def stop_watch_channel(channel_id: str, resource_id: str | None, settings: Settings | None = None) -> bool:
+    settings = _get_settings(settings)
+    service = _get_service(settings) if _should_sync(settings) else None
+    if not service or not resource_id:
+        return False
+    try:
+        google_api.execute(
+            service.channels().stop(body={"id": channel_id, "resourceId": resource_id}),
+            _get_calendar_id(settings),
+        )
+    except HttpError as exc:
+        # 404: the channel already expired on Google's side.
+        return google_api.http_status(exc) == 404
+    except Exception as exc:
+        if has_app_context():
+            current_app.logger.exception("Falha ao encerrar canal do Google Agenda: %s", exc)
+        return False
+    return True
+
+
 def cancel_appointment_event(appointment: Appointment, settings: Settings | None = None) -> bool:
     settings = _get_settings(settings)
     if not _should_sync(settings):
@@ -541,7 +999,10 @@ def cancel_appointment_event(appointment: Appointment, settings: Settings | None
         return False
 
     try:
-        service.events().delete(calendarId=calendar_id, eventId=appointment.google_event_id, sendUpdates="all").execute()
+        google_api.execute(
+            service.events().delete(calendarId=calendar_id, eventId=appointment.google_event_id, sendUpdates="all"),
+            calendar_id,
+        )
     except Exception as exc:
         if has_app_context():
             current_app.logger.exception("Falha ao cancelar evento no Google Agenda: %s", exc)
@@ -549,6 +1010,32 @@ def cancel_appointment_event(appointment: Appointment, settings: Settings | None
     return True
 
 
+def push_pending_appointment_events(settings: Settings | None = None, limit: int = 200) -> int:
+    """Create Google events for upcoming appointments that still have none.
+
+    Catches up on appointments created while sync was off or whose queued
+    push ran out of retries, in date order.
+    """
+    settings = _get_settings(settings)
+    if not _should_sync(settings):
+        return 0
+
+    pending = (
+        Appointment.query
+        .filter(Appointment.google_event_id.is_(None))
+        .filter(Appointment.status.in_(["pending", "confirmed"]))
+        .filter(Appointment.date >= datetime.now().date())
+        .order_by(Appointment.date.asc(), Appointment.time.asc())
+        .limit(limit)
+        .all()
+    )
+    pushed = 0
+    for appointment in pending:
+        if upsert_appointment_event(appointment, settings=settings):
+            pushed += 1
+    return pushed
+
+
 def _parse_google_datetime(value: str | None) -> datetime | None:
     if not value:
         return None
@@ -561,27 +1048,66 @@ def _parse_google_datetime(value: str | None) -> datetime | None:
         return None
 
 
-def _find_appointment_for_event(event: dict) -> Appointment | None:
-    event_id = event.get("id")
+def _private_appointment_id(event: dict) -> int | None:
     private_props = event.get("extendedProperties", {}).get("private", {})
-    appointment_id = private_props.get("appointment_id")
-
-    appointment = None
-    if appointment_id:
-        try:
-            appointment = Appointment.query.get(int(appointment_id))
-        except (TypeError, ValueError):
-            appointment = None
-    if not appointment and event_id:
-        appointment = Appointment.query.filter_by(google_event_id=event_id).first()
-    return appointment
+    try:
+        return int(private_props.get("appointment_id"))
+    except (TypeError, ValueError):
+        return None
 
 
-def _find_calendar_event_for_event(event: dict) -> CalendarEvent | None:
-    event_id = event.get("id")
-    if not event_id:
-        return None
-    return CalendarEvent.query.filter_by(google_event_id=event_id).first()
+def _resolve_page_entities(events: list[dict], source_id: int | None = None) -> tuple[dict, dict, dict]:
+    """Load the local rows matching a page of Google events.
+
+    Returns appointments by id, appointments by ``google_event_id`` and
+    calendar events by ``google_event_id``, using one ``IN`` query per table
+    instead of up to three lookups per event.
+
+    Only the main calendar (``source_id`` None) is matched to appointments.
+    An invited calendar holds copies of the clinic's events under the same
+    event id, so a source's rows are looked up among that source's own
+    calendar events only.
+    """
+    event_ids = {event["id"] for event in events if event.get("id")}
+    appointment_ids = {appt_id for appt_id in map(_private_appointment_id, events) if appt_id is not None}
+
+    appointments = []
+    if source_id is None and (event_ids or appointment_ids):
+        clauses = []
+        if appointment_ids:
+            clauses.append(Appointment.id.in_(appointment_ids))
+        if event_ids:
+            clauses.append(Appointment.google_event_id.in_(event_ids))
+        appointments = Appointment.query.filter(or_(*clauses)).all()
+
+    by_id = {appt.id: appt for appt in appointments}
+    by_event_id = {}
+    for appt in sorted(appointments, key=lambda item: item.id):
+        if appt.google_event_id:
+            by_event_id.setdefault(appt.google_event_id, appt)
+
+    # Events that already map to an appointment never become CalendarEvent rows.
+    unresolved = {
+        event["id"]
+        for event in events
+        if event.get("id")
+        and event["id"] not in by_event_id
+        and _private_appointment_id(event) not in by_id
+    }
+    calendar_events = {}
+    if unresolved:
+        same_calendar = (
+            CalendarEvent.source_id.is_(None) if source_id is None else CalendarEvent.source_id == source_id
+        )
+        rows = (
+            CalendarEvent.query
+            .filter(CalendarEvent.google_event_id.in_(unresolved), same_calendar)
+            .order_by(CalendarEvent.id.asc())
+            .all()
+        )
+        for row in rows:
+            calendar_events.setdefault(row.google_event_id, row)
+    return by_id, by_event_id, calendar_events
 
 
 def _apply_event_to_appointment(event: dict, appointment: Appointment) -> bool:
@@ -590,6 +1116,7 @@ def _apply_event_to_appointment(event: dict, appointment: Appointment) -> bool:
         if appointment.status not in ("cancelled", "canceled"):
             appointment.status = "cancelled"
             appointment.cancelled_at = datetime.utcnow()
+            release_seat(appointment)
             return True
         return False
 
@@ -612,6 +1139,7 @@ def _apply_event_to_appointment(event: dict, appointment: Appointment) -> bool:
         appointment.status = appointment.status or "pending"
         appointment.rescheduled_at = datetime.utcnow()
         appointment.reminder_sent_at = None
+        assign_overflow_seat(appointment, new_date, new_time)
         return True
     return False
 
@@ -653,77 +1181,48 @@ def _apply_event_to_calendar_event(event: dict, item: CalendarEvent) -> bool:
     return changed
 
 
-def sync_google_calendar(settings: Settings | None = None, force: bool = False) -> bool:
-    settings = _get_settings(settings)
-    if not _should_sync(settings):
-        return False
-
-    now = datetime.utcnow()
-    if not force and settings.google_sync_last_at:
-        delta = now - settings.google_sync_last_at
-        if delta.total_seconds() < _get_sync_min_interval_minutes() * 60:
-            return False
-
-    service = _get_service(settings)
-    if not service:
-        return False
+def _remember_pulled_etags(matched: list[tuple[str, object, dict]]) -> None:
+    """Store the etag of every imported event so later pushes can send If-Match."""
+    matched = [(kind, row, event) for kind, row, event in matched if event.get("etag") and row.id is not None]
+    if not matched:
+        return
+    clauses = [
+        and_(GoogleSyncState.kind == kind, GoogleSyncState.local_id.in_({row.id for k, row, _ in matched if k == kind}))
+        for kind in {kind for kind, _, _ in matched}
+    ]
+    states = {(state.kind, state.local_id): state for state in GoogleSyncState.query.filter(or_(*clauses)).all()}
+    for kind, row, event in matched:
+        state = states.get((kind, row.id))
+        if state is None or state.etag != event["etag"]:
+            states[(kind, row.id)] = _remember_sync(kind, row.id, row.google_event_id, event["etag"], None, state)
+    db.session.flush()
 
-    calendar_id = _get_calendar_id(settings)
-    if not calendar_id:
-        return False
 
-    events = []
-    next_sync_token = None
+def _apply_event_page(events: list[dict], source_id: int | None = None) -> bool:
+    """Apply one page of Google events to local rows and flush once.
 
-    params = {
-        "calendarId": calendar_id,
-        "singleEvents": True,
-        "showDeleted": True,
-        "maxResults": 250,
-    }
-
-    if settings.google_sync_token:
-        params["syncToken"] = settings.google_sync_token
-    else:
-        time_min = (datetime.utcnow() - timedelta(days=90)).isoformat() + "Z"
-        params["timeMin"] = time_min
-
-    page_token = None
-    try:
-        while True:
-            if page_token:
-                params["pageToken"] = page_token
-            response = service.events().list(**params).execute()
-            events.extend(response.get("items", []))
-            page_token = response.get("nextPageToken")
-            next_sync_token = response.get("nextSyncToken") or next_sync_token
-            if not page_token:
-                break
-    except HttpError as exc:
-        if getattr(getattr(exc, "resp", None), "status", None) == 410:
-            settings.google_sync_token = None
-            db.session.commit()
-            return sync_google_calendar(settings=settings, force=True)
-        if has_app_context():
-            current_app.logger.exception("Falha ao listar eventos do Google Agenda: %s", exc)
-        return False
-    except Exception as exc:
-        if has_app_context():
-            current_app.logger.exception("Falha ao listar eventos do Google Agenda: %s", exc)
-        return False
+    New calendar events are tagged with ``source_id`` (``None`` for the main
+    calendar); events of a source never change appointments.
+    """
+    appointments_by_id, appointments_by_event_id, calendar_events = _resolve_page_entities(events, source_id)
 
     changed = False
+    matched = []
     for event in events:
-        appointment = _find_appointment_for_event(event)
+        event_id = event.get("id")
+        appointment = appointments_by_id.get(_private_appointment_id(event))
+        if not appointment and event_id:
+            appointment = appointments_by_event_id.get(event_id)
         if appointment:
-            if not appointment.google_event_id and event.get("id"):
-                appointment.google_event_id = event.get("id")
+            if not appointment.google_event_id and event_id:
+                appointment.google_event_id = event_id
                 changed = True
             if _apply_event_to_appointment(event, appointment):
                 changed = True
+            matched.append(("appointment", appointment, event))
             continue
 
-        cal_event = _find_calendar_event_for_event(event)
+        cal_event = calendar_events.get(event_id) if event_id else None
         if not cal_event:
             status = (event.get("status") or "").lower()
             if status == "cancelled":
@@ -743,24 +1242,174 @@ def sync_google_calendar(settings: Settings | None = None, force: bool = False)
                 all_day=all_day,
                 status="active",
                 source=source,
-                google_event_id=event.get("id"),
+                google_event_id=event_id,
+                source_id=source_id,
             )
             db.session.add(cal_event)
+            if event_id:
+                calendar_events[event_id] = cal_event
             changed = True
 
-        if cal_event and not cal_event.google_event_id and event.get("id"):
-            cal_event.google_event_id = event.get("id")
-            changed = True
-        if cal_event and _apply_event_to_calendar_event(event, cal_event):
+        if _apply_event_to_calendar_event(event, cal_event):
             changed = True
+        matched.append(("calendar_event", cal_event, event))
 
-    if next_sync_token and next_sync_token != settings.google_sync_token:
-        settings.google_sync_token = next_sync_token
-        changed = True
+    if changed:
+        db.session.flush()
+    _remember_pulled_etags(matched)
+    return changed
 
-    settings.google_sync_last_at = datetime.utcnow()
-    changed = True
 
-    if changed:
+class _SyncCursor:
+    """Where a calendar keeps its sync token, page checkpoint and last sync time.
+
+    The main calendar stores them on ``Settings``; each ``CalendarSource``
+    has its own columns.
+    """
+
+    def __init__(self, row, token: str, checkpoint: str, last_at: str):
+        self.row = row
+        self.fields = {"token": token, "checkpoint": checkpoint, "last_at": last_at}
+
+    def get(self, name: str):
+        return getattr(self.row, self.fields[name])
+
+    def set(self, name: str, value) -> None:
+        setattr(self.row, self.fields[name], value)
+
+
+def _settings_cursor(settings: Settings) -> _SyncCursor:
+    return _SyncCursor(settings, "google_sync_token", "google_sync_checkpoint", "google_sync_last_at")
+
+
+def _source_cursor(source: CalendarSource) -> _SyncCursor:
+    return _SyncCursor(source, "sync_token", "sync_checkpoint", "last_sync_at")
+
+
+def _load_sync_checkpoint(cursor: _SyncCursor) -> dict | None:
+    raw = cursor.get("checkpoint")
+    if not raw:
+        return None
+    try:
+        checkpoint = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(checkpoint, dict) or not checkpoint.get("pageToken"):
+        return None
+    return checkpoint
+
+
+def _iter_event_pages(service, params: dict):
+    """Yield ``(items, next_page_token, next_sync_token)`` one page at a time."""
+    params = dict(params)
+    while True:
+        response = google_api.execute(service.events().list(**params), params.get("calendarId"))
+        page_token = response.get("nextPageToken")
+        yield response.get("items", []), page_token, response.get("nextSyncToken")
+        if not page_token:
+            return
+        params["pageToken"] = page_token
+
+
+def _sync_calendar(service, calendar_id: str, cursor: _SyncCursor, source_id: int | None = None) -> bool:
+    """Import changes of one calendar, committing after every page.
+
+    Each page is applied and committed together with a checkpoint holding the
+    query and the next ``pageToken``, so a sync that dies halfway resumes
+    from the last page instead of listing the whole window again. The sync
+    token only advances once the last page is in.
+    """
+    events_changed = False
+    try:
+        for _ in range(2):
+            params = {
+                "calendarId": calendar_id,
+                "singleEvents": True,
+                "showDeleted": True,
+                "maxResults": 250,
+            }
+            checkpoint = _load_sync_checkpoint(cursor)
+            if checkpoint and checkpoint.get("calendarId") == calendar_id:
+                query = {key: checkpoint[key] for key in ("syncToken", "timeMin") if checkpoint.get(key)}
+                params.update(query, pageToken=checkpoint["pageToken"])
+            elif cursor.get("token"):
+                checkpoint = None
+                query = {"syncToken": cursor.get("token")}
+            else:
+                checkpoint = None
+                query = {"timeMin": (datetime.utcnow() - timedelta(days=90)).isoformat() + "Z"}
+            params.update(query)
+
+            try:
+                for items, page_token, next_sync_token in _iter_event_pages(service, params):
+                    if _apply_event_page(items, source_id):
+                        events_changed = True
+                    if page_token:
+                        cursor.set("checkpoint", json.dumps({"calendarId": calendar_id, **query, "pageToken": page_token}))
+                    else:
+                        cursor.set("checkpoint", None)
+                        if next_sync_token:
+                            cursor.set("token", next_sync_token)
+                        cursor.set("last_at", datetime.utcnow())
+                    db.session.commit()
+                return True
+            except HttpError as exc:
+                db.session.rollback()
+                status = google_api.http_status(exc)
+                if status == 410 or (status == 400 and checkpoint):
+                    # Expired sync token, or a saved page token Google no longer accepts.
+                    if status == 410:
+                        cursor.set("token", None)
+                    cursor.set("checkpoint", None)
+                    db.session.commit()
+                    continue
+                raise
+        return False
+    except Exception as exc:
+        db.session.rollback()
+        if has_app_context():
+            current_app.logger.exception("Falha ao listar eventos do Google Agenda (%s): %s", calendar_id, exc)
+        return False
+    finally:
+        if events_changed:
+            invalidate_busy_index()
+            invalidate_availability()
+
+
+def sync_google_calendar(settings: Settings | None = None, force: bool = False) -> bool:
+    """Import changes from the main Google calendar (see ``_sync_calendar``)."""
+    # The sync token is written back to this row, so it cannot be the snapshot.
+    settings = settings or Settings.query.first()
+    if not _should_sync(settings):
+        return False
+
+    now = datetime.utcnow()
+    if not force and settings.google_sync_last_at:
+        delta = now - settings.google_sync_last_at
+        if delta.total_seconds() < _get_sync_min_interval_minutes() * 60:
+            return False
+
+    service = _get_service(settings)
+    if not service:
+        return False
+
+    calendar_id = _get_calendar_id(settings)
+    if not calendar_id:
+        return False
+    return _sync_calendar(service, calendar_id, _settings_cursor(settings))
+
+
+def sync_calendar_source(source: CalendarSource, settings: Settings | None = None) -> bool:
+    """Import one extra calendar; its events become busy time, never appointment changes."""
+    settings = _get_settings(settings)
+    if not settings or not settings.google_sync_enabled or not source.is_active:
+        return False
+    service = _get_service(settings, credentials_file=source.credentials_file)
+    if not service:
+        source.last_error = "Credenciais do Google indisponiveis."
         db.session.commit()
-    return True
+        return False
+    ok = _sync_calendar(service, source.calendar_id, _source_cursor(source), source_id=source.id)
+    source.last_error = None if ok else "Falha ao listar eventos."
+    db.session.commit()
+    return ok
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from calendar_sources import DEFAULT_SYNC_WORKERS, due_source_ids, sync_calendar_sources
+from calendar_watch import restore_sync_request, sync_due, take_sync_request
+from extensions import db
+from google_calendar import _get_sync_min_interval_minutes, is_sync_enabled, sync_google_calendar
+from models import SchedulerLock, Settings
+
+SYNC_LOCK_NAME = "google-calendar-sync"
+DEFAULT_TICK_SECONDS = 5
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def acquire_leader_lock(name: str, owner: str, ttl_seconds: float) -> bool:
+    """Take or renew the ``name`` lease for ``ttl_seconds``.
+
+    The lease is moved with a conditional UPDATE that only matches when we
+    already hold it or it has expired, so exactly one process wins even when
+    every gunicorn worker ticks at the same moment.
+    """
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=ttl_seconds)
+    result = db.session.execute(
+        update(SchedulerLock)
+        .where(SchedulerLock.name == name)
+        .where(or_(SchedulerLock.owner == owner, SchedulerLock.expires_at <= now))
+        .values(owner=owner, expires_at=expires, updated_at=now)
+    )
+    if result.rowcount:
+        db.session.commit()
+        return True
+    try:
+        db.session.execute(
+            insert(SchedulerLock).values(name=name, owner=owner, expires_at=expires, updated_at=now)
+        )
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
+
+
+def release_leader_lock(name: str, owner: str) -> None:
+    db.session.execute(
+        update(SchedulerLock)
+        .where(SchedulerLock.name == name, SchedulerLock.owner == owner)
+        .values(expires_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+def sync_interval_seconds() -> int:
+    return _get_sync_min_interval_minutes() * 60
+
+
+def run_sync_tick(
+    owner: str,
+    force: bool = False,
+    interval: float | None = None,
+    workers: int = DEFAULT_SYNC_WORKERS,
+) -> bool | None:
+    """Run the syncs that are due if this process is the leader.
+
+    The main calendar is due when a watch notification has waited out its
+    debounce or the polling interval has passed (see
+    ``calendar_watch.sync_due``); each ``CalendarSource`` once its own
+    interval has passed. Sources are synced in parallel on up to ``workers``
+    threads. Returns ``None`` when nothing ran, otherwise the result of the
+    main calendar sync (or of the sources when only they ran).
+    """
+    settings = Settings.query.first()
+    if not settings or not settings.google_sync_enabled:
+        return None
+    interval = interval or sync_interval_seconds()
+    now = datetime.utcnow()
+    primary_due = is_sync_enabled(settings) and (force or sync_due(settings, now, interval))
+    source_ids = due_source_ids(now, interval, force=force)
+    if not primary_due and not source_ids:
+        return None
+    # The lease outlives one cadence so a slow sync is not picked up twice.
+    if not acquire_leader_lock(SYNC_LOCK_NAME, owner, interval * 2):
+        return None
+
+    ok = None
+    if primary_due:
+        requested = settings.google_sync_requested_at
+        if requested:
+            take_sync_request(requested)
+        ok = sync_google_calendar(settings=settings, force=True)
+        if not ok and requested:
+            restore_sync_request(requested)
+    if source_ids:
+        results = sync_calendar_sources(current_app._get_current_object(), source_ids, workers=workers)
+        if ok is None:
+            ok = all(results.values())
+    return ok
+
+
+def run_sync_loop(app, owner: str, once: bool = False, interval: float | None = None,
+                  stop: threading.Event | None = None, tick: float = DEFAULT_TICK_SECONDS,
+                  workers: int = DEFAULT_SYNC_WORKERS) -> None:
+    """Check every ``tick`` seconds whether a sync is due; ``once`` syncs right away and returns."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        with app.app_context():
+            try:
+                run_sync_tick(owner, force=once, interval=interval, workers=workers)
+            except Exception:  # pragma: no cover - keep the loop alive
+                db.session.rollback()
+                app.logger.exception("Falha na sincronizacao agendada do Google Agenda")
+            finally:
+                db.session.remove()
+        if once:
+            break
+        stop.wait(tick)
+
+
+def start_background_sync(app) -> threading.Thread | None:
+    """Start the periodic sync in a daemon thread of this process.
+
+    Used when ``GOOGLE_SYNC_BACKGROUND`` is on; every web worker starts one,
+    and the leader lease keeps only one of them talking to Google.
+    """
+    if not app.config.get("GOOGLE_SYNC_BACKGROUND") or app.config.get("TESTING"):
+        return None
+    if app.extensions.get("google_sync_thread"):
+        return app.extensions["google_sync_thread"]
+    thread = threading.Thread(
+        target=run_sync_loop,
+        args=(app, default_owner()),
+        name="google-calendar-sync",
+        daemon=True,
+    )
+    app.extensions["google_sync_thread"] = thread
+    thread.start()
+    return thread
+
+
+def register_sync_commands(app):
+    @app.cli.command("calendar-sync")
+    @click.option("--interval", default=None, type=float, help="Segundos entre sincronizacoes sem notificacao (padrao: GOOGLE_SYNC_MIN_INTERVAL_MIN).")
+    @click.option("--tick", default=DEFAULT_TICK_SECONDS, show_default=True, help="Segundos entre verificacoes de notificacoes pendentes.")
+    @click.option("--workers", default=DEFAULT_SYNC_WORKERS, show_default=True, help="Agendas extras sincronizadas em paralelo.")
+    @click.option("--once", is_flag=True, help="Sincroniza uma vez e sai.")
+    def calendar_sync(interval: float | None, tick: float, workers: int, once: bool):
+        """Importa periodicamente as alteracoes do Google Agenda."""
+        worker_app = current_app._get_current_object()
+        owner = default_owner()
+        try:
+            run_sync_loop(worker_app, owner, once=once, interval=interval, tick=tick, workers=workers)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            release_leader_lock(SYNC_LOCK_NAME, owner)
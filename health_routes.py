@@ -4,6 +4,7 @@ from flask import Blueprint, current_app, jsonify, request
 from sqlalchemy import inspect, text
 
 from extensions import db
+from google_api import metrics_snapshot
 
 
 health_bp = Blueprint("health_bp", __name__)
@@ -70,3 +71,11 @@ def health_db():
         if details_allowed:
             return jsonify({"ok": False, "error": str(exc), "engine_url": _engine_url()}), 503
         return jsonify({"ok": False, "error": "database unavailable"}), 503
+
+
+@health_bp.route("/api/health/google", methods=["GET"])
+def health_google():
+    if not _details_authorized():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    metrics = metrics_snapshot()
+    return jsonify({"ok": not metrics["open_circuits"], "metrics": metrics}), 200
@@ -0,0 +1,23 @@
+import hashlib
+
+from flask import current_app, request
+
+
+def make_etag(*parts) -> str:
+    """Stable entity tag for a version stamp made of plain values."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+
+def is_not_modified(etag: str) -> bool:
+    return request.if_none_match.contains_weak(etag)
+
+
+def with_etag(response, etag: str, cache_control: str = "no-cache"):
+    """Attach ``etag`` and make clients revalidate before reusing the body."""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def not_modified(etag: str, cache_control: str = "no-cache"):
+    return with_etag(current_app.response_class(status=304), etag, cache_control)
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import atexit
+import glob
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import Appointment
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+FLUSH_INTERVAL_SECONDS = 1.0
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+CANCELLED_STATUSES = {"cancelled", "canceled"}
+
+_lock = threading.Lock()
+_metrics: dict[str, "_Metric"] = {}
+_state = {"pid": os.getpid(), "values": {}, "flushed_at": 0.0, "started": time.time(), "dirty": False, "flusher": None}
+
+
+def _multiproc_dir() -> str | None:
+    return (os.getenv("METRICS_MULTIPROC_DIR") or "").strip() or None
+
+
+def _values() -> dict:
+    # A forked worker starts from zero instead of inheriting the master's counts.
+    if _state["pid"] != os.getpid():
+        _state.update(pid=os.getpid(), values={}, flushed_at=0.0, started=time.time(), dirty=False, flusher=None)
+    return _state["values"]
+
+
+def _snapshot_path(directory: str) -> str:
+    return os.path.join(directory, f"metrics_{_state['pid']}_{int(_state['started'] * 1000)}.json")
+
+
+def _run_flusher() -> None:
+    while True:
+        time.sleep(FLUSH_INTERVAL_SECONDS)
+        if _state["dirty"]:
+            _flush(force=True)
+
+
+def _ensure_flusher() -> None:
+    """Start this process's timer thread; call with ``_lock`` held."""
+    if _state["flusher"] is None:
+        _state["flusher"] = threading.Thread(target=_run_flusher, name="metrics-flush", daemon=True)
+        _state["flusher"].start()
+
+
+def _flush(force: bool = False) -> None:
+    """Write this process's values to the shared directory, at most once a second.
+
+    Updates skipped by the throttle are written by a background timer, so a
+    worker that goes idle still publishes its last values.
+    """
+    directory = _multiproc_dir()
+    if not directory:
+        return
+    now = time.monotonic()
+    with _lock:
+        values = _values()
+        _ensure_flusher()
+        if not force and now - _state["flushed_at"] < FLUSH_INTERVAL_SECONDS:
+            _state["dirty"] = True
+            return
+        _state["flushed_at"] = now
+        _state["dirty"] = False
+        payload = json.dumps({name: {json.dumps(key): value for key, value in series.items()} for name, series in values.items()})
+        path = _snapshot_path(directory)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as handle:
+        handle.write(payload)
+    os.replace(tmp, path)
+
+
+atexit.register(lambda: _flush(force=True))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            series = _values().setdefault(self.name, {})
+            series[key] = series.get(key, 0.0) + amount
+        _flush()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            series = _values().setdefault(self.name, {})
+            # [count per bucket..., count above the last bucket, sum]
+            data = series.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            data[bisect_left(self.buckets, value)] += 1
+            data[-1] += value
+        _flush()
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Tempo de resposta por endpoint e status.", ("endpoint", "method", "status")
+)
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Tempo de cada consulta SQL.", buckets=DB_BUCKETS)
+GOOGLE_CALL_SECONDS = Histogram(
+    "google_calendar_call_duration_seconds", "Tempo das chamadas a API do Google Agenda.", ("outcome",)
+)
+GOOGLE_EVENTS = Counter(
+    "google_calendar_events_total",
+    "Chamadas, novas tentativas, falhas, esperas do limitador e disjuntores do Google Agenda.",
+    ("event",),
+)
+MAIL_SEND_SECONDS = Histogram("mail_send_duration_seconds", "Tempo de envio de e-mails.", ("kind", "outcome"))
+CHATBOT_INTENTS = Counter("chatbot_intents_total", "Respostas do chatbot por intencao.", ("intent",))
+BOOKINGS = Counter("bookings_total", "Agendamentos criados, cancelados e reagendados.", ("action",))
+
+
+def send_mail(mail, message, kind: str) -> None:
+    """``mail.send(message)`` with its latency recorded; errors are re-raised."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        mail.send(message)
+        outcome = "ok"
+    finally:
+        MAIL_SEND_SECONDS.observe(time.perf_counter() - started, kind=kind, outcome=outcome)
+
+
+def _merged_values() -> dict:
+    """This process's values plus every other worker's snapshot file."""
+    directory = _multiproc_dir()
+    with _lock:
+        merged = {
+            name: {key: list(value) if isinstance(value, list) else value for key, value in series.items()}
+            for name, series in _values().items()
+        }
+        own_path = _snapshot_path(directory) if directory else None
+    if not directory:
+        return merged
+    for path in glob.glob(os.path.join(directory, "metrics_*.json")):
+        if path == own_path:
+            continue
+        try:
+            with open(path, encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        for name, series in data.items():
+            target = merged.setdefault(name, {})
+            for raw_key, value in series.items():
+                key = tuple(json.loads(raw_key))
+                if key not in target:
+                    target[key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    target[key] = [a + b for a, b in zip(target[key], value)]
+                else:
+                    target[key] += value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: tuple[str, str] | None = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render_metrics() -> str:
+    """Every metric in the Prometheus text exposition format (0.0.4)."""
+    values = _merged_values()
+    lines = []
+    for name, metric in sorted(_metrics.items()):
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for key, value in sorted(values.get(name, {}).items()):
+            if metric.kind == "counter":
+                lines.append(f"{name}{_labels(metric.labelnames, key)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip((*metric.buckets, math.inf), value[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(metric.labelnames, key, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(metric.labelnames, key)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(metric.labelnames, key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics() -> None:
+    with _lock:
+        _values().clear()
+        _state["flushed_at"] = 0.0
+        _state["dirty"] = False
+
+
+def _booking_actions(obj: Appointment, is_new: bool) -> list[str]:
+    if is_new:
+        return ["created"]
+    state = inspect(obj)
+    actions = []
+    status = state.attrs.status.history
+    if status.added and status.added[0] in CANCELLED_STATUSES and not (
+        status.deleted and status.deleted[0] in CANCELLED_STATUSES
+    ):
+        actions.append("cancelled")
+    elif state.attrs.date.history.has_changes() or state.attrs.time.history.has_changes():
+        actions.append("rescheduled")
+    return actions
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_bookings(session, flush_context):
+    pending = session.info.setdefault("metrics_bookings", [])
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            pending.extend(_booking_actions(obj, True))
+    for obj in session.dirty:
+        if isinstance(obj, Appointment):
+            pending.extend(_booking_actions(obj, False))
+
+
+@event.listens_for(Session, "after_commit")
+def _count_bookings(session):
+    for action in session.info.pop("metrics_bookings", ()):
+        BOOKINGS.inc(action=action)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_bookings(session):
+    session.info.pop("metrics_bookings", None)
+
+
+def init_metrics(app) -> None:
+    """Time every request for ``http_request_duration_seconds``."""
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                endpoint=request.endpoint or "unmatched",
+                method=request.method,
+                status=response.status_code,
+            )
+        return response
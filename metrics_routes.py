@@ -0,0 +1,28 @@
+import hmac
+
+from flask import Blueprint, current_app, jsonify, request
+
+from health_routes import _details_authorized
+from metrics import CONTENT_TYPE, render_metrics
+
+
+metrics_bp = Blueprint("metrics_bp", __name__)
+
+
+def _bearer_authorized() -> bool:
+    configured_token = (current_app.config.get("HEALTHCHECK_TOKEN") or "").strip()
+    header = request.headers.get("Authorization") or ""
+    if not configured_token or not header.startswith("Bearer "):
+        return False
+    return hmac.compare_digest(configured_token, header[len("Bearer "):].strip())
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    # Prometheus sends the token as a bearer; curl users can keep X-Health-Token.
+    if not (_details_authorized() or _bearer_authorized()):
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    response = current_app.response_class(render_metrics(), mimetype="text/plain")
+    response.headers["Content-Type"] = CONTENT_TYPE
+    response.headers["Cache-Control"] = "no-store"
+    return response
@@ -0,0 +1,77 @@
+"""add slot reservations
+
+Revision ID: 7d3e5a9c2b41
+Revises: 6c8f4d2b1a10
+Create Date: 2026-10-18 09:00:00.000000
+"""
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7d3e5a9c2b41"
+down_revision = "6c8f4d2b1a10"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    reservation = op.create_table(
+        "slot_reservation",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("appointment_id", sa.Integer(), sa.ForeignKey("appointment.id"), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("time", sa.Time(), nullable=False),
+        sa.Column("seat", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("date", "time", "seat", name="uq_slot_reservation_seat"),
+    )
+    op.create_index(
+        "ix_slot_reservation_appointment_id",
+        "slot_reservation",
+        ["appointment_id"],
+        unique=False,
+    )
+
+    # Existing bookings get consecutive seats per slot, even when a slot was
+    # already overbooked, so the unique constraint holds from day one.
+    appointment = sa.table(
+        "appointment",
+        sa.column("id", sa.Integer()),
+        sa.column("date", sa.Date()),
+        sa.column("time", sa.Time()),
+        sa.column("status", sa.String()),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(appointment.c.id, appointment.c.date, appointment.c.time)
+        .where(appointment.c.status.in_(["pending", "confirmed"]))
+        .order_by(appointment.c.date, appointment.c.time, appointment.c.id)
+    ).fetchall()
+
+    seats = {}
+    payload = []
+    now = datetime.utcnow()
+    for appt_id, appt_date, appt_time in rows:
+        key = (appt_date, appt_time)
+        seat = seats.get(key, 0)
+        seats[key] = seat + 1
+        payload.append(
+            {
+                "appointment_id": appt_id,
+                "date": appt_date,
+                "time": appt_time,
+                "seat": seat,
+                "created_at": now,
+            }
+        )
+    if payload:
+        op.bulk_insert(reservation, payload)
+
+
+def downgrade():
+    op.drop_index("ix_slot_reservation_appointment_id", table_name="slot_reservation")
+    op.drop_table("slot_reservation")
@@ -0,0 +1,48 @@
+"""add schedule rules and exceptions
+
+Revision ID: 8e1f0b6a4c27
+Revises: 7d3e5a9c2b41
+Create Date: 2026-10-18 10:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8e1f0b6a4c27"
+down_revision = "7d3e5a9c2b41"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "schedule_rule",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("weekday", sa.Integer(), nullable=False),
+        sa.Column("start_time", sa.Time(), nullable=False),
+        sa.Column("end_time", sa.Time(), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_schedule_rule_weekday", "schedule_rule", ["weekday"], unique=False)
+
+    op.create_table(
+        "schedule_exception",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("kind", sa.String(length=10), nullable=False),
+        sa.Column("start_time", sa.Time(), nullable=True),
+        sa.Column("end_time", sa.Time(), nullable=True),
+        sa.Column("note", sa.String(length=150), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_schedule_exception_date", "schedule_exception", ["date"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_schedule_exception_date", table_name="schedule_exception")
+    op.drop_table("schedule_exception")
+    op.drop_index("ix_schedule_rule_weekday", table_name="schedule_rule")
+    op.drop_table("schedule_rule")
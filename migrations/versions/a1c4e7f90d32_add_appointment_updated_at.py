@@ -0,0 +1,25 @@
+"""add appointment updated_at
+
+Revision ID: a1c4e7f90d32
+Revises: 8e1f0b6a4c27
+Create Date: 2026-10-18 11:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a1c4e7f90d32"
+down_revision = "8e1f0b6a4c27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("appointment", sa.Column("updated_at", sa.DateTime(), nullable=True))
+    op.execute("UPDATE appointment SET updated_at = created_at")
+
+
+def downgrade():
+    op.drop_column("appointment", "updated_at")
@@ -0,0 +1,34 @@
+"""add google sync state
+
+Revision ID: a7e1c5d9f246
+Revises: f6d0a4b8c135
+Create Date: 2026-10-18 17:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a7e1c5d9f246"
+down_revision = "f6d0a4b8c135"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "google_sync_state",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(length=20), nullable=False),
+        sa.Column("local_id", sa.Integer(), nullable=False),
+        sa.Column("google_event_id", sa.String(length=128), nullable=True),
+        sa.Column("body_hash", sa.String(length=64), nullable=True),
+        sa.Column("etag", sa.String(length=128), nullable=True),
+        sa.Column("synced_at", sa.DateTime(), nullable=False),
+        sa.UniqueConstraint("kind", "local_id", name="uq_google_sync_state_kind_local"),
+    )
+
+
+def downgrade():
+    op.drop_table("google_sync_state")
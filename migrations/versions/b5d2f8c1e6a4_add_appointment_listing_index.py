@@ -0,0 +1,28 @@
+"""add appointment listing index
+
+Revision ID: b5d2f8c1e6a4
+Revises: a1c4e7f90d32
+Create Date: 2026-10-18 12:00:00.000000
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "b5d2f8c1e6a4"
+down_revision = "a1c4e7f90d32"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_appointment_date_time_id",
+        "appointment",
+        ["date", "time", "id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_appointment_date_time_id", table_name="appointment")
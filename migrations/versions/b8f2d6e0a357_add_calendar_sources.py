@@ -0,0 +1,51 @@
+"""add calendar sources
+
+Revision ID: b8f2d6e0a357
+Revises: a7e1c5d9f246
+Create Date: 2026-10-18 18:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b8f2d6e0a357"
+down_revision = "a7e1c5d9f246"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "calendar_source",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(length=120), nullable=False),
+        sa.Column("resource", sa.String(length=60), nullable=False),
+        sa.Column("calendar_id", sa.String(length=255), nullable=False),
+        sa.Column("credentials_file", sa.String(length=500), nullable=True),
+        sa.Column("sync_token", sa.Text(), nullable=True),
+        sa.Column("sync_checkpoint", sa.Text(), nullable=True),
+        sa.Column("last_sync_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("calendar_id", name="uq_calendar_source_calendar_id"),
+    )
+    op.create_index("ix_calendar_source_resource", "calendar_source", ["resource"], unique=False)
+
+    with op.batch_alter_table("calendar_event") as batch_op:
+        batch_op.add_column(sa.Column("source_id", sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            "fk_calendar_event_source_id", "calendar_source", ["source_id"], ["id"]
+        )
+        batch_op.create_index("ix_calendar_event_source_id", ["source_id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("calendar_event") as batch_op:
+        batch_op.drop_index("ix_calendar_event_source_id")
+        batch_op.drop_constraint("fk_calendar_event_source_id", type_="foreignkey")
+        batch_op.drop_column("source_id")
+    op.drop_index("ix_calendar_source_resource", table_name="calendar_source")
+    op.drop_table("calendar_source")
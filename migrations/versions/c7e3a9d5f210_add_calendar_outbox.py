@@ -0,0 +1,46 @@
+"""add calendar outbox
+
+Revision ID: c7e3a9d5f210
+Revises: b5d2f8c1e6a4
+Create Date: 2026-10-18 13:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c7e3a9d5f210"
+down_revision = "b5d2f8c1e6a4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "calendar_outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("appointment_id", sa.Integer(), sa.ForeignKey("appointment.id"), nullable=False),
+        sa.Column("action", sa.String(length=10), nullable=False),
+        sa.Column("status", sa.String(length=12), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("coalesced", sa.Integer(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=True),
+        sa.Column("locked_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_calendar_outbox_appointment_id", "calendar_outbox", ["appointment_id"], unique=False)
+    op.create_index(
+        "ix_calendar_outbox_status_next_attempt",
+        "calendar_outbox",
+        ["status", "next_attempt_at"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_calendar_outbox_status_next_attempt", table_name="calendar_outbox")
+    op.drop_index("ix_calendar_outbox_appointment_id", table_name="calendar_outbox")
+    op.drop_table("calendar_outbox")
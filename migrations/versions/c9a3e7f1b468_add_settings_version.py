@@ -0,0 +1,24 @@
+"""add settings version
+
+Revision ID: c9a3e7f1b468
+Revises: b8f2d6e0a357
+Create Date: 2026-10-18 19:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c9a3e7f1b468"
+down_revision = "b8f2d6e0a357"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("settings", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade():
+    op.drop_column("settings", "version")
@@ -0,0 +1,53 @@
+"""calendar event google id unique per source
+
+Revision ID: d0b4f8a2c579
+Revises: c9a3e7f1b468
+Create Date: 2026-10-18 21:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d0b4f8a2c579"
+down_revision = "c9a3e7f1b468"
+branch_labels = None
+depends_on = None
+
+# Without partial index support this would make google_event_id unique across
+# every calendar again, so other dialects only get the per-source index.
+PARTIAL_INDEX_DIALECTS = {"sqlite", "postgresql"}
+
+
+def _has_partial_indexes():
+    return op.get_bind().dialect.name in PARTIAL_INDEX_DIALECTS
+
+
+def upgrade():
+    op.drop_index("ix_calendar_event_google_event_id", table_name="calendar_event")
+    op.create_index("ix_calendar_event_google_event_id", "calendar_event", ["google_event_id"], unique=False)
+    op.create_index(
+        "uq_calendar_event_source_google_event_id",
+        "calendar_event",
+        ["source_id", "google_event_id"],
+        unique=True,
+    )
+    if not _has_partial_indexes():
+        return
+    op.create_index(
+        "uq_calendar_event_main_google_event_id",
+        "calendar_event",
+        ["google_event_id"],
+        unique=True,
+        sqlite_where=sa.text("source_id IS NULL"),
+        postgresql_where=sa.text("source_id IS NULL"),
+    )
+
+
+def downgrade():
+    if _has_partial_indexes():
+        op.drop_index("uq_calendar_event_main_google_event_id", table_name="calendar_event")
+    op.drop_index("uq_calendar_event_source_google_event_id", table_name="calendar_event")
+    op.drop_index("ix_calendar_event_google_event_id", table_name="calendar_event")
+    op.create_index("ix_calendar_event_google_event_id", "calendar_event", ["google_event_id"], unique=True)
@@ -0,0 +1,30 @@
+"""add scheduler lock
+
+Revision ID: d4b8e2f6a913
+Revises: c7e3a9d5f210
+Create Date: 2026-10-18 14:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d4b8e2f6a913"
+down_revision = "c7e3a9d5f210"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "scheduler_lock",
+        sa.Column("name", sa.String(length=64), primary_key=True),
+        sa.Column("owner", sa.String(length=120), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table("scheduler_lock")
@@ -0,0 +1,39 @@
+"""add appointment resource
+
+Revision ID: e1a5c9f3b7d2
+Revises: d0b4f8a2c579
+Create Date: 2026-10-19 09:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e1a5c9f3b7d2"
+down_revision = "d0b4f8a2c579"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("appointment", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("resource", sa.String(length=60), nullable=True))
+        batch_op.create_index("ix_appointment_resource", ["resource"], unique=False)
+
+    # Seats are counted per resource; existing bookings belong to the clinic ("").
+    with op.batch_alter_table("slot_reservation", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("resource", sa.String(length=60), nullable=False, server_default=""))
+        batch_op.drop_constraint("uq_slot_reservation_seat", type_="unique")
+        batch_op.create_unique_constraint("uq_slot_reservation_seat", ["date", "time", "resource", "seat"])
+
+
+def downgrade():
+    with op.batch_alter_table("slot_reservation", schema=None) as batch_op:
+        batch_op.drop_constraint("uq_slot_reservation_seat", type_="unique")
+        batch_op.create_unique_constraint("uq_slot_reservation_seat", ["date", "time", "seat"])
+        batch_op.drop_column("resource")
+
+    with op.batch_alter_table("appointment", schema=None) as batch_op:
+        batch_op.drop_index("ix_appointment_resource")
+        batch_op.drop_column("resource")
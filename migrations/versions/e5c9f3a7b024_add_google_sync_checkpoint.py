@@ -0,0 +1,24 @@
+"""add google sync checkpoint
+
+Revision ID: e5c9f3a7b024
+Revises: d4b8e2f6a913
+Create Date: 2026-10-18 15:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e5c9f3a7b024"
+down_revision = "d4b8e2f6a913"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("settings", sa.Column("google_sync_checkpoint", sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("settings", "google_sync_checkpoint")
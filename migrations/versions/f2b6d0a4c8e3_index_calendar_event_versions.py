@@ -0,0 +1,27 @@
+"""index calendar event version columns
+
+Revision ID: f2b6d0a4c8e3
+Revises: e1a5c9f3b7d2
+Create Date: 2026-10-19 10:00:00.000000
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "f2b6d0a4c8e3"
+down_revision = "e1a5c9f3b7d2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("calendar_event", schema=None) as batch_op:
+        batch_op.create_index("ix_calendar_event_updated_at", ["updated_at"], unique=False)
+        batch_op.create_index("ix_calendar_event_start_at_end_at", ["start_at", "end_at"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("calendar_event", schema=None) as batch_op:
+        batch_op.drop_index("ix_calendar_event_start_at_end_at")
+        batch_op.drop_index("ix_calendar_event_updated_at")
@@ -0,0 +1,39 @@
+"""add calendar watch channels
+
+Revision ID: f6d0a4b8c135
+Revises: e5c9f3a7b024
+Create Date: 2026-10-18 16:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f6d0a4b8c135"
+down_revision = "e5c9f3a7b024"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "calendar_watch_channel",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("channel_id", sa.String(length=64), nullable=False),
+        sa.Column("token", sa.String(length=128), nullable=False),
+        sa.Column("resource_id", sa.String(length=255), nullable=True),
+        sa.Column("calendar_id", sa.String(length=255), nullable=False),
+        sa.Column("address", sa.String(length=500), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("stopped_at", sa.DateTime(), nullable=True),
+        sa.Column("last_message_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("channel_id", name="uq_calendar_watch_channel_channel_id"),
+    )
+    op.add_column("settings", sa.Column("google_sync_requested_at", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("settings", "google_sync_requested_at")
+    op.drop_table("calendar_watch_channel")
@@ -50,6 +50,10 @@ class Event(db.Model):
         ).order_by(cls.start_date.desc()).all()
 
 class Appointment(db.Model):
+    __table_args__ = (
+        db.Index("ix_appointment_date_time_id", "date", "time", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100), nullable=True)
@@ -60,10 +64,12 @@ class Appointment(db.Model):
     status = db.Column(db.String(20), default='pending')
     manage_token = db.Column(db.String(64), unique=True, index=True)
     google_event_id = db.Column(db.String(128), index=True)
+    resource = db.Column(db.String(60), index=True)  # profissional ou sala (CalendarSource.resource); nulo = agenda da clinica
     cancelled_at = db.Column(db.DateTime)
     rescheduled_at = db.Column(db.DateTime)
     reminder_sent_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def ensure_manage_token(self):
         if not self.manage_token:
@@ -73,8 +79,162 @@ class Appointment(db.Model):
         return f'<Appointment {self.name} - {self.date} {self.time}>'
 
 
+class SlotReservation(db.Model):
+    __tablename__ = "slot_reservation"
+    __table_args__ = (
+        db.UniqueConstraint("date", "time", "resource", "seat", name="uq_slot_reservation_seat"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    appointment_id = db.Column(db.Integer, db.ForeignKey("appointment.id"), nullable=False, index=True)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    # "" for the clinic's own agenda, so the unique constraint also covers it
+    resource = db.Column(db.String(60), nullable=False, default="", server_default="")
+    seat = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    appointment = db.relationship(
+        "Appointment",
+        backref=db.backref("reservation", uselist=False, cascade="all, delete-orphan"),
+    )
+
+    def __repr__(self):
+        return f"<SlotReservation {self.date} {self.time} #{self.seat}>"
+
+
+class ScheduleRule(db.Model):
+    __tablename__ = "schedule_rule"
+
+    id = db.Column(db.Integer, primary_key=True)
+    weekday = db.Column(db.Integer, nullable=False, index=True)  # 0 = segunda ... 6 = domingo
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ScheduleRule {self.weekday} {self.start_time}-{self.end_time}>"
+
+
+class ScheduleException(db.Model):
+    __tablename__ = "schedule_exception"
+
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False, index=True)
+    kind = db.Column(db.String(10), nullable=False, default="closed")  # "closed" ou "open"
+    start_time = db.Column(db.Time)
+    end_time = db.Column(db.Time)
+    note = db.Column(db.String(150))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ScheduleException {self.date} {self.kind}>"
+
+
+class CalendarOutbox(db.Model):
+    """Pending Google Calendar work for an appointment, drained by a worker."""
+
+    __tablename__ = "calendar_outbox"
+    __table_args__ = (
+        db.Index("ix_calendar_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    appointment_id = db.Column(db.Integer, db.ForeignKey("appointment.id"), nullable=False, index=True)
+    action = db.Column(db.String(10), nullable=False, default="upsert")  # "upsert" ou "cancel"
+    status = db.Column(db.String(12), nullable=False, default="pending")  # pending, processing, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    coalesced = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    appointment = db.relationship("Appointment")
+
+    def __repr__(self):
+        return f"<CalendarOutbox {self.appointment_id} {self.action} {self.status}>"
+
+
+class SchedulerLock(db.Model):
+    """Lease that lets a single process run a periodic job across workers."""
+
+    __tablename__ = "scheduler_lock"
+
+    name = db.Column(db.String(64), primary_key=True)
+    owner = db.Column(db.String(120), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SchedulerLock {self.name} {self.owner}>"
+
+
+class GoogleSyncState(db.Model):
+    """Last state of a local row known to match its Google Calendar event.
+
+    ``body_hash`` is the hash of the last body we pushed and ``etag`` the
+    event's etag as last seen, so unchanged bodies are not sent again and
+    updates carry ``If-Match``. ``synced_at`` is compared with the row's
+    ``updated_at`` to spot rows edited since.
+    """
+
+    __tablename__ = "google_sync_state"
+    __table_args__ = (
+        db.UniqueConstraint("kind", "local_id", name="uq_google_sync_state_kind_local"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # "appointment" ou "calendar_event"
+    local_id = db.Column(db.Integer, nullable=False)
+    google_event_id = db.Column(db.String(128))
+    body_hash = db.Column(db.String(64))
+    etag = db.Column(db.String(128))
+    synced_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<GoogleSyncState {self.kind} {self.local_id}>"
+
+
+class CalendarWatchChannel(db.Model):
+    """Google Calendar ``events.watch`` channel delivering change notifications."""
+
+    __tablename__ = "calendar_watch_channel"
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel_id = db.Column(db.String(64), unique=True, nullable=False)
+    token = db.Column(db.String(128), nullable=False)
+    resource_id = db.Column(db.String(255))
+    calendar_id = db.Column(db.String(255), nullable=False)
+    address = db.Column(db.String(500), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    stopped_at = db.Column(db.DateTime)
+    last_message_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<CalendarWatchChannel {self.channel_id}>"
+
+
 class CalendarEvent(db.Model):
     __tablename__ = "calendar_event"
+    __table_args__ = (
+        # Google reuses an event's id for its copy in every invited calendar, so
+        # the id is unique per calendar: per source, and once in the main one.
+        # MySQL has no partial indexes; there the sync's id lookup is the guard.
+        db.Index("uq_calendar_event_source_google_event_id", "source_id", "google_event_id", unique=True),
+        db.Index(
+            "uq_calendar_event_main_google_event_id",
+            "google_event_id",
+            unique=True,
+            sqlite_where=db.text("source_id IS NULL"),
+            postgresql_where=db.text("source_id IS NULL"),
+        ).ddl_if(dialect=("sqlite", "postgresql")),
+        # Availability windows and their version stamps filter on these.
+        db.Index("ix_calendar_event_start_at_end_at", "start_at", "end_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=False)
@@ -84,14 +244,38 @@ class CalendarEvent(db.Model):
     all_day = db.Column(db.Boolean, default=False)
     status = db.Column(db.String(20), default="active")
     source = db.Column(db.String(20), default="system")
-    google_event_id = db.Column(db.String(128), unique=True, index=True)
+    google_event_id = db.Column(db.String(128), index=True)
+    source_id = db.Column(db.Integer, db.ForeignKey("calendar_source.id"), index=True)  # agenda de origem; nulo = agenda principal
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    calendar_source = db.relationship("CalendarSource")
 
     def __repr__(self):
         return f"<CalendarEvent {self.title} - {self.start_at}>"
 
 
+class CalendarSource(db.Model):
+    """Extra Google calendar (a professional or a room) imported as busy time for ``resource``."""
+
+    __tablename__ = "calendar_source"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    resource = db.Column(db.String(60), nullable=False, index=True)
+    calendar_id = db.Column(db.String(255), unique=True, nullable=False)
+    credentials_file = db.Column(db.String(500))  # nulo = mesmas credenciais da agenda principal
+    sync_token = db.Column(db.Text)
+    sync_checkpoint = db.Column(db.Text)
+    last_sync_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<CalendarSource {self.resource} {self.calendar_id}>"
+
+
 class ContactMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -164,6 +348,9 @@ class Settings(db.Model):
     google_sync_enabled = db.Column(db.Boolean, default=False)
     google_sync_token = db.Column(db.Text)
     google_sync_last_at = db.Column(db.DateTime)
+    google_sync_checkpoint = db.Column(db.Text)  # JSON com a consulta e o pageToken da sync em andamento
+    google_sync_requested_at = db.Column(db.DateTime)  # notificacao do Google aguardando sync
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # incrementado quando o conteudo muda (settings_cache)
 
     
     def __repr__(self):
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from functools import wraps
+
+from flask import current_app, has_app_context, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from availability_cache import MemoryBackend, RedisBackend, redis
+from http_cache import is_not_modified, not_modified, with_etag
+from models import Course, Event, GalleryItem, SiteSection, SiteSectionItem
+from settings_cache import get_settings
+
+DEFAULT_PAGE_CACHE_TTL = 300
+DEFAULT_PAGE_CACHE_MAX_ENTRIES = 512
+DEFAULT_SHARED_MAX_AGE = 60
+KEY_PREFIX = "page:"
+# A purged tag must outlive every page cached before the purge.
+TAG_TTL_FACTOR = 10
+
+# The Settings fields the public templates render. Only they take part in the
+# page key, so saving mail or Google options keeps the cached pages.
+PAGE_SETTINGS_COLUMNS = (
+    "site_title",
+    "contact_email",
+    "contact_phone",
+    "address",
+    "about_text",
+    "academic_background",
+    "professional_experience",
+    "about_image",
+    "social_facebook",
+    "social_instagram",
+    "social_youtube",
+)
+
+MODEL_TAGS = {
+    SiteSection: "sections",
+    SiteSectionItem: "sections",
+    Event: "events",
+    Course: "courses",
+    GalleryItem: "gallery",
+}
+
+
+def _int_env(name: str, default: int, minimum: int = 0) -> int:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return max(minimum, int(value))
+    except ValueError:
+        return default
+
+
+def _build_backend():
+    kind = (os.getenv("PAGE_CACHE_BACKEND") or "memory").strip().lower()
+    if kind in ("none", "off", "0"):
+        return None
+    if kind == "redis":
+        url = (os.getenv("PAGE_CACHE_URL") or os.getenv("AVAIL_CACHE_URL") or "").strip()
+        if redis is not None and url:
+            return RedisBackend(redis.Redis.from_url(url), prefix=KEY_PREFIX)
+        if has_app_context():
+            current_app.logger.warning("PAGE_CACHE_BACKEND=redis sem PAGE_CACHE_URL ou pacote redis; usando memoria.")
+    return MemoryBackend(_int_env("PAGE_CACHE_MAX_ENTRIES", DEFAULT_PAGE_CACHE_MAX_ENTRIES, minimum=1))
+
+
+def get_page_backend():
+    if not has_app_context():
+        return None
+    extensions = current_app.extensions
+    if "page_cache" not in extensions:
+        extensions["page_cache"] = _build_backend()
+    return extensions["page_cache"]
+
+
+def _tag_key(tag: str) -> str:
+    return f"tag:{tag}"
+
+
+def purge_tags(tags) -> None:
+    """Make every cached page that depends on one of ``tags`` unreachable.
+
+    Each tag has a generation token that is part of the page keys, so a
+    purge is a single write per tag and reaches every worker sharing the
+    backend. Old entries simply age out.
+    """
+    backend = get_page_backend()
+    tags = sorted(set(tags))
+    if backend is None or not tags:
+        return
+    ttl = _int_env("PAGE_CACHE_TTL", DEFAULT_PAGE_CACHE_TTL, minimum=1) * TAG_TTL_FACTOR
+    token = str(time.time_ns())
+    backend.set_many({_tag_key(tag): token for tag in tags}, ttl)
+
+
+def _cacheable_request() -> bool:
+    # Pages showing the admin menu or a flash message are per visitor.
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if current_user.is_authenticated:
+        return False
+    return not session.get("_flashes")
+
+
+def _settings_fingerprint() -> str | None:
+    settings = get_settings()
+    if settings is None:
+        return None
+    values = tuple(getattr(settings, name) for name in PAGE_SETTINGS_COLUMNS)
+    return hashlib.sha1(repr(values).encode()).hexdigest()[:16]
+
+
+def _page_key(backend, tags: tuple[str, ...]) -> str:
+    language = (request.accept_languages.best or "").split("-")[0].lower()
+    generations = backend.get_many([_tag_key(tag) for tag in tags]) if tags else []
+    parts = (
+        request.endpoint,
+        sorted(request.view_args.items()) if request.view_args else [],
+        sorted(request.args.items(multi=True)),
+        language,
+        _settings_fingerprint(),
+        [value or "0" for value in generations],
+    )
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _public(response, etag: str):
+    max_age = _int_env("PAGE_CACHE_SHARED_MAX_AGE", DEFAULT_SHARED_MAX_AGE)
+    response = with_etag(response, etag, f"public, max-age=0, s-maxage={max_age}")
+    response.vary.add("Accept-Language")
+    response.vary.add("Cookie")
+    return response
+
+
+def cached_page(*tags: str):
+    """Serve the view's rendered HTML from the page cache.
+
+    The key covers endpoint, arguments, language, the settings version and
+    the generation of each tag; ``purge_tags`` (run after commits touching
+    ``MODEL_TAGS``) moves a generation so the page is rendered again.
+    Anonymous responses carry an ETag and a short shared ``s-maxage`` so a
+    CDN or reverse proxy can keep them too.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            backend = get_page_backend()
+            if backend is None or not _cacheable_request():
+                response = make_response(view(*args, **kwargs))
+                response.headers.setdefault("Cache-Control", "private, no-cache")
+                return response
+
+            key = _page_key(backend, tags)
+            cached = backend.get_many([key])[0]
+            if cached is not None:
+                entry = json.loads(cached)
+                if is_not_modified(entry["etag"]):
+                    return _public(not_modified(entry["etag"]), entry["etag"])
+                return _public(current_app.response_class(entry["body"], mimetype="text/html"), entry["etag"])
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.mimetype != "text/html":
+                return response
+            body = response.get_data(as_text=True)
+            etag = hashlib.sha1(body.encode()).hexdigest()[:32]
+            backend.set_many(
+                {key: json.dumps({"etag": etag, "body": body})},
+                _int_env("PAGE_CACHE_TTL", DEFAULT_PAGE_CACHE_TTL, minimum=1),
+            )
+            if is_not_modified(etag):
+                return _public(not_modified(etag), etag)
+            return _public(response, etag)
+
+        return wrapper
+
+    return decorator
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_tags(session, flush_context):
+    touched = session.info.setdefault("page_cache_tags", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tag = MODEL_TAGS.get(type(obj))
+        if tag:
+            touched.add(tag)
+
+
+@event.listens_for(Session, "after_commit")
+def _purge_after_commit(session):
+    tags = session.info.pop("page_cache_tags", None)
+    if tags and has_app_context():
+        purge_tags(tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_tags(session):
+    session.info.pop("page_cache_tags", None)
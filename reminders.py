@@ -8,6 +8,7 @@ from flask import current_app
 from flask_mail import Message
 
 from extensions import db
+from metrics import send_mail
 from models import Appointment, Settings
 
 
@@ -111,7 +112,7 @@ def register_reminder_commands(app):
 
             try:
                 msg = Message(subject="Lembrete de consulta", recipients=[appt.email], body=body)
-                mail.send(msg)
+                send_mail(mail, msg, "reminder")
                 appt.reminder_sent_at = datetime.utcnow()
                 sent += 1
             except Exception as exc:
@@ -20,36 +20,31 @@ from forms import (
     CancelAppointmentForm,
 )
 from appointments_api import create_pending_appointment
-from availability_service import get_slot_config, is_slot_available
-from google_calendar import upsert_appointment_event, cancel_appointment_event
+from availability_cache import invalidate_availability
+from availability_service import commit_with_reserved_seat, get_slot_config, is_valid_slot, release_seat, set_reservation
+from calendar_outbox import enqueue_appointment_sync
 from models import (
     db,
     Event,
     Appointment,
-    Settings,
     Course,
     ContactMessage,
-    SiteSection,
 )
+from metrics import send_mail
+from page_cache import cached_page
+from settings_cache import get_settings
+from site_sections import load_page_sections
 
 # Create a Blueprint for the main routes
 main_bp = Blueprint("main_bp", __name__)
 
 
-def _get_sections_for_page(page: str):
-    sections = (
-        SiteSection.query.filter_by(page=page, is_active=True)
-        .order_by(SiteSection.sort_order.asc(), SiteSection.id.asc())
-        .all()
-    )
-    return {section.slug: section for section in sections}
-
-
 @main_bp.route("/")
+@cached_page("sections", "events")
 def index():
-    settings = Settings.query.first()
+    settings = get_settings()
     upcoming_events = Event.get_upcoming_events()[:3]  # Limit to 3 events
-    sections = _get_sections_for_page("index")
+    sections = load_page_sections("index")
     return render_template(
         "index.html",
         settings=settings,
@@ -59,16 +54,17 @@ def index():
 
 
 @main_bp.route("/about")
+@cached_page("sections")
 def about():
-    settings = Settings.query.first()
-    sections = _get_sections_for_page("about")
+    settings = get_settings()
+    sections = load_page_sections("about")
     return render_template("about.html", settings=settings, sections=sections)
 
 
 @main_bp.route("/contact", methods=["GET", "POST"])
 def contact():
     form = ContactForm()
-    settings = Settings.query.first()
+    settings = get_settings()
 
     if form.validate_on_submit():
         message = ContactMessage(
@@ -98,7 +94,7 @@ def contact():
 @main_bp.route("/appointment", methods=["GET", "POST"])
 def appointment():
     form = AppointmentForm()
-    settings = Settings.query.first()
+    settings = get_settings()
     slot_config = get_slot_config()
 
     if form.validate_on_submit():
@@ -130,7 +126,7 @@ def appointment():
 
 @main_bp.route("/appointment/manage/<token>", methods=["GET", "POST"])
 def appointment_manage(token):
-    settings = Settings.query.first()
+    settings = get_settings()
     slot_config = get_slot_config()
     appointment_item = Appointment.query.filter_by(manage_token=token).first_or_404()
     reschedule_form = RescheduleForm()
@@ -142,8 +138,10 @@ def appointment_manage(token):
             if appointment_item.status not in ("cancelled", "canceled"):
                 appointment_item.status = "cancelled"
                 appointment_item.cancelled_at = datetime.utcnow()
+                release_seat(appointment_item)
+                enqueue_appointment_sync(appointment_item, "cancel")
                 db.session.commit()
-                cancel_appointment_event(appointment_item)
+                invalidate_availability([appointment_item.date])
                 flash("Agendamento cancelado com sucesso.", "success")
             else:
                 flash("Agendamento ja esta cancelado.", "info")
@@ -156,18 +154,26 @@ def appointment_manage(token):
                 flash("Agendamento cancelado nao pode ser reagendado.", "warning")
             elif datetime.combine(new_day, new_time) < datetime.now():
                 reschedule_form.time.errors.append("Data e horario nao podem ser no passado.")
-            elif not is_slot_available(new_day, new_time, exclude_id=appointment_item.id):
+            elif not is_valid_slot(new_day, new_time, appointment_item.resource):
                 reschedule_form.time.errors.append("Horario indisponivel.")
             else:
-                appointment_item.date = new_day
-                appointment_item.time = new_time
-                appointment_item.status = "pending"
-                appointment_item.rescheduled_at = datetime.utcnow()
-                appointment_item.reminder_sent_at = None
-                db.session.commit()
-                upsert_appointment_event(appointment_item)
-                flash("Agendamento reagendado com sucesso.", "success")
-                return redirect(url_for("main_bp.appointment_manage", token=token))
+                old_day = appointment_item.date
+
+                def _stage(seat: int):
+                    appointment_item.date = new_day
+                    appointment_item.time = new_time
+                    appointment_item.status = "pending"
+                    appointment_item.rescheduled_at = datetime.utcnow()
+                    appointment_item.reminder_sent_at = None
+                    set_reservation(appointment_item, new_day, new_time, seat)
+                    enqueue_appointment_sync(appointment_item)
+
+                if commit_with_reserved_seat(_stage) is None:
+                    reschedule_form.time.errors.append("Horario indisponivel.")
+                else:
+                    invalidate_availability([old_day, new_day])
+                    flash("Agendamento reagendado com sucesso.", "success")
+                    return redirect(url_for("main_bp.appointment_manage", token=token))
 
     return render_template(
         "appointment_manage.html",
@@ -180,8 +186,9 @@ def appointment_manage(token):
 
 
 @main_bp.route("/events")
+@cached_page("events")
 def events():
-    settings = Settings.query.first()
+    settings = get_settings()
     upcoming_events = Event.get_upcoming_events()
     past_events = Event.get_past_events()
     return render_template(
@@ -193,9 +200,10 @@ def events():
 
 
 @main_bp.route("/courses", endpoint="courses")
+@cached_page("courses")
 def list_courses():
     """List active courses ordered by creation date."""
-    settings = Settings.query.first()
+    settings = get_settings()
     courses = Course.query.filter_by(is_active=True).order_by(Course.created_at).all()
     return render_template("public_courses.html", courses=courses, settings=settings)
 
@@ -204,7 +212,7 @@ def list_courses():
 @main_bp.route("/active-courses")
 def active_courses():
     """List upcoming courses using Course helper methods."""
-    settings = Settings.query.first()
+    settings = get_settings()
     courses = Course.get_upcoming_courses()
     return render_template("public_courses.html", courses=courses, settings=settings)
 
@@ -219,7 +227,7 @@ def cursos():
 def course_page(id):
     """Show course details with a link to purchase."""
     course = Course.query.get_or_404(id)
-    settings = Settings.query.first()
+    settings = get_settings()
     return render_template(
         "public_course_detail.html", course=course, settings=settings
     )
@@ -292,7 +300,7 @@ def hotmart_webhook():
         try:
             body = f'Você agora tem acesso ao curso {course.title}. Link: {course.access_url or ""}'
             msg = Message(subject="Acesso ao curso", recipients=[email], body=body)
-            mail.send(msg)
+            send_mail(mail, msg, "course_access")
         except Exception:
             current_app.logger.exception(
                 "Failed to send email for transaction %s", txn_id
@@ -303,9 +311,10 @@ def hotmart_webhook():
 
 # Public catalog of courses
 @main_bp.route("/catalogo-cursos")
+@cached_page("courses")
 def course_catalog():
     """Display all active courses for visitors."""
-    settings = Settings.query.first()
+    settings = get_settings()
     courses = Course.query.filter_by(is_active=True).all()
     return render_template("course_catalog.html", courses=courses, settings=settings)
 
@@ -315,16 +324,17 @@ def course_catalog():
 def course_catalog_detail(course_id):
     """Show public details for a course."""
     course = Course.query.get_or_404(course_id)
-    settings = Settings.query.first()
+    settings = get_settings()
     return render_template(
         "course_catalog_detail.html", course=course, settings=settings
     )
 
 
 @main_bp.route("/galeria")
+@cached_page("gallery")
 def gallery():
     from models import GalleryItem  # (após criarmos a model)
 
     items = GalleryItem.query.order_by(GalleryItem.created_at.desc()).all()
-    settings = Settings.query.first()
+    settings = get_settings()
     return render_template("gallery.html", items=items, settings=settings)
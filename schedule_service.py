@@ -0,0 +1,404 @@
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import date as dt_date, datetime, time as dt_time, timedelta
+from typing import Iterable, NamedTuple
+
+from flask import current_app, g, has_app_context, has_request_context
+from sqlalchemy import event, func, or_, select
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import CalendarEvent, CalendarSource, ScheduleException, ScheduleRule
+
+
+def _to_minutes(value: dt_time) -> int:
+    return value.hour * 60 + value.minute
+
+
+class IntervalSet:
+    """Half-open [start, end) minute intervals, merged and sorted.
+
+    Because overlapping input is merged at build time, the stored intervals
+    are disjoint and a bisect over their starts answers stabbing and overlap
+    queries in O(log n), the same bound an interval tree gives.
+    """
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, intervals: Iterable[tuple[int, int]] = ()):
+        merged: list[list[int]] = []
+        for start, end in sorted(i for i in intervals if i[1] > i[0]):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.starts = tuple(start for start, _ in merged)
+        self.ends = tuple(end for _, end in merged)
+
+    def __bool__(self) -> bool:
+        return bool(self.starts)
+
+    def __iter__(self):
+        return iter(zip(self.starts, self.ends))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, IntervalSet) and self.starts == other.starts and self.ends == other.ends
+
+    def __repr__(self) -> str:
+        return f"IntervalSet({list(self)})"
+
+    def as_tuple(self) -> tuple[tuple[int, int], ...]:
+        return tuple(self)
+
+    def overlaps(self, start: int, end: int) -> bool:
+        idx = bisect_right(self.starts, start) - 1
+        if idx >= 0 and self.ends[idx] > start:
+            return True
+        nxt = idx + 1
+        return nxt < len(self.starts) and self.starts[nxt] < end
+
+    def contains(self, start: int, end: int) -> bool:
+        idx = bisect_right(self.starts, start) - 1
+        return idx >= 0 and self.ends[idx] >= end
+
+
+class DaySchedule:
+    """Open hours and busy periods of one day, in minutes from midnight."""
+
+    __slots__ = ("day", "open", "busy")
+
+    def __init__(self, day: dt_date, open_intervals: IntervalSet, busy: IntervalSet):
+        self.day = day
+        self.open = open_intervals
+        self.busy = busy
+
+    @property
+    def is_closed(self) -> bool:
+        return not self.open
+
+    def is_busy(self, start: int, end: int) -> bool:
+        return self.busy.overlaps(start, end)
+
+
+def _rules_by_weekday() -> dict[int, list[tuple[int, int]]] | None:
+    rules = ScheduleRule.query.filter(ScheduleRule.is_active.is_(True)).all()
+    if not rules:
+        return None
+    by_weekday: dict[int, list[tuple[int, int]]] = {}
+    for rule in rules:
+        by_weekday.setdefault(rule.weekday, []).append(
+            (_to_minutes(rule.start_time), _to_minutes(rule.end_time))
+        )
+    return by_weekday
+
+
+class DayException(NamedTuple):
+    """A date's exceptions, compiled: replacement hours, blocked periods, closed all day."""
+
+    opened: tuple[tuple[int, int], ...]
+    blocked: tuple[tuple[int, int], ...]
+    closed: bool
+
+
+def _exceptions_by_day(start_day: dt_date, end_day: dt_date) -> dict[dt_date, DayException]:
+    grouped: dict[dt_date, list[ScheduleException]] = {}
+    window = (ScheduleException.date >= start_day, ScheduleException.date <= end_day)
+    for item in ScheduleException.query.filter(*window).all():
+        grouped.setdefault(item.date, []).append(item)
+    compiled = {}
+    for day, items in grouped.items():
+        timed = [(item, (_to_minutes(item.start_time), _to_minutes(item.end_time)))
+                 for item in items if item.start_time and item.end_time]
+        compiled[day] = DayException(
+            opened=tuple(span for item, span in timed if item.kind == "open"),
+            blocked=tuple(span for item, span in timed if item.kind == "closed"),
+            closed=any(item.kind == "closed" and not (item.start_time and item.end_time) for item in items),
+        )
+    return compiled
+
+
+def _table_versions() -> dict[str, tuple]:
+    """Versions of the schedule tables and of the calendar events, in one statement.
+
+    Count, latest id and latest change time of each table, so every write
+    moves them, in every worker. Inside a request they are read once;
+    flushing a rule, an exception or a calendar event drops that memo.
+    """
+    if has_request_context() and "schedule_versions" in g:
+        return g.schedule_versions
+
+    def _aggregates(model, changed_at):
+        return [
+            select(func.count(model.id)).scalar_subquery(),
+            select(func.max(model.id)).scalar_subquery(),
+            select(func.max(changed_at)).scalar_subquery(),
+        ]
+
+    row = db.session.execute(select(
+        *_aggregates(ScheduleRule, ScheduleRule.created_at),
+        *_aggregates(ScheduleException, ScheduleException.created_at),
+        *_aggregates(CalendarEvent, CalendarEvent.updated_at),
+    )).one()
+    values = tuple(str(value) for value in row)
+    versions = {"schedule": values[:6], "busy": values[6:]}
+    if has_request_context():
+        g.schedule_versions = versions
+    return versions
+
+
+def schedule_version() -> tuple:
+    """Version of the weekly rules and date exceptions."""
+    return _table_versions()["schedule"]
+
+
+def busy_version() -> tuple:
+    """Version of the calendar events behind the ``BusyIndex``."""
+    return _table_versions()["busy"]
+
+
+class CompiledSchedule:
+    """Weekly rules and date exceptions of one ``schedule_version``, shared by request threads.
+
+    Rules are compiled up front; exceptions are loaded per window, only for
+    the days not seen yet, and kept (``None`` for days without any) until
+    the version moves.
+    """
+
+    __slots__ = ("version", "rules", "exceptions", "_lock")
+
+    def __init__(self, version: tuple, rules):
+        self.version = version
+        self.rules = rules
+        self.exceptions: dict[dt_date, DayException | None] = {}
+        self._lock = threading.Lock()
+
+    def exceptions_for(self, start_day: dt_date, end_day: dt_date) -> dict[dt_date, DayException | None]:
+        wanted = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+        with self._lock:
+            missing = [day for day in wanted if day not in self.exceptions]
+            if missing:
+                if len(self.exceptions) + len(missing) > BUSY_INDEX_MAX_DAYS:
+                    self.exceptions.clear()
+                loaded = _exceptions_by_day(missing[0], missing[-1])
+                for day in missing:
+                    self.exceptions[day] = loaded.get(day)
+            return {day: self.exceptions[day] for day in wanted}
+
+
+_compile_lock = threading.Lock()
+
+
+def get_compiled_schedule(version: tuple | None = None) -> CompiledSchedule:
+    """The process's compiled rules and exceptions, rebuilt only when the version moves."""
+    version = version or schedule_version()
+    if not has_app_context():
+        return CompiledSchedule(version, _rules_by_weekday())
+    compiled = current_app.extensions.get("schedule_rules")
+    if compiled is None or compiled.version != version:
+        with _compile_lock:
+            compiled = current_app.extensions.get("schedule_rules")
+            if compiled is None or compiled.version != version:
+                compiled = CompiledSchedule(version, _rules_by_weekday())
+                current_app.extensions["schedule_rules"] = compiled
+    return compiled
+
+
+@event.listens_for(Session, "after_flush")
+def _forget_table_versions(session, flush_context):
+    if not has_request_context() or "schedule_versions" not in g:
+        return
+    changed = (*session.new, *session.dirty, *session.deleted)
+    if any(isinstance(obj, (ScheduleRule, ScheduleException, CalendarEvent)) for obj in changed):
+        g.pop("schedule_versions", None)
+
+
+def init_schedule_cache(app) -> None:
+    @app.teardown_request
+    def _forget_request_versions(exc=None):
+        g.pop("schedule_versions", None)
+
+
+def _clip_to_day(day: dt_date, start_at: datetime, end_at: datetime) -> tuple[int, int] | None:
+    day_start = datetime.combine(day, dt_time.min)
+    day_end = day_start + timedelta(days=1)
+    start = max(start_at, day_start)
+    end = min(end_at, day_end)
+    if end <= start:
+        return None
+    return (
+        int((start - day_start).total_seconds() // 60),
+        math.ceil((end - day_start).total_seconds() / 60),
+    )
+
+
+def load_busy_events(start_day: dt_date, end_day: dt_date, resource: str | None = None) -> list[CalendarEvent]:
+    """Active calendar events of ``resource`` overlapping the window.
+
+    Local blocks and the main Google calendar block every resource; the
+    events of a ``CalendarSource`` only block its own resource. ``None`` is
+    the clinic's own agenda, which no source calendar blocks.
+    """
+    window_start = datetime.combine(start_day, dt_time.min)
+    window_end = datetime.combine(end_day + timedelta(days=1), dt_time.min)
+    owned = CalendarEvent.source_id.is_(None)
+    if resource is not None:
+        owned = or_(owned, CalendarEvent.source_id.in_(
+            select(CalendarSource.id).where(CalendarSource.resource == resource)
+        ))
+    return (
+        CalendarEvent.query
+        .filter(CalendarEvent.start_at < window_end, CalendarEvent.end_at > window_start)
+        .filter(CalendarEvent.status != "cancelled")
+        .filter(owned)
+        .all()
+    )
+
+
+def known_resources() -> list[str]:
+    """Resources (professionals, rooms) with an active ``CalendarSource``."""
+    query = (
+        select(CalendarSource.resource)
+        .where(CalendarSource.is_active.is_(True))
+        .distinct()
+        .order_by(CalendarSource.resource)
+    )
+    return list(db.session.scalars(query))
+
+
+def busy_intervals_by_day(
+    events: Iterable[CalendarEvent], start_day: dt_date, end_day: dt_date
+) -> dict[dt_date, list[tuple[int, int]]]:
+    by_day: dict[dt_date, list[tuple[int, int]]] = {}
+    for event in events:
+        start_at = event.start_at
+        end_at = event.end_at or event.start_at
+        if event.all_day:
+            start_at = datetime.combine(start_at.date(), dt_time.min)
+            end_at = max(end_at, start_at + timedelta(days=1))
+        day = max(start_at.date(), start_day)
+        last = min((end_at - timedelta(microseconds=1)).date(), end_day)
+        while day <= last:
+            clipped = _clip_to_day(day, start_at, end_at)
+            if clipped:
+                by_day.setdefault(day, []).append(clipped)
+            day += timedelta(days=1)
+    return by_day
+
+
+DEFAULT_BUSY_CACHE_SECONDS = 300
+BUSY_INDEX_MAX_DAYS = 400
+
+
+def _busy_cache_seconds() -> int:
+    value = os.getenv("AVAIL_BUSY_CACHE_SECONDS")
+    if not value:
+        return DEFAULT_BUSY_CACHE_SECONDS
+    try:
+        return max(0, int(value))
+    except ValueError:
+        return DEFAULT_BUSY_CACHE_SECONDS
+
+
+class BusyIndex:
+    """Per-day ``IntervalSet`` of calendar busy time, filled on demand.
+
+    Days missing from the index are loaded together with a single range
+    query. The index remembers the ``busy_version`` it was filled under and
+    is replaced as soon as the calendar events change, in any worker, so
+    what it serves (and what gets written to the shared availability cache)
+    is never older than the database. ``ttl`` only bounds its age. The index is shared by request threads, so filling and
+    clearing ``days`` happen under a lock. Each resource has its own index.
+    """
+
+    def __init__(self, ttl: int, version: tuple | None = None, resource: str | None = None):
+        self.ttl = ttl
+        self.version = version
+        self.resource = resource
+        self.created = time.monotonic()
+        self.days: dict[dt_date, IntervalSet] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() - self.created >= self.ttl
+
+    def get(self, start_day: dt_date, end_day: dt_date) -> dict[dt_date, IntervalSet]:
+        wanted = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+        with self._lock:
+            missing = [day for day in wanted if day not in self.days]
+            if missing:
+                if len(self.days) + len(missing) > BUSY_INDEX_MAX_DAYS:
+                    self.days.clear()
+                first, last = missing[0], missing[-1]
+                by_day = busy_intervals_by_day(load_busy_events(first, last, self.resource), first, last)
+                for day in missing:
+                    self.days[day] = IntervalSet(by_day.get(day, ()))
+            return {day: self.days[day] for day in wanted}
+
+
+def get_busy_index(version: tuple | None = None, resource: str | None = None) -> BusyIndex:
+    """The app's ``BusyIndex`` for ``resource`` (``None`` is the clinic's agenda)."""
+    ttl = _busy_cache_seconds()
+    if not has_app_context():
+        return BusyIndex(ttl, resource=resource)
+    version = version or busy_version()
+    indexes = current_app.extensions.setdefault("busy_index", {})
+    index = indexes.get(resource)
+    if index is None or index.expired or index.ttl != ttl or index.version != version:
+        index = BusyIndex(ttl, version, resource)
+        indexes[resource] = index
+    return index
+
+
+def invalidate_busy_index() -> None:
+    """Forget cached busy time after calendar events change."""
+    if has_app_context():
+        current_app.extensions.pop("busy_index", None)
+
+
+def load_schedule(
+    start_day: dt_date,
+    end_day: dt_date,
+    default_hours: tuple[dt_time, dt_time],
+    resource: str | None = None,
+) -> dict[dt_date, DaySchedule]:
+    """Compile weekly rules, date exceptions and calendar blocks for a window.
+
+    Without any active ``ScheduleRule`` every day falls back to
+    ``default_hours``. An "open" exception replaces the weekly hours for its
+    date; a "closed" exception without times closes the whole day, and with
+    times it blocks that period like a calendar event. Rules and exceptions
+    come from the compiled per-process copy and calendar busy time from the
+    cached ``BusyIndex`` of ``resource``, so a warm call costs one version
+    check.
+    """
+    versions = _table_versions()
+    compiled = get_compiled_schedule(versions["schedule"])
+    rules = compiled.rules
+    default_open = [(_to_minutes(default_hours[0]), _to_minutes(default_hours[1]))]
+
+    busy_by_day = get_busy_index(versions["busy"], resource).get(start_day, end_day)
+    exceptions = compiled.exceptions_for(start_day, end_day)
+
+    schedule = {}
+    day = start_day
+    while day <= end_day:
+        open_intervals = default_open if rules is None else rules.get(day.weekday(), [])
+        busy = busy_by_day[day]
+
+        exception = exceptions[day]
+        if exception is not None:
+            if exception.opened:
+                open_intervals = exception.opened
+            if exception.closed:
+                open_intervals = []
+            if exception.blocked:
+                busy = IntervalSet([*busy, *exception.blocked])
+        schedule[day] = DaySchedule(day, IntervalSet(open_intervals), busy)
+        day += timedelta(days=1)
+    return schedule
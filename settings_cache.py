@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import threading
+
+from flask import current_app, g, has_app_context, has_request_context
+from sqlalchemy import event, inspect, select
+
+from extensions import db
+from models import Settings
+
+# Written by the Google sync on every run and every page. They are always
+# read from the Settings row, so they stay out of the snapshot and never move
+# the version.
+SYNC_BOOKKEEPING_COLUMNS = frozenset(
+    {"google_sync_token", "google_sync_last_at", "google_sync_checkpoint", "google_sync_requested_at"}
+)
+_COLUMNS = tuple(column.key for column in Settings.__table__.columns if column.key not in SYNC_BOOKKEEPING_COLUMNS)
+# The columns whose change must reach other workers' snapshots.
+CONTENT_COLUMNS = tuple(name for name in _COLUMNS if name not in ("id", "version"))
+_MISSING = object()
+
+
+class SettingsSnapshot:
+    """Read-only copy of the ``Settings`` row, safe to share between threads and requests."""
+
+    __slots__ = _COLUMNS
+
+    def __init__(self, row: Settings):
+        for name in _COLUMNS:
+            object.__setattr__(self, name, getattr(row, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SettingsSnapshot e somente leitura; altere o registro Settings.")
+
+    def __repr__(self) -> str:
+        return f"<SettingsSnapshot {self.site_title} v{self.version}>"
+
+
+class _SettingsCache:
+    def __init__(self):
+        self.key: tuple | None = None
+        self.snapshot = _MISSING
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple | None):
+        with self._lock:
+            return self.snapshot if self.key == key else _MISSING
+
+    def set(self, key: tuple | None, snapshot: SettingsSnapshot | None) -> None:
+        with self._lock:
+            self.key = key
+            self.snapshot = snapshot
+
+
+@event.listens_for(Settings, "before_update")
+def _bump_version(mapper, connection, target):
+    # A new version is what tells other workers to drop their snapshot. The
+    # increment runs in the UPDATE itself so concurrent saves never share one.
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in CONTENT_COLUMNS):
+        return
+    target.version = Settings.version + 1
+    if has_request_context():
+        g.pop("settings_snapshot", None)
+
+
+def _current_key() -> tuple | None:
+    row = db.session.execute(select(Settings.id, Settings.version).order_by(Settings.id).limit(1)).first()
+    return tuple(row) if row else None
+
+
+def _load(cache: _SettingsCache) -> SettingsSnapshot | None:
+    key = _current_key()
+    snapshot = cache.get(key)
+    if snapshot is _MISSING:
+        row = db.session.get(Settings, key[0]) if key else None
+        snapshot = SettingsSnapshot(row) if row else None
+        cache.set((row.id, row.version) if row else None, snapshot)
+    return snapshot
+
+
+def get_settings() -> SettingsSnapshot | None:
+    """Site settings for read-only use, shared by views, templates and services.
+
+    The process keeps one snapshot and reloads it only when the row's
+    ``version`` changes, so a request costs at most one ``SELECT id, version``.
+    Inside a request that check runs once and the snapshot is reused. Code
+    that changes settings must load the ``Settings`` row itself.
+    """
+    if not has_app_context():
+        return None
+    if has_request_context():
+        cached = g.get("settings_snapshot", _MISSING)
+        if cached is not _MISSING:
+            return cached
+    cache = current_app.extensions.setdefault("settings_cache", _SettingsCache())
+    snapshot = _load(cache)
+    if has_request_context():
+        g.settings_snapshot = snapshot
+    return snapshot
+
+
+def init_settings_cache(app) -> None:
+    app.extensions.setdefault("settings_cache", _SettingsCache())
+
+    @app.teardown_request
+    def _forget_request_snapshot(exc=None):
+        g.pop("settings_snapshot", None)
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from typing import NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from extensions import db
+from models import SiteSection, SiteSectionItem
+
+
+class SectionItem(NamedTuple):
+    title: str
+    body: str | None
+    icon: str | None
+    is_active: bool = True
+
+
+class Section(NamedTuple):
+    slug: str
+    title: str | None
+    subtitle: str | None
+    items: tuple[SectionItem, ...]
+
+
+def load_page_sections(page: str) -> dict[str, Section]:
+    """Active sections of ``page`` keyed by slug, each with its active items.
+
+    Two queries whatever the number of sections: one for the sections and a
+    ``selectinload`` for their items. The result holds plain tuples, so it
+    is safe to cache and never lazy-loads while a template renders.
+    """
+    sections = db.session.scalars(
+        select(SiteSection)
+        .where(SiteSection.page == page, SiteSection.is_active.is_(True))
+        .order_by(SiteSection.sort_order.asc(), SiteSection.id.asc())
+        .options(selectinload(SiteSection.items.and_(SiteSectionItem.is_active.is_(True))))
+        # Rows already in the session may hold every item; reload with the filter.
+        .execution_options(populate_existing=True)
+    ).all()
+    return {
+        section.slug: Section(
+            slug=section.slug,
+            title=section.title,
+            subtitle=section.subtitle,
+            items=tuple(
+                SectionItem(item.title, item.body, item.icon)
+                for item in sorted(section.items, key=lambda item: (item.sort_order or 0, item.id))
+            ),
+        )
+        for section in sections
+    }
@@ -4,7 +4,7 @@ from functools import wraps
 from flask import Blueprint, render_template, redirect, url_for, flash
 from flask_login import current_user
 
-from models import Settings
+from settings_cache import get_settings
 
 
 student_bp = Blueprint("student_bp", __name__, url_prefix="/student")
@@ -13,7 +13,7 @@ student_bp = Blueprint("student_bp", __name__, url_prefix="/student")
 @student_bp.context_processor
 def inject_settings():
     """Provide settings and current year to student templates."""
-    settings = Settings.query.first()
+    settings = get_settings()
     return {"settings": settings, "current_year": datetime.now().year}
 
 
@@ -8,10 +8,12 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from app import create_app
 from extensions import db
+from google_api import reset_google_api_state
 
 
 @pytest.fixture
 def app():
+    reset_google_api_state()
     app = create_app("testing")
     with app.app_context():
         db.create_all()
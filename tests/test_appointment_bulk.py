@@ -0,0 +1,155 @@
+import json
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import event
+
+from appointment_bulk import import_appointments, iter_records
+from extensions import db
+from models import Appointment, CalendarEvent, CalendarSource, ScheduleException, SlotReservation
+
+
+def _lines(resp):
+    return [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+
+
+def test_bulk_import_csv_streams_results(client, monkeypatch):
+    monkeypatch.setenv("ADMIN_API_KEY", "secret")
+    day = (date.today() + timedelta(days=3)).isoformat()
+    body = "\n".join([
+        "name,phone,email,date,time,reason,status",
+        f"Ana,2111,ana@example.com,{day},09:00,Retorno,confirmed",
+        f"Bia,2122,,{day},09:00,,",
+        f"Caio,2133,,{day},09:10,,",
+        f"Ana,2111,ana@example.com,{day},09:00,Retorno,confirmed",
+        "Duda,,,,,,",
+    ])
+
+    resp = client.post(
+        "/api/appointments/bulk",
+        data=body.encode(),
+        headers={"X-Admin-Key": "secret", "Content-Type": "text/csv"},
+    )
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+    results = _lines(resp)
+
+    assert [r.get("ok") for r in results[:-1]] == [True, False, False, True, False]
+    assert results[1]["error"] == "Horario lotado."
+    assert results[2]["error"] == "Horario fora da agenda."
+    assert results[3]["skipped"] and results[3]["id"] == results[0]["id"]
+    assert results[-1] == {"summary": {"created": 1, "skipped": 1, "failed": 3}}
+
+    appt = db.session.get(Appointment, results[0]["id"])
+    assert appt.status == "confirmed"
+    assert appt.manage_token
+    assert appt.google_event_id is None
+    assert appt.reservation.seat == 0
+
+
+def test_bulk_import_batches_inserts(app, monkeypatch):
+    monkeypatch.setenv("AVAIL_CAPACITY", "2")
+    start = date.today() + timedelta(days=1)
+    rows = [
+        json.dumps({"name": f"P{i}", "phone": str(i), "date": (start + timedelta(days=i % 5)).isoformat(), "time": "10:00"})
+        for i in range(10)
+    ]
+    rows.insert(3, "{not json")
+
+    inserts = []
+    record = lambda conn, cursor, statement, *args: inserts.append(statement) if statement.startswith("INSERT") else None
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        results = list(import_appointments(iter_records(iter(rows), "ndjson"), chunk_size=4))
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    assert results[-1]["summary"] == {"created": 10, "skipped": 0, "failed": 1}
+    assert results[3] == {"line": 4, "ok": False, "error": "Linha invalida."}
+    assert Appointment.query.count() == 10
+    assert SlotReservation.query.count() == 10
+    # three chunks, one executemany for appointments and one for seats each
+    assert len(inserts) == 6
+
+
+def test_bulk_import_respects_calendar_blocks(app):
+    day = date.today() + timedelta(days=2)
+    db.session.add_all([
+        CalendarEvent(title="Congresso", start_at=datetime.combine(day, time(9, 0)),
+                      end_at=datetime.combine(day, time(10, 0)), status="active", source="google"),
+        ScheduleException(date=day, kind="closed", start_time=time(14, 0), end_time=time(15, 0)),
+    ])
+    db.session.commit()
+    rows = [
+        {"name": "Ana", "phone": "1", "date": day.isoformat(), "time": "09:30"},
+        {"name": "Bia", "phone": "2", "date": day.isoformat(), "time": "14:00"},
+        {"name": "Caio", "phone": "3", "date": day.isoformat(), "time": "14:00", "status": "cancelled"},
+        {"name": "Duda", "phone": "4", "date": day.isoformat(), "time": "11:00"},
+    ]
+
+    results = list(import_appointments(iter_records(iter(map(json.dumps, rows)), "ndjson")))
+
+    assert [r["ok"] for r in results[:-1]] == [False, False, True, True]
+    assert results[0]["error"] == results[1]["error"] == "Horario fora da agenda."
+    assert SlotReservation.query.count() == 1
+
+
+def test_bulk_import_books_per_resource(app):
+    day = date.today() + timedelta(days=2)
+    ana = CalendarSource(name="Dra. Ana", resource="dra-ana", calendar_id="ana@agenda")
+    db.session.add(ana)
+    db.session.flush()
+    db.session.add(CalendarEvent(
+        title="Ferias", start_at=datetime.combine(day, time(9, 0)), end_at=datetime.combine(day, time(10, 0)),
+        status="active", source="google", source_id=ana.id, google_event_id="ana-ferias",
+    ))
+    db.session.commit()
+    rows = [
+        {"name": "Ana", "phone": "1", "date": day.isoformat(), "time": "09:00", "resource": "dra-ana"},
+        {"name": "Bia", "phone": "2", "date": day.isoformat(), "time": "09:00"},
+        {"name": "Caio", "phone": "3", "date": day.isoformat(), "time": "10:00", "resource": "dra-ana"},
+        {"name": "Duda", "phone": "4", "date": day.isoformat(), "time": "10:00"},
+        {"name": "Eva", "phone": "5", "date": day.isoformat(), "time": "10:00", "resource": "sala-9"},
+    ]
+
+    results = list(import_appointments(iter_records(iter(map(json.dumps, rows)), "ndjson")))
+
+    assert [r["ok"] for r in results[:-1]] == [False, True, True, True, False]
+    assert results[0]["error"] == "Horario fora da agenda."
+    assert results[4]["error"] == "Profissional ou sala desconhecido."
+    seats = {(r.resource, r.seat) for r in SlotReservation.query.filter_by(time=time(10, 0))}
+    assert seats == {("dra-ana", 0), ("", 0)}
+
+
+def test_bulk_export_round_trips(client, monkeypatch):
+    monkeypatch.setenv("ADMIN_API_KEY", "secret")
+    day = date.today() + timedelta(days=2)
+    rows = [
+        json.dumps({"name": "Ana", "phone": "1", "date": day.isoformat(), "time": "08:00"}),
+        json.dumps({"name": "Bia", "phone": "2", "date": day.isoformat(), "time": "08:30", "status": "cancelled"}),
+    ]
+    list(import_appointments(iter_records(iter(rows), "ndjson")))
+
+    resp = client.get(f"/api/appointments/export?start={day.isoformat()}", headers={"X-Admin-Key": "secret"})
+    exported = _lines(resp)
+    assert [(r["name"], r["time"], r["status"]) for r in exported] == [
+        ("Ana", "08:00", "pending"),
+        ("Bia", "08:30", "cancelled"),
+    ]
+
+    db.session.query(SlotReservation).delete()
+    db.session.query(Appointment).delete()
+    db.session.commit()
+    results = list(import_appointments(iter_records(iter(json.dumps(r) for r in exported), "ndjson")))
+    assert results[-1]["summary"]["created"] == 2
+
+
+def test_import_cli_reads_csv_file(app, tmp_path):
+    day = (date.today() + timedelta(days=4)).isoformat()
+    source = tmp_path / "agenda.csv"
+    source.write_text(f"name,phone,date,time\nAna,1,{day},11:00\n", encoding="utf-8")
+
+    result = app.test_cli_runner().invoke(args=["import-appointments", str(source)])
+    assert result.exit_code == 0, result.output
+    lines = [json.loads(line) for line in result.output.splitlines()]
+    assert lines[0]["ok"] is True
+    assert lines[-1]["summary"]["created"] == 1
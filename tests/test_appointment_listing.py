@@ -0,0 +1,104 @@
+from datetime import date, time, timedelta
+
+from sqlalchemy import event
+
+from appointment_listing import encode_cursor, paginate_appointments
+from extensions import db
+from models import Appointment, User
+
+
+def _seed(count, start):
+    rows = [
+        Appointment(
+            name=f"Paciente {i}",
+            phone=f"21{i:04d}",
+            date=start + timedelta(days=i // 4),
+            time=time(8 + i % 4, 0),
+            status="cancelled" if i % 5 == 0 else "pending",
+        )
+        for i in range(count)
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+def test_api_keyset_pages_cover_range_once(client, monkeypatch):
+    monkeypatch.setenv("ADMIN_API_KEY", "secret")
+    start = date(2030, 1, 1)
+    _seed(30, start)
+    headers = {"X-Admin-Key": "secret"}
+
+    seen, cursor = [], None
+    while True:
+        url = f"/api/appointments?from=2030-01-02&to=2030-01-06&status=pending&limit=4"
+        resp = client.get(url + (f"&cursor={cursor}" if cursor else ""), headers=headers)
+        assert resp.status_code == 200
+        data = resp.get_json()
+        seen.extend(data["appointments"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+
+    keys = [(a["date"], a["time"], a["id"]) for a in seen]
+    assert keys == sorted(keys)
+    assert len(keys) == len(set(keys))
+    assert all("2030-01-02" <= a["date"] <= "2030-01-06" and a["status"] == "pending" for a in seen)
+    assert len(seen) == Appointment.query.filter(
+        Appointment.date.between(date(2030, 1, 2), date(2030, 1, 6)),
+        Appointment.status == "pending",
+    ).count()
+
+
+def test_api_filters_and_errors(client, monkeypatch):
+    monkeypatch.setenv("ADMIN_API_KEY", "secret")
+    _seed(8, date(2030, 2, 1))
+    headers = {"X-Admin-Key": "secret"}
+
+    data = client.get("/api/appointments?date=2030-02-01", headers=headers).get_json()
+    assert data["date"] == "2030-02-01"
+    assert [a["time"] for a in data["appointments"]] == ["08:00", "09:00", "10:00", "11:00"]
+
+    data = client.get("/api/appointments?q=Paciente 7", headers=headers).get_json()
+    assert [a["name"] for a in data["appointments"]] == ["Paciente 7"]
+
+    assert client.get("/api/appointments?cursor=nope", headers=headers).status_code == 400
+    assert client.get("/api/appointments?from=31-31-2030", headers=headers).status_code == 400
+
+
+def test_admin_list_is_paged_newest_first(client):
+    admin = User(username="admin", email="admin@example.com", role="admin")
+    admin.set_password("admin123")
+    db.session.add(admin)
+    db.session.commit()
+    client.post("/admin/login", data={"username": "admin", "password": "admin123"})
+
+    _seed(60, date(2030, 3, 1))
+    first = client.get("/admin/appointments").get_data(as_text=True)
+    assert "Paciente 59" in first
+    assert "Paciente 0<" not in first
+    assert "Próxima página" in first
+
+    next_url = first.split('href="/admin/appointments?cursor=')[1].split('"')[0].replace("&amp;", "&")
+    second = client.get("/admin/appointments?cursor=" + next_url).get_data(as_text=True)
+    assert "Paciente 0<" in second
+    assert "Paciente 59" not in second
+    assert "Primeira página" in second
+
+
+
+def test_cursor_seek_is_an_index_range(app):
+    rows = _seed(8, date(2030, 5, 1))
+    seen = []
+    record = lambda conn, cursor, statement, params, *args: seen.append((statement, params))
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        page, _ = paginate_appointments(Appointment.query, cursor=encode_cursor(rows[3]), limit=2)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    assert [appt.id for appt in page] == [rows[4].id, rows[5].id]
+    statement, params = seen[-1]
+    assert "(appointment.date, appointment.time, appointment.id) >" in statement
+    plan = db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, params).all()
+    assert "ix_appointment_date_time_id" in str(plan)
@@ -0,0 +1,143 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import event
+
+from availability_service import (
+    BOOKED_STATUSES,
+    assign_overflow_seat,
+    find_next_available,
+    get_availability_range,
+    get_slot_grid,
+)
+from extensions import db
+from models import Appointment
+
+
+def _book(day, slot_time, status="pending", phone="21999999999"):
+    appt = Appointment(name="Paciente", phone=phone, date=day, time=slot_time, status=status)
+    db.session.add(appt)
+    if status in BOOKED_STATUSES:
+        assign_overflow_seat(appt, day, slot_time)
+    db.session.commit()
+    return appt
+
+
+def test_availability_single_day_counts_bookings(client):
+    day = date.today() + timedelta(days=3)
+    with client.application.app_context():
+        _book(day, time(9, 0))
+        _book(day, time(10, 0), status="cancelled")
+
+    resp = client.get(f"/api/availability?date={day.isoformat()}")
+    assert resp.status_code == 200
+    data = resp.get_json()
+    slots = {slot["time"]: slot for slot in data["slots"]}
+    assert slots["09:00"]["available"] == 0
+    assert slots["10:00"]["available"] == 1
+
+
+def test_availability_range_with_days(client):
+    start = date.today() + timedelta(days=1)
+    with client.application.app_context():
+        _book(start + timedelta(days=2), time(8, 30))
+
+    resp = client.get(f"/api/availability?start={start.isoformat()}&days=14")
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["ok"] is True
+    assert len(data["days"]) == 14
+    assert data["days"][0]["date"] == start.isoformat()
+    booked_day = data["days"][2]
+    slot = next(s for s in booked_day["slots"] if s["time"] == "08:30")
+    assert slot["booked"] == 1
+    assert slot["available"] == 0
+
+
+def test_availability_range_rejects_invalid_window(client):
+    resp = client.get("/api/availability?start=2035-01-10&end=2035-01-01")
+    assert resp.status_code == 400
+
+    resp = client.get("/api/availability?start=2035-01-01&days=500")
+    assert resp.status_code == 400
+
+
+def test_availability_range_uses_single_query(app):
+    start = date.today() + timedelta(days=1)
+    _book(start, time(9, 0))
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _count)
+    try:
+        days = get_availability_range(start, start + timedelta(days=13))
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _count)
+
+    assert len(days) == 14
+    appointment_queries = [s for s in statements if "FROM appointment" in s]
+    assert len(appointment_queries) == 1
+
+
+def test_slot_grid_validates_offsets(monkeypatch):
+    monkeypatch.setenv("AVAIL_WORK_START", "09:00")
+    monkeypatch.setenv("AVAIL_WORK_END", "12:00")
+    monkeypatch.setenv("AVAIL_SLOT_MINUTES", "45")
+    monkeypatch.setenv("AVAIL_CAPACITY", "2")
+
+    grid = get_slot_grid()
+    assert grid.labels == ("09:00", "09:45", "10:30", "11:15")
+    assert grid.is_valid(time(10, 30))
+    assert not grid.is_valid(time(10, 0))
+    assert not grid.is_valid(time(12, 0))
+    assert grid.available_counts({time(9, 45): 1, time(11, 15): 3}) == [2, 1, 2, 0]
+
+
+def test_slot_grid_is_cached_until_config_changes(monkeypatch):
+    monkeypatch.setenv("AVAIL_SLOT_MINUTES", "30")
+    first = get_slot_grid()
+    assert get_slot_grid() is first
+
+    monkeypatch.setenv("AVAIL_SLOT_MINUTES", "60")
+    second = get_slot_grid()
+    assert second is not first
+    assert second.slot_minutes == 60
+
+
+def test_find_next_available_skips_booked_slots(app):
+    day = date.today() + timedelta(days=2)
+    _book(day, time(8, 0))
+    _book(day, time(8, 30))
+
+    found = find_next_available(datetime.combine(day, time(7, 0)), horizon_days=3, n=2)
+
+    assert found == [(day, time(9, 0)), (day, time(9, 30))]
+
+
+def test_find_next_available_rolls_over_to_next_day(app):
+    day = date.today() + timedelta(days=2)
+
+    found = find_next_available(datetime.combine(day, time(16, 45)), horizon_days=2, n=1)
+
+    assert found == [(day + timedelta(days=1), time(8, 0))]
+
+
+def test_chatbot_suggests_alternatives_for_busy_slot(client):
+    day = date(2035, 12, 7)
+    with client.application.app_context():
+        _book(day, time(10, 0), phone="21888888888")
+
+    response = client.post(
+        "/api/chat",
+        json={
+            "message": (
+                "Quero agendar uma consulta em 2035-12-07 10:00. "
+                "Meu nome e Maria Silva, whatsapp 21999999999, "
+                "email maria@example.com, motivo retorno."
+            )
+        },
+    )
+
+    data = response.get_json()
+    assert "Horarios livres mais proximos: 07/12 10:30" in data["reply"]
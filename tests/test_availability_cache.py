@@ -0,0 +1,210 @@
+from datetime import date, datetime, time, timedelta
+from fnmatch import fnmatch
+
+from sqlalchemy import event, insert
+
+from app import create_app
+from appointments_api import create_pending_appointment
+from availability_service import get_availability_version
+from availability_cache import (
+    MemoryBackend,
+    RedisBackend,
+    cached_availability,
+    invalidate_availability,
+)
+from extensions import db
+from models import Appointment, CalendarEvent
+from schedule_service import busy_version
+
+
+class _FakeRedis:
+    """Local stand-in for a shared Redis server."""
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode()
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match="*"):
+        return [key for key in list(self.data) if fnmatch(key, match)]
+
+
+def _slot(data, label):
+    return next(slot for slot in data["slots"] if slot["time"] == label)
+
+
+def test_availability_endpoint_is_cached_and_invalidated_on_booking(client, monkeypatch):
+    day = date.today() + timedelta(days=3)
+    url = f"/api/availability?date={day.isoformat()}"
+    assert _slot(client.get(url).get_json(), "09:00")["available"] == 1
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        cached = client.get(url).get_json()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    # Only the aggregate version stamp runs; the payload comes from the cache.
+    assert len(statements) == 1
+    assert "GROUP BY" not in statements[0]
+    assert _slot(cached, "09:00")["available"] == 1
+
+    create_pending_appointment(name="Paciente", phone="21999999999", date_s=day.isoformat(), time_s="09:00")
+    assert _slot(client.get(url).get_json(), "09:00")["available"] == 0
+
+    appt = Appointment.query.one()
+    monkeypatch.setenv("ADMIN_API_KEY", "secret")
+    resp = client.post(f"/api/appointments/{appt.id}/cancel", headers={"X-Admin-Key": "secret"})
+    assert resp.status_code == 200
+    assert _slot(client.get(url).get_json(), "09:00")["available"] == 1
+
+
+def test_version_stamps_read_calendar_events_through_indexes(app):
+    statements = []
+    record = lambda conn, cursor, statement, parameters, *args: statements.append((statement, parameters))
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        day = date.today()
+        get_availability_version(day, day + timedelta(days=6))
+        busy_version()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    connection = db.session.connection()
+    plans = [
+        row[-1]
+        for statement, parameters in statements
+        for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        if "calendar_event" in row[-1]
+    ]
+    assert plans
+    assert all("INDEX" in plan for plan in plans if plan.startswith("SCAN")), plans
+
+
+def test_memory_backend_is_lru_bounded_and_expires():
+    backend = MemoryBackend(max_entries=2)
+    backend.set_many({"a": "1", "b": "2"}, ttl=60)
+    assert backend.get_many(["a"]) == ["1"]
+    backend.set_many({"c": "3"}, ttl=60)
+    assert backend.get_many(["a", "b", "c"]) == ["1", None, "3"]
+
+    backend.set_many({"d": "4"}, ttl=0)
+    assert backend.get_many(["d"]) == [None]
+
+
+def test_shared_backend_keeps_workers_coherent():
+    server = _FakeRedis()
+    day = date.today() + timedelta(days=4)
+    workers = []
+    for _ in range(2):
+        worker = create_app("testing")
+        worker.extensions["availability_cache"] = RedisBackend(server)
+        workers.append(worker)
+
+    with workers[0].app_context():
+        db.create_all()
+        assert _slot(cached_availability(day), "10:00")["booked"] == 0
+        # A write nobody invalidated, e.g. from a worker without the shared cache.
+        db.session.add(Appointment(name="Paciente", phone="1", date=day, time=time(10, 0), status="pending"))
+        db.session.commit()
+        assert _slot(cached_availability(day), "10:00")["booked"] == 1
+        assert len(server.data) == 2
+
+    with workers[1].app_context():
+        invalidate_availability([day])
+        assert server.data == {}
+
+    with workers[0].app_context():
+        db.drop_all()
+
+
+def test_shared_cache_is_filled_from_current_busy_time(app):
+    app.extensions["availability_cache"] = RedisBackend(_FakeRedis())
+    day = date.today() + timedelta(days=6)
+    assert _slot(cached_availability(day), "10:00")["available"] == 1
+
+    # Another worker imports a Google event and clears the shared entry; this
+    # worker's BusyIndex never saw the write.
+    db.session.execute(insert(CalendarEvent).values(
+        title="Particular",
+        start_at=datetime.combine(day, time(10, 0)),
+        end_at=datetime.combine(day, time(11, 0)),
+        status="active",
+        source="google",
+    ))
+    db.session.commit()
+    invalidate_availability([day])
+
+    assert _slot(cached_availability(day), "10:00")["available"] == 0
+
+
+def test_cached_body_always_matches_its_etag(app, client):
+    day = date.today() + timedelta(days=7)
+    url = f"/api/availability?date={day.isoformat()}"
+    first = client.get(url)
+    assert _slot(first.get_json(), "10:00")["booked"] == 0
+
+    # Booked by another worker: this worker's cache was never invalidated.
+    db.session.execute(insert(Appointment).values(
+        name="Paciente", phone="1", date=day, time=time(10, 0), status="pending",
+    ))
+    db.session.commit()
+
+    second = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert _slot(second.get_json(), "10:00")["booked"] == 1
+
+
+def test_availability_etag_answers_304_until_bookings_change(client):
+    day = date.today() + timedelta(days=5)
+    url = f"/api/availability?start={day.isoformat()}&days=3"
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == etag
+
+    create_pending_appointment(name="Paciente", phone="21988887777", date_s=day.isoformat(), time_s="11:00")
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_admin_calendar_events_etag(client):
+    from models import User
+
+    admin = User(username="admin", email="admin@example.com", role="admin")
+    admin.set_password("admin123")
+    db.session.add(admin)
+    db.session.commit()
+    client.post("/admin/login", data={"username": "admin", "password": "admin123"})
+
+    day = date.today() + timedelta(days=2)
+    db.session.add(Appointment(name="Paciente", phone="1", date=day, time=time(9, 0), status="pending"))
+    db.session.commit()
+    url = f"/admin/api/calendar/events?start={day.isoformat()}T00:00:00&end={(day + timedelta(days=1)).isoformat()}T00:00:00"
+
+    first = client.get(url)
+    assert first.status_code == 200
+    assert len(first.get_json()) == 1
+    etag = first.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    appt = Appointment.query.one()
+    client.get(f"/admin/appointment/{appt.id}/status/confirmed")
+    refreshed = client.get(url, headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.get_json()[0]["extendedProps"]["status"] == "confirmed"
@@ -0,0 +1,177 @@
+import threading
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+import calendar_outbox
+import google_calendar
+from app import create_app
+from calendar_outbox import drain_outbox, enqueue_appointment_sync
+from extensions import db
+from models import Appointment, CalendarOutbox
+
+
+class _GoogleCalls(list):
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+
+    def record(self, action, ok=True):
+        def _call(appointment, settings=None):
+            with self.lock:
+                self.append((action, appointment.id))
+            return ok
+        return _call
+
+
+@pytest.fixture
+def google_calls(monkeypatch):
+    calls = _GoogleCalls()
+    monkeypatch.setattr(google_calendar, "_should_sync", lambda settings=None: True)
+    monkeypatch.setattr(calendar_outbox, "upsert_appointment_event", calls.record("upsert"))
+    monkeypatch.setattr(calendar_outbox, "cancel_appointment_event", calls.record("cancel"))
+    return calls
+
+
+def _appointment(day=None, slot_time=time(9, 0)):
+    appt = Appointment(
+        name="Paciente",
+        phone="21999990000",
+        date=day or date.today() + timedelta(days=2),
+        time=slot_time,
+        status="pending",
+    )
+    db.session.add(appt)
+    db.session.commit()
+    return appt
+
+
+def test_booking_request_enqueues_instead_of_calling_google(client, google_calls):
+    day = date.today() + timedelta(days=3)
+    resp = client.post(
+        "/api/appointments/request",
+        json={"name": "Ana", "phone": "2111", "date": day.isoformat(), "time": "09:00"},
+    )
+    assert resp.status_code == 201
+    assert google_calls == []
+
+    entry = CalendarOutbox.query.one()
+    assert (entry.appointment_id, entry.action, entry.status) == (resp.get_json()["appointment_id"], "upsert", "pending")
+
+
+def test_reschedules_coalesce_into_one_google_call(app, google_calls):
+    appt = _appointment()
+    for hour in range(9, 14):
+        appt.time = time(hour, 0)
+        enqueue_appointment_sync(appt)
+        db.session.commit()
+
+    entry = CalendarOutbox.query.one()
+    assert entry.coalesced == 4
+
+    assert drain_outbox(app, workers=1) == {"done": 1, "retry": 0}
+    assert google_calls == [("upsert", appt.id)]
+    db.session.refresh(entry)
+    assert entry.status == "done"
+
+
+def test_claimed_entry_is_not_coalesced(app, google_calls):
+    appt = _appointment()
+    first = enqueue_appointment_sync(appt)
+    db.session.commit()
+    first.status = "processing"
+    db.session.commit()
+
+    second = enqueue_appointment_sync(appt, "cancel")
+    db.session.commit()
+
+    assert second is not None and second.id != first.id
+    db.session.refresh(first)
+    assert (first.action, first.coalesced) == ("upsert", 0)
+    assert second.action == "cancel"
+
+
+def test_rolled_back_booking_drops_its_sync(app, google_calls):
+    appt = _appointment()
+    appt.status = "confirmed"
+    enqueue_appointment_sync(appt)
+    db.session.rollback()
+
+    assert CalendarOutbox.query.count() == 0
+    assert db.session.get(Appointment, appt.id).status == "pending"
+
+
+def test_failed_push_backs_off_then_gives_up(app, google_calls, monkeypatch):
+    monkeypatch.setenv("CALENDAR_OUTBOX_MAX_ATTEMPTS", "2")
+    monkeypatch.setattr(calendar_outbox, "upsert_appointment_event", google_calls.record("upsert", ok=False))
+    appt = _appointment()
+    entry = enqueue_appointment_sync(appt)
+    db.session.commit()
+    entry_id = entry.id
+
+    assert drain_outbox(app, workers=1) == {"done": 0, "retry": 1}
+    db.session.expire_all()
+    entry = db.session.get(CalendarOutbox, entry_id)
+    assert entry.status == "pending"
+    assert entry.attempts == 1
+    assert entry.next_attempt_at > datetime.utcnow() + timedelta(seconds=20)
+
+    assert drain_outbox(app, workers=1) == {"done": 0, "retry": 0}
+
+    entry.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    drain_outbox(app, workers=1)
+    db.session.refresh(entry)
+    assert entry.status == "failed"
+    assert entry.last_error == "upsert falhou"
+    assert len(google_calls) == 2
+
+
+def test_cancel_without_google_event_needs_no_api_call(app, google_calls):
+    appt = _appointment()
+    enqueue_appointment_sync(appt)
+    enqueue_appointment_sync(appt, "cancel")
+    db.session.commit()
+
+    assert drain_outbox(app, workers=1) == {"done": 1, "retry": 0}
+    assert google_calls == []
+
+
+def test_worker_command_drains_in_parallel(tmp_path, monkeypatch, google_calls):
+    app = create_app(
+        {
+            "TESTING": True,
+            "SECRET_KEY": "test-secret",
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'outbox.db'}",
+            "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"check_same_thread": False, "timeout": 30}},
+        }
+    )
+    with app.app_context():
+        db.create_all()
+        for hour in range(8, 16):
+            enqueue_appointment_sync(_appointment(slot_time=time(hour, 0)))
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=["calendar-worker", "--once", "--workers", "4", "--batch-size", "3"])
+    assert result.exit_code == 0, result.output
+    assert "Eventos enviados: 8" in result.output
+    assert sorted(appt_id for _, appt_id in google_calls) == list(range(1, 9))
+    with app.app_context():
+        assert {entry.status for entry in CalendarOutbox.query} == {"done"}
+
+
+def test_bulk_import_queues_upcoming_bookings(app, google_calls):
+    from appointment_bulk import import_appointments
+
+    future = (date.today() + timedelta(days=5)).isoformat()
+    past = (date.today() - timedelta(days=5)).isoformat()
+    records = [
+        (1, {"name": "Ana", "phone": "1", "date": future, "time": "09:00"}),
+        (2, {"name": "Bia", "phone": "2", "date": past, "time": "09:00"}),
+        (3, {"name": "Caio", "phone": "3", "date": future, "time": "10:00", "status": "cancelled"}),
+    ]
+    results = list(import_appointments(records))
+
+    assert results[-1]["summary"]["created"] == 3
+    assert [entry.appointment_id for entry in CalendarOutbox.query] == [results[0]["id"]]
+    assert google_calls == []
@@ -0,0 +1,210 @@
+import threading
+from datetime import date, datetime, time, timedelta
+
+import google_calendar
+import google_sync_scheduler
+from app import create_app
+from availability_service import get_availability
+from extensions import db
+from google_sync_scheduler import run_sync_tick
+from models import Appointment, CalendarEvent, CalendarSource, Settings
+
+
+class _Request:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def execute(self):
+        return self.payload
+
+
+class _Events:
+    def __init__(self, items_by_calendar, barrier):
+        self.items_by_calendar = items_by_calendar
+        self.barrier = barrier
+        self.calendars = []
+
+    def list(self, **params):
+        self.calendars.append(params["calendarId"])
+        # Both calendars must be listed at the same time to get past here.
+        self.barrier.wait()
+        return _Request({"items": self.items_by_calendar[params["calendarId"]], "nextSyncToken": "tok"})
+
+
+class _Service:
+    def __init__(self, events):
+        self._events = events
+
+    def events(self):
+        return self._events
+
+
+def _timed(event_id, start, minutes=60):
+    return {
+        "id": event_id,
+        "status": "confirmed",
+        "summary": "Ocupado",
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + timedelta(minutes=minutes)).isoformat()},
+    }
+
+
+def _slot(data, label):
+    return next(slot for slot in data["slots"] if slot["time"] == label)
+
+
+def test_sources_sync_in_parallel_with_their_own_tokens(tmp_path, monkeypatch):
+    # Each worker thread needs its own connection, which in-memory SQLite cannot give.
+    app = create_app(
+        {
+            "TESTING": True,
+            "SECRET_KEY": "test-secret",
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'sources.db'}",
+            "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"check_same_thread": False, "timeout": 30}},
+        }
+    )
+    day = date.today() + timedelta(days=3)
+    events = _Events(
+        {
+            "ana@agenda": [_timed("ana-1", datetime.combine(day, time(10, 0)))],
+            "sala2@agenda": [_timed("sala-1", datetime.combine(day, time(14, 0)))],
+        },
+        threading.Barrier(2, timeout=5),
+    )
+    credentials = []
+
+    def _service(settings=None, credentials_file=None):
+        credentials.append(credentials_file)
+        return _Service(events)
+
+    monkeypatch.setattr(google_calendar, "_get_service", _service)
+    monkeypatch.setattr(google_calendar, "_to_timezone", lambda dt, tz: dt)
+    monkeypatch.setattr(google_sync_scheduler, "is_sync_enabled", lambda settings=None: False)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Settings(google_sync_enabled=True, google_calendar_id="principal"))
+        ana = CalendarSource(name="Dra. Ana", resource="dra-ana", calendar_id="ana@agenda", credentials_file="ana.json")
+        sala = CalendarSource(name="Sala 2", resource="sala-2", calendar_id="sala2@agenda")
+        db.session.add_all([ana, sala])
+        db.session.commit()
+
+        assert run_sync_tick("worker-1", force=True, workers=2) is True
+        assert sorted(events.calendars) == ["ana@agenda", "sala2@agenda"]
+        assert set(credentials) == {"ana.json", None}
+
+        db.session.expire_all()
+        for source in CalendarSource.query.all():
+            assert source.sync_token == "tok"
+            assert source.last_sync_at is not None
+            assert source.last_error is None
+        assert {e.google_event_id: e.source_id for e in CalendarEvent.query.all()} == {
+            "ana-1": ana.id,
+            "sala-1": sala.id,
+        }
+        # Nothing is due again until the interval passes.
+        assert run_sync_tick("worker-1") is None
+        db.session.remove()
+
+
+def test_source_copies_never_touch_appointments(app, client, monkeypatch):
+    day = date.today() + timedelta(days=4)
+    start = datetime.combine(day, time(10, 0))
+    appt = Appointment(name="Paciente", phone="1", date=day, time=time(10, 0), status="confirmed",
+                       google_event_id="shared-1")
+    db.session.add(Settings(google_sync_enabled=True, google_calendar_id="principal"))
+    ana = CalendarSource(name="Dra. Ana", resource="dra-ana", calendar_id="ana@agenda")
+    sala = CalendarSource(name="Sala 2", resource="sala-2", calendar_id="sala2@agenda")
+    db.session.add_all([appt, ana, sala])
+    db.session.commit()
+
+    # Both invited calendars return their copy of the appointment's event, moved
+    # and then cancelled on their side.
+    moved = _timed("shared-1", start + timedelta(hours=4))
+    cancelled = {"id": "shared-1", "status": "cancelled"}
+    events = _Events({"ana@agenda": [moved], "sala2@agenda": [moved]}, threading.Barrier(1))
+    monkeypatch.setattr(google_calendar, "_get_service", lambda settings=None, credentials_file=None: _Service(events))
+    monkeypatch.setattr(google_calendar, "_to_timezone", lambda dt, tz: dt)
+
+    assert google_calendar.sync_calendar_source(ana)
+    assert google_calendar.sync_calendar_source(sala)
+    events.items_by_calendar["ana@agenda"] = [cancelled]
+    assert google_calendar.sync_calendar_source(ana)
+
+    db.session.expire_all()
+    appt = db.session.get(Appointment, appt.id)
+    assert (appt.date, appt.time, appt.status) == (day, time(10, 0), "confirmed")
+    rows = {row.source_id: row.status for row in CalendarEvent.query.filter_by(google_event_id="shared-1")}
+    assert rows == {ana.id: "cancelled", sala.id: "active"}
+
+    # Each copy blocks only its own calendar's resource.
+    for resource, available in (("sala-2", 0), ("dra-ana", 1)):
+        data = client.get(f"/api/availability?date={day.isoformat()}&resource={resource}").get_json()
+        assert _slot(data, "14:00")["available"] == available
+
+
+def test_disabled_source_stops_blocking_its_slots(app, client):
+    day = date.today() + timedelta(days=5)
+    db.session.add(Settings(google_sync_enabled=True, google_calendar_id="principal"))
+    ana = CalendarSource(name="Dra. Ana", resource="dra-ana", calendar_id="ana@agenda", sync_token="tok")
+    db.session.add(ana)
+    db.session.flush()
+    db.session.add(CalendarEvent(
+        title="Ocupado", start_at=datetime.combine(day, time(10, 0)), end_at=datetime.combine(day, time(11, 0)),
+        status="active", source="google", source_id=ana.id, google_event_id="ana-1",
+    ))
+    db.session.commit()
+
+    url = f"/api/availability?date={day.isoformat()}&resource=dra-ana"
+    assert _slot(client.get(url).get_json(), "10:00")["available"] == 0
+
+    result = app.test_cli_runner().invoke(args=["calendar-source", "disable", str(ana.id)])
+    assert result.exit_code == 0, result.output
+    assert "1 eventos liberados" in result.output
+
+    assert _slot(get_availability(day, "dra-ana"), "10:00")["available"] > 0
+    # A disabled calendar's resource no longer takes bookings.
+    assert client.get(url).status_code == 400
+    db.session.expire_all()
+    assert db.session.get(CalendarSource, ana.id).sync_token is None
+
+
+def test_each_resource_has_its_own_seats_and_busy_time(app, client):
+    day = date.today() + timedelta(days=6)
+    ana = CalendarSource(name="Dra. Ana", resource="dra-ana", calendar_id="ana@agenda")
+    sala = CalendarSource(name="Sala 2", resource="sala-2", calendar_id="sala2@agenda")
+    db.session.add_all([ana, sala])
+    db.session.flush()
+    db.session.add(CalendarEvent(
+        title="Ferias", start_at=datetime.combine(day, time(9, 0)), end_at=datetime.combine(day, time(10, 0)),
+        status="active", source="google", source_id=ana.id, google_event_id="ana-ferias",
+    ))
+    db.session.commit()
+
+    def _book(resource=None, hour="10:00", phone="1"):
+        payload = {"name": "Paciente", "phone": phone, "date": day.isoformat(), "time": hour}
+        if resource:
+            payload["resource"] = resource
+        return client.post("/api/appointments/request", json=payload)
+
+    # Dra. Ana's calendar blocks only her own agenda.
+    assert _book("dra-ana", "09:00").status_code == 400
+    assert _book(None, "09:00").status_code == 201
+    assert _book("unknown", "09:00").status_code == 400
+
+    # A seat taken with one resource leaves the others free at the same time.
+    booked = _book("dra-ana", "10:00")
+    assert booked.status_code == 201
+    assert booked.get_json()["resource"] == "dra-ana"
+    assert _book("dra-ana", "10:00", phone="2").status_code == 409
+    assert _book("sala-2", "10:00", phone="2").status_code == 201
+    assert _book(None, "10:00", phone="3").status_code == 201
+
+    def _available(resource=None):
+        query = f"/api/availability?date={day.isoformat()}" + (f"&resource={resource}" if resource else "")
+        return {label: _slot(client.get(query).get_json(), label)["available"] for label in ("09:00", "10:00", "11:00")}
+
+    assert _available("dra-ana") == {"09:00": 0, "10:00": 0, "11:00": 1}
+    assert _available("sala-2") == {"09:00": 1, "10:00": 0, "11:00": 1}
+    assert _available() == {"09:00": 0, "10:00": 0, "11:00": 1}
+    assert {r.resource for r in Appointment.query.filter_by(time=time(10, 0))} == {"dra-ana", "sala-2", None}
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+import google_calendar
+import google_sync_scheduler
+from calendar_watch import WEBHOOK_PATH, ensure_watch_channel
+from extensions import db
+from google_sync_scheduler import run_sync_tick
+from models import CalendarWatchChannel, Settings
+
+
+class _Call:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class _Service:
+    def __init__(self):
+        self.watched = []
+        self.stopped = []
+
+    def events(self):
+        service = self
+
+        class _Events:
+            def watch(self, calendarId, body):
+                service.watched.append(body)
+                expires = datetime.utcnow() + timedelta(hours=int(body["params"]["ttl"]) // 3600)
+                return _Call({"resourceId": f"res-{len(service.watched)}", "expiration": str(int(expires.timestamp() * 1000))})
+
+        return _Events()
+
+    def channels(self):
+        service = self
+
+        class _Channels:
+            def stop(self, body):
+                service.stopped.append(body["id"])
+                return _Call({})
+
+        return _Channels()
+
+
+def _setup(monkeypatch):
+    settings = Settings(google_sync_enabled=True, google_calendar_id="agenda")
+    db.session.add(settings)
+    db.session.commit()
+    service = _Service()
+    monkeypatch.setattr(google_calendar, "_should_sync", lambda settings=None: True)
+    monkeypatch.setattr(google_calendar, "_get_service", lambda settings=None: service)
+    return settings, service
+
+
+def _notify(client, channel, state="exists", token=None):
+    return client.post(
+        WEBHOOK_PATH,
+        headers={
+            "X-Goog-Channel-ID": channel.channel_id,
+            "X-Goog-Channel-Token": channel.token if token is None else token,
+            "X-Goog-Resource-ID": channel.resource_id,
+            "X-Goog-Resource-State": state,
+            "X-Goog-Message-Number": "1",
+        },
+    )
+
+
+def test_watch_channel_is_renewed_before_expiry(app, monkeypatch):
+    _, service = _setup(monkeypatch)
+    address = "https://clinica.example.com" + WEBHOOK_PATH
+
+    first = ensure_watch_channel(address)
+    assert first.resource_id == "res-1"
+    assert service.watched[0]["address"] == address
+    assert ensure_watch_channel(address).id == first.id
+
+    first.expires_at = datetime.utcnow() + timedelta(hours=2)
+    db.session.commit()
+    second = ensure_watch_channel(address)
+    assert second.id != first.id
+    assert service.stopped == [first.channel_id]
+    assert db.session.get(CalendarWatchChannel, first.id).stopped_at is not None
+
+
+def test_webhook_validates_channel_and_requests_sync(app, client, monkeypatch):
+    settings, _ = _setup(monkeypatch)
+    channel = ensure_watch_channel("https://clinica.example.com" + WEBHOOK_PATH)
+
+    assert client.post(WEBHOOK_PATH, headers={"X-Goog-Channel-ID": "desconhecido"}).status_code == 404
+    assert _notify(client, channel, token="errado").status_code == 403
+    assert _notify(client, channel, state="sync").status_code == 204
+    db.session.expire_all()
+    assert db.session.get(Settings, settings.id).google_sync_requested_at is None
+
+    assert _notify(client, channel).status_code == 204
+    db.session.expire_all()
+    requested = db.session.get(Settings, settings.id).google_sync_requested_at
+    assert requested is not None
+    assert _notify(client, channel).status_code == 204
+    db.session.expire_all()
+    assert db.session.get(Settings, settings.id).google_sync_requested_at == requested
+
+
+def test_notifications_trigger_a_debounced_sync(app, client, monkeypatch):
+    settings, _ = _setup(monkeypatch)
+    channel = ensure_watch_channel("https://clinica.example.com" + WEBHOOK_PATH)
+    settings.google_sync_last_at = datetime.utcnow()
+    db.session.commit()
+
+    calls = []
+    monkeypatch.setattr(
+        google_sync_scheduler, "sync_google_calendar", lambda settings=None, force=False: calls.append(force) or True
+    )
+
+    # idle with a live channel: no polling at the regular interval
+    settings.google_sync_last_at = datetime.utcnow() - timedelta(minutes=30)
+    db.session.commit()
+    assert run_sync_tick("worker", interval=60) is None
+
+    _notify(client, channel)
+    assert run_sync_tick("worker", interval=60) is None
+
+    settings = db.session.get(Settings, settings.id)
+    settings.google_sync_requested_at = datetime.utcnow() - timedelta(seconds=10)
+    db.session.commit()
+    assert run_sync_tick("worker", interval=60) is True
+    assert calls == [True]
+    db.session.expire_all()
+    assert db.session.get(Settings, settings.id).google_sync_requested_at is None
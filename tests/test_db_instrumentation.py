@@ -0,0 +1,89 @@
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+import db_instrumentation
+from db_instrumentation import QueryStats
+from extensions import db
+from models import Settings
+
+
+def test_requests_report_query_count_and_db_time(app, client, caplog):
+    db.session.add(Settings(site_title="Clinica"))
+    db.session.commit()
+
+    with caplog.at_level(logging.INFO, logger=app.logger.name):
+        response = client.get("/api/availability?date=2030-01-07")
+
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("db;dur=")
+    assert "queries" in timing
+
+    lines = [r.getMessage() for r in caplog.records if r.getMessage().startswith("sql ")]
+    assert len(lines) == 1
+    stats = json.loads(lines[0][4:])
+    assert stats["path"] == "/api/availability"
+    assert stats["queries"] >= 1
+    assert str(stats["queries"]) in timing
+    assert stats["slowest"] and "SELECT" in stats["slowest"][0]["sql"]
+
+
+def test_server_timing_can_be_switched_off(app, client):
+    app.config["SQL_SERVER_TIMING"] = False
+    response = client.get("/api/availability?date=2030-01-07")
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+
+
+def test_slow_selects_log_their_plan(app, caplog):
+    app.config["SQL_SLOW_QUERY_MS"] = 0.000001
+    with caplog.at_level(logging.WARNING, logger=app.logger.name):
+        Settings.query.filter_by(site_title="x").all()
+
+    slow = [r.getMessage() for r in caplog.records if r.getMessage().startswith("Consulta lenta")]
+    assert slow
+    assert "SELECT settings.id" in slow[0]
+    assert "SCAN settings" in slow[0]
+
+
+def test_failed_statements_do_not_skew_the_next_timing(app, monkeypatch):
+    clock = {"now": 0.0}
+
+    def _perf_counter():
+        clock["now"] += 0.01
+        return clock["now"]
+
+    monkeypatch.setattr(db_instrumentation, "time", SimpleNamespace(perf_counter=_perf_counter))
+    contexts = []
+    track = lambda conn, cursor, statement, parameters, context, executemany: contexts.append(context)
+    event.listen(db.engine, "before_cursor_execute", track)
+    try:
+        with app.test_request_context("/"):
+            g.sql_stats = stats = QueryStats()
+            connection = db.session.connection()
+            info_before = dict(connection.info)
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    connection.exec_driver_sql("SELECT * FROM missing_table")
+                db.session.rollback()
+                connection = db.session.connection()
+            assert stats.count == 0
+
+            # A start left over from a failed statement would add these 1000 s.
+            clock["now"] += 1000
+            connection.exec_driver_sql("SELECT 1")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", track)
+
+    assert stats.count == 1
+    assert stats.total_ms == pytest.approx(10)
+    assert stats.slowest[0][1] == "SELECT 1"
+    assert len(contexts) == 4
+    assert not any(hasattr(context, "_query_start") for context in contexts)
+    assert dict(connection.info) == info_before
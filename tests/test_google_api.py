@@ -0,0 +1,157 @@
+import json
+
+import httplib2
+import pytest
+
+import google_api
+from google_api import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RateLimitedError,
+    TokenBucket,
+    execute,
+    is_retryable,
+    metrics_snapshot,
+)
+from google_calendar import HttpError
+
+
+def _http_error(status, reason=None):
+    payload = {"error": {"errors": [{"reason": reason}] if reason else [], "message": "erro"}}
+    return HttpError(httplib2.Response({"status": status}), json.dumps(payload).encode())
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Request:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def _fresh_state():
+    google_api.reset_google_api_state()
+    yield
+    google_api.reset_google_api_state()
+
+
+def test_token_bucket_spreads_calls_after_the_burst():
+    clock = _Clock()
+    bucket = TokenBucket(rate=2, burst=2, clock=clock)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    clock.now = 2.0
+    assert bucket.reserve() == 0
+
+
+def test_request_path_calls_never_wait(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_RATE", "1")
+    monkeypatch.setenv("GOOGLE_API_BURST", "1")
+    sleeps = []
+
+    failing = _Request(_http_error(503))
+    with pytest.raises(HttpError):
+        execute(failing, "agenda", max_retries=0, block=False, sleep=sleeps.append)
+    assert failing.calls == 1
+
+    throttled = _Request({"id": "evt"})
+    with pytest.raises(RateLimitedError):
+        execute(throttled, "agenda", max_retries=0, block=False, sleep=sleeps.append)
+    assert throttled.calls == 0
+    assert sleeps == []
+    assert metrics_snapshot()["throttled"] == 1
+
+
+def test_throttled_trial_does_not_keep_the_circuit_open(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_RATE", "0.001")
+    monkeypatch.setenv("GOOGLE_API_BURST", "1")
+    monkeypatch.setenv("GOOGLE_API_BREAKER_THRESHOLD", "1")
+    monkeypatch.setenv("GOOGLE_API_BREAKER_RESET_SECONDS", "0")
+
+    with pytest.raises(HttpError):
+        execute(_Request(_http_error(503)), "agenda", max_retries=0, block=False)
+    bucket, breaker = google_api._guard("agenda")
+    assert breaker.is_open
+
+    # The reset has elapsed but the bucket is empty: the trial is throttled, not spent.
+    with pytest.raises(RateLimitedError):
+        execute(_Request({"id": "evt"}), "agenda", max_retries=0, block=False)
+
+    bucket.tokens = bucket.burst
+    assert execute(_Request({"id": "evt"}), "agenda", max_retries=0, block=False) == {"id": "evt"}
+    assert not breaker.is_open
+
+
+def test_retryable_errors():
+    assert is_retryable(_http_error(429))
+    assert is_retryable(_http_error(503))
+    assert is_retryable(_http_error(403, "rateLimitExceeded"))
+    assert not is_retryable(_http_error(403, "forbiddenForServiceAccounts"))
+    assert not is_retryable(_http_error(404))
+    assert is_retryable(ConnectionError("reset"))
+
+
+def test_execute_backs_off_and_retries_rate_limits():
+    sleeps = []
+    request = _Request(_http_error(429), _http_error(403, "userRateLimitExceeded"), {"id": "evt"})
+    assert execute(request, "agenda", sleep=sleeps.append) == {"id": "evt"}
+    assert request.calls == 3
+    assert len(sleeps) == 2
+    assert metrics_snapshot()["retries"] == 2
+
+    missing = _Request(_http_error(404))
+    with pytest.raises(HttpError):
+        execute(missing, "agenda", sleep=sleeps.append)
+    assert missing.calls == 1
+
+
+def test_circuit_opens_and_short_circuits(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_BREAKER_THRESHOLD", "2")
+    for _ in range(2):
+        with pytest.raises(HttpError):
+            execute(_Request(_http_error(500)), "agenda", max_retries=0)
+
+    request = _Request({"id": "evt"})
+    with pytest.raises(CircuitOpenError):
+        execute(request, "agenda")
+    assert request.calls == 0
+    snapshot = metrics_snapshot()
+    assert snapshot["open_circuits"] == ["agenda"]
+    assert snapshot["circuit_opened"] == 1
+    assert snapshot["short_circuited"] == 1
+    # other calendars are not affected
+    assert execute(_Request({"id": "x"}), "outra") == {"id": "x"}
+
+
+def test_breaker_lets_one_trial_through_after_reset():
+    clock = _Clock()
+    breaker = CircuitBreaker(threshold=1, reset_seconds=30, clock=clock)
+    assert breaker.record_failure()
+    assert not breaker.allow()
+    clock.now = 31
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and not breaker.is_open
+
+
+def test_health_reports_google_metrics(client):
+    google_api.count_metric("retries", 3)
+    data = client.get("/api/health/google").get_json()
+    assert data["ok"] is True
+    assert data["metrics"]["retries"] == 3
@@ -0,0 +1,162 @@
+import json
+from datetime import date, time, timedelta
+
+import httplib2
+import pytest
+
+import google_calendar
+from extensions import db
+from models import Appointment, Settings
+
+
+def _http_error(status, payload=None):
+    content = json.dumps(payload or {"error": {"message": "erro"}}).encode()
+    return google_calendar.HttpError(httplib2.Response({"status": status}), content)
+
+
+class _Request:
+    def __init__(self, method, kwargs):
+        self.method = method
+        self.kwargs = kwargs
+
+
+class _Events:
+    def insert(self, **kwargs):
+        return _Request("insert", kwargs)
+
+    def update(self, **kwargs):
+        return _Request("update", kwargs)
+
+
+class _Batch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.items = []
+
+    def add(self, request, request_id=None):
+        self.items.append((request_id, request))
+
+    def execute(self):
+        assert len(self.items) <= 50
+        self.service.http_calls += 1
+        for request_id, request in self.items:
+            self.service.requests.append((request.method, request_id))
+            response, exception = self.service.respond(request)
+            self.callback(request_id, response, exception)
+
+
+class _Service:
+    def __init__(self, respond):
+        self.respond = respond
+        self.http_calls = 0
+        self.requests = []
+
+    def events(self):
+        return _Events()
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+
+@pytest.fixture
+def appointments(app):
+    db.session.add(Settings(google_sync_enabled=True, google_calendar_id="agenda", google_attendee_emails="dr@example.com"))
+    day = date.today() + timedelta(days=1)
+    items = [
+        Appointment(name=f"P{i}", phone=str(i), date=day + timedelta(days=i // 8), time=time(8 + i % 8, 0), status="pending")
+        for i in range(120)
+    ]
+    items[0].google_event_id = "gone"
+    items[1].google_event_id = "kept"
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+def _use(monkeypatch, service):
+    monkeypatch.setenv("GOOGLE_API_RATE", "1000")
+    monkeypatch.setattr(google_calendar, "_should_sync", lambda settings=None: True)
+    monkeypatch.setattr(google_calendar, "_get_service", lambda settings=None: service)
+
+
+def test_batch_resync_maps_results_and_retries(monkeypatch, appointments):
+    def respond(request):
+        body = request.kwargs["body"]
+        appt_id = body["extendedProperties"]["private"]["appointment_id"]
+        if request.method == "update" and request.kwargs["eventId"] == "gone":
+            return None, _http_error(404)
+        if appt_id == str(appointments[2].id):
+            if body.get("attendees"):
+                return None, _http_error(403, {"error": {"errors": [{"reason": "forbiddenForServiceAccounts"}]}})
+        if appt_id == str(appointments[3].id):
+            return None, _http_error(400)
+        return {"id": request.kwargs.get("eventId") or f"evt-{appt_id}"}, None
+
+    service = _Service(respond)
+    _use(monkeypatch, service)
+
+    report = google_calendar.batch_upsert_appointment_events(appointments)
+
+    assert report["total"] == 120
+    assert report["updated"] == 1
+    assert report["created"] == 118
+    assert report["failed"] == 1
+    assert report["errors"][0]["appointment_id"] == appointments[3].id
+    # 120 requests in 3 batches, then one follow-up batch with both retries
+    assert service.http_calls == 4
+    assert service.requests[-2:] == [("insert", str(appointments[0].id)), ("insert", str(appointments[2].id))]
+
+    db.session.expire_all()
+    assert db.session.get(Appointment, appointments[0].id).google_event_id == f"evt-{appointments[0].id}"
+    assert db.session.get(Appointment, appointments[1].id).google_event_id == "kept"
+    assert db.session.get(Appointment, appointments[3].id).google_event_id is None
+
+
+def test_batch_resync_reports_transport_failure(monkeypatch, appointments):
+    class _Broken(_Service):
+        def new_batch_http_request(self, callback=None):
+            batch = _Batch(self, callback)
+            batch.execute = lambda: (_ for _ in ()).throw(OSError("timeout"))
+            return batch
+
+    _use(monkeypatch, _Broken(None))
+    report = google_calendar.batch_upsert_appointment_events(appointments[:10])
+    assert report["failed"] == 10
+    assert report["created"] == report["updated"] == 0
+
+
+def test_batch_resync_retries_rate_limited_items(monkeypatch, appointments):
+    seen = set()
+
+    def respond(request):
+        appt_id = request.kwargs["body"]["extendedProperties"]["private"]["appointment_id"]
+        if appt_id not in seen and int(appt_id) % 10 == 0:
+            seen.add(appt_id)
+            return None, _http_error(503)
+        return {"id": request.kwargs.get("eventId") or f"evt-{appt_id}"}, None
+
+    sleeps = []
+    monkeypatch.setattr(google_calendar.time, "sleep", sleeps.append)
+    service = _Service(respond)
+    _use(monkeypatch, service)
+
+    report = google_calendar.batch_upsert_appointment_events(appointments)
+    assert report["failed"] == 0
+    assert report["created"] + report["updated"] == 120
+    assert len(sleeps) == 1
+
+
+def test_interactive_resync_defers_throttled_items_instead_of_waiting(monkeypatch, appointments):
+    sleeps = []
+    monkeypatch.setattr(google_calendar.time, "sleep", sleeps.append)
+    service = _Service(lambda request: ({"id": request.kwargs.get("eventId") or "evt"}, None))
+    _use(monkeypatch, service)
+    monkeypatch.setenv("GOOGLE_API_RATE", "0.001")
+    monkeypatch.setenv("GOOGLE_API_BURST", "60")
+
+    report = google_calendar.batch_upsert_appointment_events(appointments, interactive=True)
+    assert report["created"] + report["updated"] == 50
+    assert len(report["deferred"]) == 70
+    assert report["failed"] == 0
+    assert sleeps == []
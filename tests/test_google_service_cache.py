@@ -0,0 +1,74 @@
+import json
+import threading
+
+import pytest
+
+import google_calendar
+from extensions import db
+from models import Settings
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    calls = {"creds": 0, "build": 0}
+
+    class _Credentials:
+        @staticmethod
+        def from_service_account_info(info, scopes=None):
+            calls["creds"] += 1
+            return ("creds", info["client_email"])
+
+    monkeypatch.setattr(google_calendar.service_account, "Credentials", _Credentials)
+
+    def _build(name, version, credentials=None, cache_discovery=True):
+        calls["build"] += 1
+        return {"credentials": credentials}
+
+    monkeypatch.setattr(google_calendar, "build", _build)
+    google_calendar.reset_service_cache()
+    yield calls
+    google_calendar.reset_service_cache()
+
+
+def _settings(email):
+    settings = Settings.query.first() or Settings()
+    settings.google_calendar_id = "agenda@example.com"
+    settings.google_credentials_json = json.dumps({"type": "service_account", "client_email": email})
+    db.session.add(settings)
+    db.session.commit()
+    return settings
+
+
+def test_service_is_reused_until_credentials_change(app, counters):
+    settings = _settings("a@example.com")
+    first = google_calendar._get_service(settings)
+    for _ in range(5):
+        assert google_calendar._get_service(settings) is first
+    assert counters == {"creds": 1, "build": 1}
+
+    _settings("b@example.com")
+    second = google_calendar._get_service()
+    assert second is not first
+    assert second["credentials"] == ("creds", "b@example.com")
+    assert counters == {"creds": 2, "build": 2}
+
+    google_calendar.reset_service_cache()
+    assert google_calendar._get_service() is not second
+    assert counters == {"creds": 3, "build": 3}
+
+
+def test_threads_get_own_service_with_shared_credentials(app, counters):
+    settings = _settings("a@example.com")
+    main_service = google_calendar._get_service(settings)
+    seen = []
+
+    def _worker():
+        seen.append(google_calendar._get_service(settings))
+
+    thread = threading.Thread(target=_worker)
+    thread.start()
+    thread.join()
+
+    assert seen[0] is not main_service
+    assert seen[0]["credentials"] is main_service["credentials"]
+    assert counters == {"creds": 1, "build": 2}
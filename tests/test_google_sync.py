@@ -0,0 +1,148 @@
+import json
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import event
+
+import google_calendar
+from extensions import db
+from models import Appointment, CalendarEvent, Settings
+
+
+class _Request:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def execute(self):
+        return self.payload
+
+
+class _Events:
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+        self.fail_on = None
+
+    def list(self, **params):
+        self.calls.append(dict(params))
+        index = int(params.get("pageToken") or 0)
+        if index == self.fail_on:
+            raise ConnectionError("conexao perdida")
+        payload = {"items": self.pages[index]}
+        if index + 1 < len(self.pages):
+            payload["nextPageToken"] = str(index + 1)
+        else:
+            payload["nextSyncToken"] = "sync-1"
+        return _Request(payload)
+
+
+class _Service:
+    def __init__(self, pages):
+        self._events = _Events(pages)
+
+    def events(self):
+        return self._events
+
+
+def _timed(event_id, start, minutes=50, **extra):
+    return {
+        "id": event_id,
+        "status": "confirmed",
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + timedelta(minutes=minutes)).isoformat()},
+        **extra,
+    }
+
+
+def _use(monkeypatch, pages):
+    service = _Service(pages)
+    monkeypatch.setattr(google_calendar, "_should_sync", lambda settings=None: True)
+    monkeypatch.setattr(google_calendar, "_get_service", lambda settings=None: service)
+    monkeypatch.setattr(google_calendar, "_to_timezone", lambda dt, tz: dt)
+    return service
+
+
+def test_sync_resolves_each_page_with_in_queries(app, monkeypatch):
+    settings = Settings(google_sync_enabled=True, google_calendar_id="agenda")
+    db.session.add(settings)
+    day = date.today() + timedelta(days=3)
+    appointments = [
+        Appointment(name=f"P{i}", phone=str(i), date=day, time=time(8 + i, 0), status="confirmed",
+                    google_event_id=f"appt-{i}" if i % 2 else None)
+        for i in range(8)
+    ]
+    local = [
+        CalendarEvent(title="Antigo", start_at=datetime.combine(day, time(20, 0)),
+                      end_at=datetime.combine(day, time(21, 0)), status="active",
+                      source="google", google_event_id=f"cal-{i}")
+        for i in range(10)
+    ]
+    db.session.add_all(appointments + local)
+    db.session.commit()
+
+    first_page = [
+        _timed(f"appt-{i}", datetime.combine(day, appt.time),
+               extendedProperties={"private": {"appointment_id": str(appt.id)}} if i % 2 == 0 else {})
+        for i, appt in enumerate(appointments)
+    ]
+    second_page = [
+        _timed(f"cal-{i}", datetime.combine(day, time(20, 0)), minutes=60, summary="Atualizado")
+        for i in range(10)
+    ] + [
+        _timed(f"new-{i}", datetime.combine(day + timedelta(days=1), time(8 + i, 0)), summary="Novo")
+        for i in range(5)
+    ]
+    _use(monkeypatch, [first_page, second_page])
+
+    selects = []
+    record = lambda conn, cursor, statement, *args: selects.append(statement) if statement.startswith("SELECT") else None
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        assert google_calendar.sync_google_calendar(settings=settings, force=True)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    appointment_selects = [s for s in selects if "FROM appointment" in s]
+    calendar_selects = [s for s in selects if "FROM calendar_event" in s]
+    assert len(appointment_selects) == 2
+    assert len(calendar_selects) == 1
+
+    db.session.expire_all()
+    assert [a.google_event_id for a in Appointment.query.order_by(Appointment.id)] == [f"appt-{i}" for i in range(8)]
+    assert CalendarEvent.query.filter_by(title="Atualizado").count() == 10
+    assert CalendarEvent.query.filter_by(title="Novo", source="google").count() == 5
+    assert db.session.get(Settings, settings.id).google_sync_token == "sync-1"
+
+
+def test_interrupted_sync_resumes_from_checkpoint(app, monkeypatch):
+    settings = Settings(google_sync_enabled=True, google_calendar_id="agenda")
+    db.session.add(settings)
+    db.session.commit()
+    day = date.today() + timedelta(days=2)
+    pages = [
+        [_timed(f"evt-{page}-{i}", datetime.combine(day + timedelta(days=page), time(9 + i, 0))) for i in range(3)]
+        for page in range(3)
+    ]
+    service = _use(monkeypatch, pages)
+    service._events.fail_on = 2
+
+    assert not google_calendar.sync_google_calendar(settings=settings, force=True)
+    db.session.expire_all()
+    settings = db.session.get(Settings, settings.id)
+    checkpoint = json.loads(settings.google_sync_checkpoint)
+    assert checkpoint["pageToken"] == "2"
+    assert settings.google_sync_token is None
+    assert CalendarEvent.query.count() == 6
+
+    service._events.fail_on = None
+    service._events.calls.clear()
+    assert google_calendar.sync_google_calendar(settings=settings, force=True)
+
+    assert len(service._events.calls) == 1
+    resumed = service._events.calls[0]
+    assert resumed["pageToken"] == "2"
+    assert resumed["timeMin"] == checkpoint["timeMin"]
+    db.session.expire_all()
+    settings = db.session.get(Settings, settings.id)
+    assert settings.google_sync_checkpoint is None
+    assert settings.google_sync_token == "sync-1"
+    assert CalendarEvent.query.count() == 9
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import google_calendar
+import google_sync_scheduler
+from extensions import db
+from google_sync_scheduler import SYNC_LOCK_NAME, acquire_leader_lock, release_leader_lock, run_sync_tick
+from models import SchedulerLock, Settings, User
+
+
+def test_leader_lock_is_exclusive_until_it_expires(app):
+    assert acquire_leader_lock("job", "a", 60)
+    assert not acquire_leader_lock("job", "b", 60)
+    assert acquire_leader_lock("job", "a", 60)
+
+    lock = db.session.get(SchedulerLock, "job")
+    lock.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert acquire_leader_lock("job", "b", 60)
+    assert db.session.get(SchedulerLock, "job").owner == "b"
+
+    release_leader_lock("job", "b")
+    assert acquire_leader_lock("job", "a", 60)
+
+
+def test_sync_tick_only_runs_on_the_leader(app, monkeypatch):
+    db.session.add(Settings(google_sync_enabled=True, google_calendar_id="agenda"))
+    db.session.commit()
+    calls = []
+    monkeypatch.setattr(google_sync_scheduler, "is_sync_enabled", lambda settings=None: True)
+    monkeypatch.setattr(
+        google_sync_scheduler, "sync_google_calendar", lambda settings=None, force=False: calls.append(force) or True
+    )
+
+    assert run_sync_tick("worker-1") is True
+    assert run_sync_tick("worker-2") is None
+    assert run_sync_tick("worker-1") is True
+    assert calls == [True, True]
+    assert db.session.get(SchedulerLock, SYNC_LOCK_NAME).owner == "worker-1"
+
+
+def test_admin_pages_do_not_sync_inline(app, client, monkeypatch):
+    db.session.add(Settings(google_sync_enabled=True, google_calendar_id="agenda"))
+    admin = User(username="admin", email="admin@example.com", role="admin")
+    admin.set_password("secret")
+    db.session.add(admin)
+    db.session.commit()
+    client.post("/admin/login", data={"username": "admin", "password": "secret"})
+
+    def _fail(*args, **kwargs):
+        raise AssertionError("sync_google_calendar chamado durante a requisicao")
+
+    monkeypatch.setattr(google_calendar, "sync_google_calendar", _fail)
+    monkeypatch.setattr("admin_routes.sync_google_calendar", _fail)
+    monkeypatch.setattr(google_calendar, "_should_sync", lambda settings=None: True)
+
+    assert client.get("/admin/appointments").status_code == 200
+    assert client.get("/admin/api/calendar/events").status_code == 200
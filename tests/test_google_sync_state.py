@@ -0,0 +1,128 @@
+import json
+from datetime import date, time, timedelta
+
+import httplib2
+from sqlalchemy import event as sa_event
+
+import google_calendar
+from extensions import db
+from models import Appointment, GoogleSyncState, Settings
+
+
+class _Request:
+    def __init__(self, service, method, kwargs):
+        self.service = service
+        self.method = method
+        self.kwargs = kwargs
+        self.headers = {}
+
+    def execute(self):
+        self.service.sent.append(self)
+        if self.service.conflict and self.method == "update":
+            raise google_calendar.HttpError(httplib2.Response({"status": 412}), json.dumps({"error": {}}).encode())
+        self.service.version += 1
+        event_id = self.kwargs.get("eventId") or f"evt-{len(self.service.sent)}"
+        return {"id": event_id, "etag": f'"v{self.service.version}"'}
+
+
+class _Service:
+    def __init__(self):
+        self.sent = []
+        self.version = 0
+        self.conflict = False
+
+    def events(self):
+        service = self
+
+        class _Events:
+            def insert(self, **kwargs):
+                return _Request(service, "insert", kwargs)
+
+            def update(self, **kwargs):
+                return _Request(service, "update", kwargs)
+
+        return _Events()
+
+
+def _setup(monkeypatch):
+    settings = Settings(google_sync_enabled=True, google_calendar_id="agenda")
+    appt = Appointment(
+        name="Ana", phone="1", date=date.today() + timedelta(days=2), time=time(9, 0), status="confirmed"
+    )
+    db.session.add_all([settings, appt])
+    db.session.commit()
+    service = _Service()
+    monkeypatch.setenv("GOOGLE_API_RATE", "1000")
+    monkeypatch.setattr(google_calendar, "_should_sync", lambda settings=None: True)
+    monkeypatch.setattr(google_calendar, "_get_service", lambda settings=None: service)
+    return settings, appt, service
+
+
+def test_unchanged_body_is_not_sent_again(app, monkeypatch):
+    _, appt, service = _setup(monkeypatch)
+
+    assert google_calendar.upsert_appointment_event(appt)
+    assert google_calendar.upsert_appointment_event(appt)
+    assert [r.method for r in service.sent] == ["insert"]
+
+    appt.reason = "Retorno"
+    db.session.commit()
+    assert google_calendar.upsert_appointment_event(appt)
+    update = service.sent[-1]
+    assert update.method == "update"
+    assert update.headers["If-Match"] == '"v1"'
+    state = GoogleSyncState.query.filter_by(kind="appointment", local_id=appt.id).one()
+    assert state.etag == '"v2"'
+
+
+def test_conflicting_update_requests_an_import(app, monkeypatch):
+    settings, appt, service = _setup(monkeypatch)
+    assert google_calendar.upsert_appointment_event(appt)
+
+    service.conflict = True
+    appt.reason = "Retorno"
+    db.session.commit()
+    assert not google_calendar.upsert_appointment_event(appt)
+    db.session.expire_all()
+    assert db.session.get(Settings, settings.id).google_sync_requested_at is not None
+
+
+def test_stale_count_uses_one_query(app, monkeypatch):
+    _, appt, _ = _setup(monkeypatch)
+    assert google_calendar.upsert_appointment_event(appt)
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    sa_event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        counts = google_calendar.count_stale_events(date.today())
+    finally:
+        sa_event.remove(db.engine, "before_cursor_execute", record)
+    assert len(statements) == 1
+    assert counts == {"total": 1, "synced": 1, "stale_appointments": 0, "stale_events": 0}
+
+    appt.status = "pending"
+    db.session.commit()
+    assert google_calendar.count_stale_events(date.today())["stale_appointments"] == 1
+
+
+def test_batch_resync_skips_unchanged_appointments(app, monkeypatch):
+    _, appt, service = _setup(monkeypatch)
+    assert google_calendar.upsert_appointment_event(appt)
+
+    class _Batch:
+        def __init__(self, callback):
+            self.callback = callback
+            self.items = []
+
+        def add(self, request, request_id=None):
+            self.items.append((request_id, request))
+
+        def execute(self):
+            for request_id, request in self.items:
+                self.callback(request_id, request.execute(), None)
+
+    service.new_batch_http_request = lambda callback=None: _Batch(callback)
+    report = google_calendar.batch_upsert_appointment_events([appt])
+    assert report["skipped"] == 1
+    assert len(service.sent) == 1
@@ -0,0 +1,114 @@
+import json
+import time as time_module
+from datetime import date, time
+
+import pytest
+
+import google_api
+from extensions import db
+import metrics
+from metrics import BOOKINGS, render_metrics, reset_metrics, send_mail
+from models import Appointment
+
+
+@pytest.fixture(autouse=True)
+def _clean_metrics(monkeypatch):
+    monkeypatch.delenv("METRICS_MULTIPROC_DIR", raising=False)
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+def test_metrics_require_the_healthcheck_token(app, client):
+    app.config["HEALTHCHECK_TOKEN"] = "tok"
+
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer errado"}).status_code == 403
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer tok"})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert response.headers["Cache-Control"] == "no-store"
+    assert client.get("/metrics", headers={"X-Health-Token": "tok"}).status_code == 200
+
+
+def test_requests_chatbot_and_bookings_are_counted(app, client):
+    app.config["HEALTHCHECK_TOKEN"] = "tok"
+    assert client.get("/api/availability?date=2030-01-07").status_code == 200
+    assert client.post("/api/chat", json={"message": "reiniciar"}).status_code == 200
+
+    appt = Appointment(name="Paciente", phone="1", date=date(2030, 1, 7), time=time(9, 0))
+    db.session.add(appt)
+    db.session.commit()
+    appt.time = time(10, 0)
+    db.session.commit()
+    appt.status = "cancelled"
+    db.session.commit()
+
+    text = client.get("/metrics", headers={"Authorization": "Bearer tok"}).get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert (
+        'http_request_duration_seconds_bucket{endpoint="availability_bp.availability",'
+        'method="GET",status="200",le="+Inf"} 1'
+    ) in text
+    assert 'chatbot_intents_total{intent="reset"} 1' in text
+    assert 'bookings_total{action="created"} 1' in text
+    assert 'bookings_total{action="rescheduled"} 1' in text
+    assert 'bookings_total{action="cancelled"} 1' in text
+    assert "db_query_duration_seconds_count" in text
+
+
+def test_rolled_back_bookings_are_not_counted(app):
+    db.session.add(Appointment(name="Paciente", phone="1", date=date(2030, 1, 7), time=time(9, 0)))
+    db.session.flush()
+    db.session.rollback()
+    assert "bookings_total{" not in render_metrics()
+
+
+def test_google_calls_and_mail_latency(app):
+    class Request:
+        def execute(self):
+            return {"items": []}
+
+    class BrokenMail:
+        def send(self, message):
+            raise RuntimeError("smtp fora do ar")
+
+    google_api.execute(Request(), "primary", sleep=lambda _: None)
+    with pytest.raises(RuntimeError):
+        send_mail(BrokenMail(), object(), "reminder")
+
+    text = render_metrics()
+    assert 'google_calendar_call_duration_seconds_count{outcome="ok"} 1' in text
+    assert 'google_calendar_events_total{event="calls"} 1' in text
+    assert 'mail_send_duration_seconds_count{kind="reminder",outcome="error"} 1' in text
+
+
+def test_multiprocess_snapshots_are_merged(app, tmp_path, monkeypatch):
+    monkeypatch.setenv("METRICS_MULTIPROC_DIR", str(tmp_path))
+    (tmp_path / "metrics_99999_1.json").write_text(
+        json.dumps({"bookings_total": {json.dumps(["created"]): 2}}), encoding="utf-8"
+    )
+
+    db.session.add(Appointment(name="Paciente", phone="1", date=date(2030, 1, 7), time=time(9, 0)))
+    db.session.commit()
+
+    assert 'bookings_total{action="created"} 3' in render_metrics()
+    assert len(list(tmp_path.glob("metrics_*.json"))) == 2
+
+
+def test_idle_worker_still_writes_its_last_values(tmp_path, monkeypatch):
+    monkeypatch.setenv("METRICS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "FLUSH_INTERVAL_SECONDS", 0.05)
+
+    BOOKINGS.inc(action="created")
+    BOOKINGS.inc(action="created")  # inside the throttle window: not written yet
+
+    def written():
+        snapshot = next(tmp_path.glob("metrics_*.json"))
+        return json.loads(snapshot.read_text(encoding="utf-8"))["bookings_total"][json.dumps(["created"])]
+
+    deadline = time_module.monotonic() + 2
+    while written() != 2 and time_module.monotonic() < deadline:
+        time_module.sleep(0.02)
+    assert written() == 2
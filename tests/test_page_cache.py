@@ -0,0 +1,88 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from extensions import db
+from models import Course, Settings, SiteSection, User
+
+
+def _count_selects(fn):
+    selects = []
+    record = lambda conn, cursor, statement, *args: selects.append(statement) if statement.startswith("SELECT") else None
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        result = fn()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    return result, selects
+
+
+def test_public_page_is_served_from_cache_with_etag(app, client):
+    db.session.add(SiteSection(page="about", slug="about-areas", title="Quem somos", is_active=True))
+    db.session.commit()
+
+    first = client.get("/about")
+    assert first.status_code == 200
+    assert b"Quem somos" in first.data
+    assert first.headers["Cache-Control"].startswith("public")
+    assert "Accept-Language" in first.headers["Vary"]
+    etag = first.headers["ETag"]
+
+    again, selects = _count_selects(lambda: client.get("/about"))
+    assert again.data == first.data
+    assert again.headers["ETag"] == etag
+    assert not [s for s in selects if "FROM site_section" in s]
+
+    revalidated = client.get("/about", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b""
+
+
+def test_commit_purges_pages_tagged_with_the_model(app, client):
+    db.session.add(Course(title="Curso antigo", price=10, is_active=True, created_at=datetime.utcnow()))
+    db.session.commit()
+    assert b"Curso antigo" in client.get("/courses").data
+    about = client.get("/about").headers["ETag"]
+
+    course = Course.query.first()
+    course.title = "Curso novo"
+    db.session.commit()
+
+    body = client.get("/courses").data
+    assert b"Curso novo" in body
+    assert b"Curso antigo" not in body
+    assert b"Curso novo" in client.get("/cursos").data
+    # Pages without the "courses" tag keep their entry.
+    assert client.get("/about", headers={"If-None-Match": about}).status_code == 304
+
+
+def test_logged_in_pages_are_not_cached(app, client):
+    admin = User(username="admin", email="admin@example.com", role="admin")
+    admin.set_password("secret")
+    db.session.add(admin)
+    db.session.commit()
+    client.post("/admin/login", data={"username": "admin", "password": "secret"})
+
+    response = client.get("/")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert "ETag" not in response.headers
+
+
+def test_only_rendered_settings_change_the_page_key(app, client):
+    settings = Settings(site_title="Clinica")
+    db.session.add(settings)
+    db.session.commit()
+    etag = client.get("/about").headers["ETag"]
+
+    settings.google_sync_token = "token"
+    settings.google_sync_last_at = datetime.utcnow()
+    settings.mail_server = "smtp.example.com"
+    db.session.commit()
+    assert client.get("/about", headers={"If-None-Match": etag}).status_code == 304
+
+    settings.site_title = "Clinica Nova"
+    db.session.commit()
+    changed = client.get("/about", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert b"Clinica Nova" in changed.data
@@ -0,0 +1,307 @@
+import threading
+import time as clock
+from datetime import date, datetime, time, timedelta
+
+from availability_service import find_next_available, get_availability, is_slot_available, is_valid_slot
+from extensions import db
+from models import CalendarEvent, ScheduleException, ScheduleRule
+import schedule_service
+from schedule_service import BusyIndex, IntervalSet
+
+
+def _next_weekday(weekday):
+    day = date.today() + timedelta(days=1)
+    while day.weekday() != weekday:
+        day += timedelta(days=1)
+    return day
+
+
+def _add(*items):
+    db.session.add_all(items)
+    db.session.commit()
+
+
+def test_interval_set_merges_and_looks_up():
+    intervals = IntervalSet([(600, 660), (480, 540), (530, 570), (700, 720)])
+
+    assert list(intervals) == [(480, 570), (600, 660), (700, 720)]
+    assert intervals.overlaps(560, 590)
+    assert not intervals.overlaps(570, 600)
+    assert intervals.overlaps(590, 610)
+    assert not intervals.overlaps(720, 800)
+    assert intervals.contains(610, 650)
+    assert not intervals.contains(560, 610)
+
+
+def test_weekly_rules_support_lunch_break_and_closed_days(app):
+    monday = _next_weekday(0)
+    _add(
+        ScheduleRule(weekday=0, start_time=time(8, 0), end_time=time(12, 0)),
+        ScheduleRule(weekday=0, start_time=time(13, 0), end_time=time(15, 0)),
+        ScheduleRule(weekday=5, start_time=time(9, 0), end_time=time(11, 0)),
+    )
+
+    labels = [slot["time"] for slot in get_availability(monday)["slots"]]
+    assert "11:30" in labels
+    assert "12:00" not in labels
+    assert "12:30" not in labels
+    assert labels[-1] == "14:30"
+
+    assert is_valid_slot(monday, time(13, 0))
+    assert not is_valid_slot(monday, time(12, 0))
+
+    sunday = monday + timedelta(days=6)
+    assert get_availability(sunday)["slots"] == []
+    assert not is_valid_slot(sunday, time(9, 0))
+
+
+def test_exceptions_close_days_and_block_periods(app):
+    holiday = date.today() + timedelta(days=3)
+    half_day = date.today() + timedelta(days=4)
+    _add(
+        ScheduleException(date=holiday, kind="closed", note="Feriado"),
+        ScheduleException(date=half_day, kind="closed", start_time=time(10, 0), end_time=time(11, 0)),
+    )
+
+    assert get_availability(holiday)["slots"] == []
+
+    slots = {slot["time"]: slot for slot in get_availability(half_day)["slots"]}
+    assert slots["09:30"]["available"] == 1
+    assert slots["10:00"]["available"] == 0
+    assert slots["10:30"]["available"] == 0
+    assert slots["11:00"]["available"] == 1
+    assert not is_valid_slot(half_day, time(10, 30))
+
+
+def test_open_exception_replaces_weekly_hours(app):
+    sunday = _next_weekday(6)
+    _add(
+        ScheduleRule(weekday=0, start_time=time(8, 0), end_time=time(12, 0)),
+        ScheduleException(date=sunday, kind="open", start_time=time(9, 0), end_time=time(10, 0)),
+    )
+
+    labels = [slot["time"] for slot in get_availability(sunday)["slots"]]
+    assert labels == ["09:00", "09:30"]
+
+
+def test_calendar_blocks_mask_slots(app):
+    day = date.today() + timedelta(days=2)
+    next_day = day + timedelta(days=1)
+    _add(
+        CalendarEvent(
+            title="Congresso",
+            start_at=datetime.combine(day, time(15, 45)),
+            end_at=datetime.combine(day, time(16, 15)),
+            source="system",
+            status="active",
+        ),
+        CalendarEvent(
+            title="Folga",
+            start_at=datetime.combine(next_day, time(0, 0)),
+            end_at=datetime.combine(next_day + timedelta(days=1), time(0, 0)),
+            all_day=True,
+            source="system",
+            status="active",
+        ),
+    )
+
+    slots = {slot["time"]: slot["available"] for slot in get_availability(day)["slots"]}
+    assert slots["15:00"] == 1
+    assert slots["15:30"] == 0
+    assert slots["16:00"] == 0
+    assert slots["16:30"] == 1
+
+    found = find_next_available(datetime.combine(day, time(16, 30)), horizon_days=3, n=2)
+    assert found == [(day, time(16, 30)), (next_day + timedelta(days=1), time(8, 0))]
+
+
+def test_admin_schedule_pages(client):
+    from models import User
+
+    admin = User(username="admin", email="admin@example.com", role="admin")
+    admin.set_password("admin123")
+    _add(admin)
+    client.post("/admin/login", data={"username": "admin", "password": "admin123"})
+
+    resp = client.post(
+        "/admin/schedule/rules/add",
+        data={"weekday": "2", "start_time": "09:00", "end_time": "12:00"},
+        follow_redirects=True,
+    )
+    assert resp.status_code == 200
+    rule = ScheduleRule.query.one()
+    assert (rule.weekday, rule.start_time, rule.end_time) == (2, time(9, 0), time(12, 0))
+
+    holiday = date.today() + timedelta(days=5)
+    client.post(
+        "/admin/schedule/exceptions/add",
+        data={"date": holiday.isoformat(), "kind": "closed", "note": "Feriado"},
+    )
+    assert ScheduleException.query.filter_by(date=holiday).one().note == "Feriado"
+    assert get_availability(holiday)["slots"] == []
+
+    resp = client.get("/admin/schedule")
+    assert resp.status_code == 200
+    assert "Feriado" in resp.get_data(as_text=True)
+
+    client.post(f"/admin/schedule/rules/{rule.id}/delete")
+    assert ScheduleRule.query.count() == 0
+
+
+def _count_event_queries(*tables):
+    from sqlalchemy import event as sa_event
+
+    statements = []
+    tables = tables or ("calendar_event",)
+
+    def _record(conn, cursor, statement, params, context, executemany):
+        if any(f"FROM {table}" in statement for table in tables):
+            statements.append(statement)
+
+    sa_event.listen(db.engine, "before_cursor_execute", _record)
+    return statements, lambda: sa_event.remove(db.engine, "before_cursor_execute", _record)
+
+
+def test_google_busy_time_is_indexed_and_cached(app):
+    day = date.today() + timedelta(days=3)
+    _add(
+        CalendarEvent(
+            title="Particular",
+            start_at=datetime.combine(day, time(10, 0)),
+            end_at=datetime.combine(day, time(11, 0)),
+            source="google",
+            status="active",
+            google_event_id="g-1",
+        ),
+    )
+
+    statements, stop = _count_event_queries()
+    try:
+        with app.test_request_context("/"):
+            slots = {slot["time"]: slot["available"] for slot in get_availability(day)["slots"]}
+            assert not is_slot_available(day, time(10, 30))
+            assert is_slot_available(day, time(11, 0))
+            get_availability(day)
+    finally:
+        stop()
+
+    assert slots["09:30"] == 1
+    assert slots["10:00"] == 0
+    assert slots["10:30"] == 0
+    assert slots["11:00"] == 1
+    # The per-request version check plus a single range load.
+    assert len(statements) == 2
+
+
+def test_google_sync_invalidates_busy_index(app, monkeypatch):
+    import google_calendar
+    from models import Settings
+
+    day = date.today() + timedelta(days=4)
+    start = datetime.combine(day, time(14, 0)).isoformat()
+    end = datetime.combine(day, time(15, 0)).isoformat()
+    items = [{"id": "g-2", "status": "confirmed", "summary": "Dentista",
+              "start": {"dateTime": start}, "end": {"dateTime": end}}]
+
+    class _Request:
+        def execute(self):
+            return {"items": items, "nextSyncToken": "token-1"}
+
+    class _Events:
+        def list(self, **params):
+            return _Request()
+
+    class _Service:
+        def events(self):
+            return _Events()
+
+    settings = Settings(google_sync_enabled=True, google_calendar_id="agenda")
+    _add(settings)
+    monkeypatch.setattr(google_calendar, "_should_sync", lambda settings: True)
+    monkeypatch.setattr(google_calendar, "_get_service", lambda settings: _Service())
+    monkeypatch.setattr(google_calendar, "_to_timezone", lambda dt, tz: dt)
+
+    assert is_slot_available(day, time(14, 0))
+    assert google_calendar.sync_google_calendar(settings=settings, force=True)
+    assert not is_slot_available(day, time(14, 0))
+    assert not is_slot_available(day, time(14, 30))
+    assert is_slot_available(day, time(15, 0))
+
+
+def test_busy_index_is_filled_once_by_concurrent_threads(monkeypatch):
+    loads = []
+
+    def _slow_load(first, last, resource=None):
+        loads.append((first, last))
+        clock.sleep(0.05)
+        return []
+
+    monkeypatch.setattr(schedule_service, "load_busy_events", _slow_load)
+    index = BusyIndex(ttl=300)
+    start = date.today()
+    barrier = threading.Barrier(6)
+    results = []
+
+    def _read():
+        barrier.wait()
+        results.append(index.get(start, start + timedelta(days=6)))
+
+    threads = [threading.Thread(target=_read) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert all(len(result) == 7 for result in results)
+
+
+def test_compiled_rules_are_reused_until_they_change(app):
+    monday = _next_weekday(0)
+    _add(ScheduleRule(weekday=0, start_time=time(8, 0), end_time=time(12, 0)))
+    assert is_valid_slot(monday, time(9, 0))
+
+    statements, stop = _count_event_queries("schedule_rule", "schedule_exception")
+    try:
+        with app.test_request_context("/"):
+            for _ in range(3):
+                assert is_valid_slot(monday, time(9, 0))
+                assert not is_valid_slot(monday, time(13, 0))
+    finally:
+        stop()
+    # Only the version check, once for the whole request.
+    assert len(statements) == 1
+
+    _add(
+        ScheduleRule(weekday=0, start_time=time(13, 0), end_time=time(15, 0)),
+        ScheduleException(date=monday, kind="closed", start_time=time(9, 0), end_time=time(10, 0)),
+    )
+    assert is_valid_slot(monday, time(13, 0))
+    assert not is_valid_slot(monday, time(9, 0))
+
+
+def test_date_exceptions_are_loaded_for_the_window_only(app, monkeypatch):
+    monday = _next_weekday(0)
+    _add(
+        ScheduleException(date=monday, kind="closed"),
+        ScheduleException(date=monday + timedelta(days=60), kind="closed"),
+    )
+
+    statements, stop = _count_event_queries("schedule_exception")
+    loaded = []
+    original = schedule_service._exceptions_by_day
+    spy = lambda start_day, end_day: loaded.append((start_day, end_day)) or original(start_day, end_day)
+    monkeypatch.setattr(schedule_service, "_exceptions_by_day", spy)
+    try:
+        assert not is_valid_slot(monday, time(9, 0))
+        assert is_valid_slot(monday + timedelta(days=7), time(9, 0))
+        assert not is_valid_slot(monday, time(10, 0))
+    finally:
+        stop()
+
+    # Each window loads only its unseen days, filtered by date; seen days are reused.
+    assert loaded == [(monday, monday), (monday + timedelta(days=7), monday + timedelta(days=7))]
+    rows = [s for s in statements if s.lstrip().startswith("SELECT schedule_exception.id")]
+    assert len(rows) == 2
+    assert all("schedule_exception.date >=" in s and "schedule_exception.date <=" in s for s in rows)
+    assert not is_valid_slot(monday + timedelta(days=60), time(9, 0))
@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, update
+
+from extensions import db
+from models import Settings
+from settings_cache import get_settings
+
+
+def _settings_selects(fn):
+    selects = []
+    record = lambda conn, cursor, statement, *args: selects.append(statement) if "FROM settings" in statement else None
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    return selects
+
+
+def test_page_render_checks_the_version_once(app, client):
+    db.session.add(Settings(site_title="Clinica Teste"))
+    db.session.commit()
+    assert client.get("/").status_code == 200
+
+    selects = _settings_selects(lambda: client.get("/about"))
+    assert len(selects) == 1
+    assert "version" in selects[0]
+
+
+def test_updates_bump_the_version_and_reload_the_snapshot(app, client):
+    settings = Settings(site_title="Titulo antigo")
+    db.session.add(settings)
+    db.session.commit()
+    assert b"Titulo antigo" in client.get("/").data
+    version = settings.version
+
+    settings.site_title = "Titulo novo"
+    db.session.commit()
+
+    assert settings.version == version + 1
+    assert b"Titulo novo" in client.get("/").data
+    assert get_settings().site_title == "Titulo novo"
+
+
+def test_snapshot_is_read_only(app):
+    db.session.add(Settings(site_title="Clinica"))
+    db.session.commit()
+    snapshot = get_settings()
+    with pytest.raises(AttributeError):
+        snapshot.site_title = "Outro"
+    assert get_settings() is snapshot
+
+
+def test_sync_bookkeeping_keeps_the_version(app):
+    settings = Settings(site_title="Clinica")
+    db.session.add(settings)
+    db.session.commit()
+    version = settings.version
+    snapshot = get_settings()
+
+    settings.google_sync_token = "token"
+    settings.google_sync_last_at = datetime.utcnow()
+    settings.google_sync_checkpoint = '{"pageToken": "p2"}'
+    db.session.commit()
+
+    assert settings.version == version
+    assert get_settings() is snapshot
+
+
+def test_concurrent_saves_each_bump_the_version(app):
+    settings = Settings(site_title="Clinica")
+    db.session.add(settings)
+    db.session.commit()
+    version = settings.version
+
+    # Another worker saves in between; this session still holds the old version.
+    db.session.execute(
+        update(Settings)
+        .values(site_title="Outro worker", version=Settings.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    settings.about_text = "Novo texto"
+    db.session.commit()
+
+    assert settings.version == version + 2
@@ -0,0 +1,58 @@
+from sqlalchemy import event
+
+from extensions import db
+from models import SiteSection, SiteSectionItem
+from site_sections import load_page_sections
+
+
+def _section_selects(fn):
+    selects = []
+    record = lambda conn, cursor, statement, *args: selects.append(statement) if "FROM site_section" in statement else None
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        result = fn()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    return result, selects
+
+
+def _add_section(page, slug, sort_order, items):
+    section = SiteSection(page=page, slug=slug, title=f"Titulo {slug}", is_active=True, sort_order=sort_order)
+    section.items = [
+        SiteSectionItem(title=title, body="Texto", is_active=active, sort_order=order)
+        for order, (title, active) in enumerate(items)
+    ]
+    db.session.add(section)
+
+
+def test_index_and_about_load_sections_in_two_queries(app, client):
+    _add_section("index", "index-hero", 0, [])
+    _add_section("index", "index-about", 1, [("Sobre A", True), ("Sobre B", True), ("Sobre oculto", False)])
+    _add_section("index", "index-services", 2, [("Servico A", True), ("Servico B", True), ("Servico C", True)])
+    _add_section("about", "about-areas", 0, [("Area A", True), ("Area oculta", False)])
+    db.session.commit()
+
+    response, selects = _section_selects(lambda: client.get("/"))
+    assert response.status_code == 200
+    assert len(selects) == 2
+    assert b"Servico C" in response.data
+    assert b"Sobre oculto" not in response.data
+
+    response, selects = _section_selects(lambda: client.get("/about"))
+    assert response.status_code == 200
+    assert len(selects) == 2
+    assert b"Area A" in response.data
+    assert b"Area oculta" not in response.data
+
+
+def test_load_page_sections_returns_plain_tuples(app):
+    _add_section("index", "index-services", 0, [("Segundo", True), ("Oculto", False), ("Terceiro", True)])
+    _add_section("index", "index-inativa", 1, [("Nada", True)])
+    db.session.flush()
+    SiteSection.query.filter_by(slug="index-inativa").one().is_active = False
+    db.session.commit()
+
+    sections = load_page_sections("index")
+    assert list(sections) == ["index-services"]
+    assert [item.title for item in sections["index-services"].items] == ["Segundo", "Terceiro"]
+    assert isinstance(sections["index-services"].items, tuple)
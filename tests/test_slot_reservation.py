@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from app import create_app
+from appointments_api import create_pending_appointment
+from extensions import db
+from models import Appointment, SlotReservation
+
+
+def _build_file_app(tmp_path):
+    app = create_app(
+        {
+            "TESTING": True,
+            "SECRET_KEY": "test-secret",
+            "WTF_CSRF_ENABLED": False,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'booking.db'}",
+            "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"check_same_thread": False, "timeout": 30}},
+        }
+    )
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _hammer_slot(app, day, workers=8):
+    def _book(idx):
+        with app.app_context():
+            try:
+                create_pending_appointment(
+                    name=f"Paciente {idx}",
+                    phone=f"2199999{idx:04d}",
+                    email=f"p{idx}@example.com",
+                    date_s=day.strftime("%Y-%m-%d"),
+                    time_s="10:00",
+                )
+            except ValueError:
+                return False
+            finally:
+                db.session.remove()
+            return True
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_book, range(workers)))
+
+
+def test_concurrent_bookings_never_overbook_single_seat(tmp_path):
+    app = _build_file_app(tmp_path)
+    day = date.today() + timedelta(days=5)
+
+    results = _hammer_slot(app, day)
+
+    assert results.count(True) == 1
+    with app.app_context():
+        assert Appointment.query.count() == 1
+        assert SlotReservation.query.count() == 1
+
+
+def test_concurrent_bookings_fill_every_seat(tmp_path, monkeypatch):
+    monkeypatch.setenv("AVAIL_CAPACITY", "3")
+    app = _build_file_app(tmp_path)
+    day = date.today() + timedelta(days=5)
+
+    results = _hammer_slot(app, day)
+
+    assert results.count(True) == 3
+    with app.app_context():
+        seats = sorted(r.seat for r in SlotReservation.query.all())
+        assert seats == [0, 1, 2]
+
+
+def test_cancel_releases_seat(client):
+    day = date.today() + timedelta(days=5)
+    with client.application.app_context():
+        appt = create_pending_appointment(
+            name="Ana", phone="21911111111", date_s=day.strftime("%Y-%m-%d"), time_s="09:00"
+        )
+        token = appt.manage_token
+
+    resp = client.post(f"/appointment/manage/{token}", data={"action": "cancel"})
+    assert resp.status_code == 302
+
+    with client.application.app_context():
+        assert SlotReservation.query.count() == 0
+        other = create_pending_appointment(
+            name="Bia", phone="21922222222", date_s=day.strftime("%Y-%m-%d"), time_s="09:00"
+        )
+        assert other.reservation is not None
+        assert other.reservation.seat == 0